@@ -11,8 +11,10 @@ Check ID diagnostic.
 
 This script listens to devices connected to mavros and
 checks against system & component id mismatch errors.
+Also reports rate, jitter and loss of received messages.
 """
 
+import json
 import threading
 import typing
 
@@ -21,6 +23,7 @@ import rclpy.qos
 
 from mavros_msgs.msg import Mavlink
 
+from ..stats import MessageStats
 from . import CliClient, cli, pass_client
 from .utils import common_dialect
 
@@ -32,92 +35,133 @@ ROUTER_QOS = rclpy.qos.QoSProfile(
 
 
 class Checker:
-    def __init__(self, *, client: CliClient, follow: bool, watch_time: float):
-        # dict of sets: (sysid, compid) -> set[msgid...]
-        self.message_sources = {}
-        self.messages_received = 0
+    def __init__(
+        self,
+        *,
+        client: CliClient,
+        follow: bool,
+        watch_time: float,
+        json_output: bool = False,
+    ):
+        self.stats = MessageStats()
         self.reports = 0
         self.client = client
         self.follow = follow
+        self.json_output = json_output
         self.event = threading.Event()
 
         self.tgt_ids = client.uas_settings.target_ids
         uas_url = client.uas_settings.uas_url
         source_topic = f"{uas_url}/mavlink_source"
 
-        click.secho(
-            f"Router topic: {source_topic}, target: {self.fmt_ids(self.tgt_ids)}",
-            fg="cyan",
-        )
+        if not json_output:
+            click.secho(
+                f"Router topic: {source_topic}, target: {self.fmt_ids(self.tgt_ids)}",
+                fg="cyan",
+            )
 
         self.source_sub = client.create_subscription(
             Mavlink, source_topic, self.mavlink_source_cb, ROUTER_QOS
         )
         self.timer = client.create_timer(watch_time, self.timer_cb)
 
+    @property
+    def messages_received(self) -> int:
+        return self.stats.received
+
     def fmt_ids(self, ids: typing.Tuple[int]) -> str:
         return f"{'.'.join(f'{v}' for v in ids)}"
 
+    @staticmethod
+    def msg_name(msgid: int) -> typing.Optional[str]:
+        if common_dialect is None:
+            return None
+
+        msg = common_dialect.mavlink_map.get(msgid)
+        if msg is None:
+            return None
+
+        # .name is deprecated and warns on stdout, which breaks JSON output
+        return msg.msgname if hasattr(msg, "msgname") else msg.name
+
     def mavlink_source_cb(self, msg: Mavlink):
-        self.client.verbose_secho(f"Msg: {msg}", fg="magenta")
+        if self.client.verbose:
+            self.client.verbose_secho(f"Msg: {msg}", fg="magenta")
+
+        self.stats.update(msg)
 
-        ids = (msg.sysid, msg.compid)
-        if ids in self.message_sources:
-            self.message_sources[ids].add(msg.msgid)
+    def timer_cb(self):
+        report = self.stats.report()
+        report["target"] = list(self.tgt_ids)
+        report["target_found"] = self.tgt_ids in self.stats.sources
+        for src in report["sources"]:
+            for msg in src["messages"]:
+                msg["name"] = self.msg_name(msg["msgid"])
+
+        if self.json_output:
+            click.echo(json.dumps(report))
         else:
-            self.message_sources[ids] = set((msg.msgid,))
+            self.print_report(report)
 
-        self.messages_received += 1
+        self.reports += 1
+        if not self.follow:
+            self.event.set()
 
-    def timer_cb(self):
+    def print_report(self, report: typing.Dict[str, typing.Any]):
         if self.reports > 0:
             click.echo("-" * 80)
 
-        self.reports += 1
         str_tgt_ids = self.fmt_ids(self.tgt_ids)
+        sources = report["sources"]
 
-        if self.tgt_ids in self.message_sources:
+        if report["target_found"]:
             click.secho(f"OK. I got messages from {str_tgt_ids}.", fg="green")
         else:
             click.secho(
-                f"ERROR. I got {len(self.message_sources)} addresses, "
+                f"ERROR. I got {len(sources)} addresses, "
                 f"but not your target {str_tgt_ids}",
                 fg="red",
             )
 
         click.secho("---", fg="cyan")
         click.secho(
-            f"Received {self.messages_received}, from {len(self.message_sources)} addresses",
+            f"Received {self.messages_received}, from {len(sources)} addresses",
             fg="cyan",
         )
-        click.secho("address   list of messages", fg="cyan")
-        for address, messages in self.message_sources.items():
-
-            def fmt_msgid(msgid: int) -> str:
-                if common_dialect is None:
-                    return f"{msgid}"
-
-                msg = common_dialect.mavlink_map.get(msgid)
-                if msg is None:
-                    return f"{msgid}"
-                else:
-                    return f"{msgid} ({msg.name})"
-
-            str_ids = self.fmt_ids(address)
+        click.secho(
+            "address   message                        rate Hz  jitter ms      B/s",
+            fg="cyan",
+        )
+        for src in sources:
+            str_ids = self.fmt_ids((src["sysid"], src["compid"]))
             click.secho(
-                f"{str_ids:>7s}   {', '.join(fmt_msgid(msgid) for msgid in messages)}",
+                f"{str_ids:>7s}   received {src['received']}, lost {src['lost']} "
+                f"({src['loss'] * 100:.1f}%)",
                 fg="white",
             )
 
-        if not self.follow:
-            self.event.set()
+            for msg in src["messages"]:
+                name = msg["name"]
+                str_msg = f"{msg['msgid']} ({name})" if name else f"{msg['msgid']}"
+                jitter = msg["jitter"]
+                str_jitter = f"{jitter * 1000:9.2f}" if jitter is not None else " " * 9
+                click.secho(
+                    f"{'':>7s}   {str_msg:<28s} {msg['rate']:9.2f}  {str_jitter}"
+                    f" {msg['bytes_per_sec']:8.0f}",
+                    fg="white" if msg["count"] else "yellow",
+                )
 
 
 @cli.command()
 @click.option("-f", "--follow", is_flag=True, help="do not exit after first report.")
 @click.option("--watch-time", type=float, default=15.0, help="watch period")
+@click.option(
+    "--json", "json_output", is_flag=True, help="print reports as JSON lines."
+)
 @pass_client
-def checkid(client, follow, watch_time):
+def checkid(client, follow, watch_time, json_output):
     """Tool to verify target address and list messages coming to mavros UAS."""
-    checker = Checker(client=client, follow=follow, watch_time=watch_time)
+    checker = Checker(
+        client=client, follow=follow, watch_time=watch_time, json_output=json_output
+    )
     checker.event.wait()
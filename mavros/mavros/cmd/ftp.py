@@ -8,14 +8,20 @@
 # https://github.com/mavlink/mavros/tree/master/LICENSE.md
 """mav ftp command."""
 
+import concurrent.futures
+import json
 import os
 import pathlib
+import posixpath
+import threading
+import time
 import typing
 
 import click
 
 from mavros_msgs.msg import FileEntry
 
+from ..ftp import TransferJournal
 from ..nuttx_crc32 import nuttx_crc32
 from . import cli, pass_client
 from .utils import fault_echo
@@ -25,6 +31,13 @@ from .utils import fault_echo
 # -1 fixes that.
 FTP_PAGE_SIZE = 239 * 18 - 1
 FTP_PWD_FILE = pathlib.Path("/tmp/.mavftp_pwd")
+FTP_JOURNAL_SUFFIX = ".mavftp-journal"
+# journal checkpoint interval: pages or seconds, whatever comes first
+FTP_JOURNAL_PAGES = 64
+FTP_JOURNAL_PERIOD = 2.0
+FTP_SYNC_CACHE_FILE = ".mavftp-sync.json"
+# PX4 supports only two sessions simultaneously
+FTP_MAX_SESSIONS = 2
 
 
 class ProgressBar:
@@ -124,9 +137,10 @@ def cat(ctx, client, path):
     ctx.invoke(
         download,
         src=path,
-        dest=click.open_file("-", "wb"),
+        dest="-",
         progressbar=True,
         verify=False,
+        resume=False,
     )
 
 
@@ -178,40 +192,111 @@ def rmdir(ctx, client, path):
     "--progressbar/--no-progressbar", " /-q", default=True, help="show progress bar"
 )
 @click.option("--verify/--no-verify", " /-v", default=True, help="perform verify step")
+@click.option(
+    "-w",
+    "--window",
+    type=click.IntRange(min=1),
+    default=1,
+    help="number of read requests in flight; "
+    "mavros runs one FTP operation at a time, so it only hides DDS round trips",
+)
+@click.option(
+    "--resume/--no-resume",
+    "-c/ ",
+    default=False,
+    help=f"continue partial download using {FTP_JOURNAL_SUFFIX} file",
+)
 @click.argument(
     "src", type=click.Path(exists=False, file_okay=True), nargs=1, required=True
 )
-@click.argument("dest", type=click.File("wb"), required=False)
+@click.argument(
+    "dest", type=click.Path(dir_okay=False, allow_dash=True), required=False
+)
 @pass_client
 @click.pass_context
-def download(ctx, client, src, dest, progressbar, verify):
+def download(ctx, client, src, dest, progressbar, verify, window, resume):
     """Download file."""
     local_crc = 0
     src = resolve_path(src)
 
     if not dest:
         # if file argument is not set, use $PWD/basename
-        dest = click.open_file(pathlib.Path(src.name).name, "wb")
-
-    client.verbose_echo(f"Downloading from {src} to {dest.name}", err=True)
-
-    with dest as to_fd, click.ftp.open(src, "r") as from_fd, ProgressBar(
-        not progressbar, "Downloading:", from_fd.size
-    ) as bar:
-        while True:
-            buf = from_fd.read(FTP_PAGE_SIZE)
-            if len(buf) == 0:
-                break
-
-            local_crc = nuttx_crc32(buf, local_crc)
-            to_fd.write(buf)
-            bar.update(from_fd.tell())
+        dest = pathlib.Path(src.name).name
+
+    if dest == "-":
+        resume = False
+
+    journal_path = pathlib.Path(dest + FTP_JOURNAL_SUFFIX)
+
+    client.verbose_echo(f"Downloading from {src} to {dest}", err=True)
+
+    with client.ftp.open(str(src), "r", window=window) as from_fd:
+        journal = TransferJournal.load(journal_path) if resume else None
+        if (
+            journal is not None
+            and journal.matches(str(src), from_fd.size)
+            and os.path.exists(dest)
+            and os.path.getsize(dest) >= journal.offset
+        ):
+            client.verbose_echo(f"Resuming from offset {journal.offset}", err=True)
+            to_fd = open(dest, "r+b")
+            to_fd.truncate(journal.offset)
+            to_fd.seek(journal.offset)
+            from_fd.seek(journal.offset)
+            local_crc = journal.crc32
+        else:
+            journal = TransferJournal(remote_path=str(src), size=from_fd.size)
+            to_fd = click.open_file(dest, "wb")
+
+        def checkpoint():
+            to_fd.flush()
+            journal.offset = offset
+            journal.crc32 = local_crc
+            journal.save(journal_path)
+
+        offset = from_fd.tell()
+        pages = 0
+        last_save = time.monotonic()
+        page = memoryview(bytearray(FTP_PAGE_SIZE))
+        with to_fd, ProgressBar(not progressbar, "Downloading:", from_fd.size) as bar:
+            bar.update(offset)
+            try:
+                while True:
+                    page_len = from_fd.readinto(page)
+                    if page_len == 0:
+                        break
+
+                    buf = page[:page_len]
+                    to_fd.write(buf)
+                    local_crc = nuttx_crc32(buf, local_crc)
+                    offset += page_len
+                    bar.update(page_len)
+
+                    pages += 1
+                    if resume and (
+                        pages >= FTP_JOURNAL_PAGES
+                        or time.monotonic() - last_save >= FTP_JOURNAL_PERIOD
+                    ):
+                        checkpoint()
+                        pages = 0
+                        last_save = time.monotonic()
+            finally:
+                if resume:
+                    checkpoint()
 
     if verify:
-        click.verbose_echo("Verifying...", err=True)
-        remote_crc = click.ftp.checksum(str(src))
+        client.verbose_echo("Verifying...", err=True)
+        remote_crc = client.ftp.checksum(str(src))
         if local_crc != remote_crc:
-            fault_echo(f"Verification failed: 0x{local_crc:08x} != 0x{remote_crc:08x}")
+            if resume:
+                journal_path.unlink(missing_ok=True)  # do not resume from a bad state
+
+            fault_echo(
+                ctx, f"Verification failed: 0x{local_crc:08x} != 0x{remote_crc:08x}"
+            )
+
+    if resume:
+        journal_path.unlink(missing_ok=True)
 
 
 @ftp.command()
@@ -225,11 +310,19 @@ def download(ctx, client, src, dest, progressbar, verify):
     default=True,
     help="is it allowed to overwrite file",
 )
+@click.option(
+    "-w",
+    "--window",
+    type=click.IntRange(min=1),
+    default=1,
+    help="number of write requests in flight; "
+    "mavros runs one FTP operation at a time, so it only hides DDS round trips",
+)
 @click.argument("src", type=click.File("rb"), nargs=1, required=True)
 @click.argument("dest", type=click.Path(exists=False, file_okay=True), required=False)
 @pass_client
 @click.pass_context
-def upload(ctx, client, src, dest, progressbar, verify, overwrite):
+def upload(ctx, client, src, dest, progressbar, verify, overwrite, window):
     """Upload file."""
     mode = "cw" if not overwrite else "w"
     local_crc = 0
@@ -244,9 +337,9 @@ def upload(ctx, client, src, dest, progressbar, verify, overwrite):
     # for stdin it is 0
     from_size = os.fstat(src.fileno()).st_size
 
-    with src as from_fd, client.ftp.open(str(dest), mode) as to_fd, ProgressBar(
-        not progressbar, "Uploading:", from_size
-    ) as bar:
+    with src as from_fd, client.ftp.open(
+        str(dest), mode, window=window
+    ) as to_fd, ProgressBar(not progressbar, "Uploading:", from_size) as bar:
         while True:
             buf = from_fd.read(FTP_PAGE_SIZE)
             if len(buf) == 0:
@@ -260,7 +353,9 @@ def upload(ctx, client, src, dest, progressbar, verify, overwrite):
         client.verbose_echo("Verifying...", err=True)
         remote_crc = client.ftp.checksum(str(dest))
         if local_crc != remote_crc:
-            fault_echo(f"Verification failed: 0x{local_crc:08x} != 0x{remote_crc:08x}")
+            fault_echo(
+                ctx, f"Verification failed: 0x{local_crc:08x} != 0x{remote_crc:08x}"
+            )
 
 
 @ftp.command()
@@ -297,3 +392,130 @@ def verify(ctx, client, local, remote):
         fault_echo(ctx, f"{local.name}: FAULT")
     else:
         click.echo(f"{local.name}: OK")
+
+
+def download_file(client, src: str, dest: pathlib.Path, window: int = 1) -> int:
+    """Download one file via temporary file, return its CRC32."""
+    local_crc = 0
+    part_path = dest.with_name(dest.name + ".part")
+
+    with client.ftp.open(src, "r", window=window) as from_fd, part_path.open(
+        "wb"
+    ) as to_fd:
+        page = memoryview(bytearray(FTP_PAGE_SIZE))
+        while True:
+            page_len = from_fd.readinto(page)
+            if page_len == 0:
+                break
+
+            buf = page[:page_len]
+            local_crc = nuttx_crc32(buf, local_crc)
+            to_fd.write(buf)
+
+    os.replace(part_path, dest)
+    return local_crc
+
+
+@ftp.command()
+@click.option("--verify/--no-verify", " /-v", default=True, help="perform verify step")
+@click.option(
+    "-j",
+    "--jobs",
+    type=click.IntRange(min=1, max=FTP_MAX_SESSIONS),
+    default=FTP_MAX_SESSIONS,
+    help="number of parallel transfers",
+)
+@click.option(
+    "-w",
+    "--window",
+    type=click.IntRange(min=1),
+    default=1,
+    help="number of read requests in flight per transfer; "
+    "mavros runs one FTP operation at a time, so it only hides DDS round trips",
+)
+@click.argument("src", type=click.Path(exists=False), nargs=1, required=False)
+@click.argument("dest", type=click.Path(file_okay=False, dir_okay=True), required=False)
+@pass_client
+@click.pass_context
+def sync(ctx, client, src, dest, verify, jobs, window):
+    """
+    Mirror remote directory tree to local directory.
+
+    Only new or changed files are transferred. Size and CRC32 of downloaded
+    files are stored in a cache file in DEST.
+    """
+    src = resolve_path(src)
+    dest = pathlib.Path(dest or ".")
+    cache_path = dest / FTP_SYNC_CACHE_FILE
+    cache_lock = threading.Lock()
+
+    try:
+        with cache_path.open("r") as fd:
+            cache = json.load(fd)
+    except (OSError, ValueError):
+        cache = {}
+
+    def is_up_to_date(rel_path: str, remote_path: str, size: int) -> bool:
+        ent = cache.get(rel_path)
+        local_path = dest / rel_path
+        if ent is None or ent["size"] != size or not local_path.exists():
+            return False
+        if local_path.stat().st_size != size:
+            return False
+
+        # same size, compare content by CRC calculated on FCU
+        return ent["crc32"] == client.ftp.checksum(remote_path)
+
+    def fetch(rel_path: str, remote_path: str, size: int):
+        local_path = dest / rel_path
+        local_path.parent.mkdir(parents=True, exist_ok=True)
+
+        client.verbose_echo(f"{remote_path} -> {local_path}", err=True)
+        local_crc = download_file(client, remote_path, local_path, window)
+
+        if verify:
+            remote_crc = client.ftp.checksum(remote_path)
+            if local_crc != remote_crc:
+                raise IOError(
+                    f"{remote_path}: verification failed: "
+                    f"0x{local_crc:08x} != 0x{remote_crc:08x}"
+                )
+
+        with cache_lock:
+            cache[rel_path] = {"size": size, "crc32": local_crc}
+
+    # walk first: listing and transfers share the same mavros ftp service
+    to_fetch = []
+    up_to_date = 0
+    for dir_path, _, files in client.ftp.walk(str(src)):
+        for ent in files:
+            remote_path = posixpath.join(dir_path, ent.name)
+            rel_path = posixpath.relpath(remote_path, str(src))
+            if is_up_to_date(rel_path, remote_path, ent.size):
+                up_to_date += 1
+            else:
+                to_fetch.append((rel_path, remote_path, ent.size))
+
+    errors = []
+    dest.mkdir(parents=True, exist_ok=True)
+    try:
+        with concurrent.futures.ThreadPoolExecutor(
+            max_workers=jobs, thread_name_prefix="mavftp_sync"
+        ) as pool:
+            futures = [pool.submit(fetch, *args) for args in to_fetch]
+            for fut in concurrent.futures.as_completed(futures):
+                try:
+                    fut.result()
+                except IOError as ex:
+                    errors.append(ex)
+                    click.echo(f"Error: {ex}", err=True)
+    finally:
+        with cache_path.open("w") as fd:
+            json.dump(cache, fd, indent=2)
+
+    click.echo(
+        f"Transferred: {len(to_fetch) - len(errors)}, "
+        f"up to date: {up_to_date}, failed: {len(errors)}"
+    )
+    if errors:
+        fault_echo(ctx, "Sync failed.")
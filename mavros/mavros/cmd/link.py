@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+# vim:set ts=4 sw=4 et:
+#
+# Copyright 2021 Vladimir Ermakov.
+#
+# This file is part of the mavros package and subject to the license terms
+# in the top-level LICENSE file of the mavros repository.
+# https://github.com/mavlink/mavros/tree/master/LICENSE.md
+"""mav link command."""
+
+import json
+import threading
+
+import click
+
+from mavros_msgs.msg import Mavlink
+
+from ..stats import LinkMonitor
+from . import cli, pass_client
+from .checkid import ROUTER_QOS
+
+
+@cli.group()
+@pass_client
+def link(client):
+    """Tool to monitor MAVLink link quality."""
+
+
+@link.command()
+@click.option("--topic", type=str, help="Mavlink topic, default: UAS source topic.")
+@click.option(
+    "-w",
+    "--window",
+    type=click.FloatRange(min=0.0, min_open=True),
+    default=10.0,
+    help="Sliding window, seconds.",
+)
+@click.option(
+    "-p",
+    "--period",
+    type=click.FloatRange(min=0.0, min_open=True),
+    default=1.0,
+    help="Report period, seconds.",
+)
+@click.option(
+    "-c", "--count", type=click.IntRange(min=0), default=0, help="Stop after N reports."
+)
+@click.option(
+    "--json", "json_output", is_flag=True, help="Print reports as JSON lines."
+)
+@pass_client
+def stats(client, topic, window, period, count, json_output):
+    """Show packet loss, errors and latency of each source."""
+    if topic is None:
+        topic = f"{client.uas_settings.uas_url}/mavlink_source"
+
+    monitor = LinkMonitor(window=window)
+    lock = threading.Lock()
+    done = threading.Event()
+    reports = 0
+
+    def mavlink_cb(msg: Mavlink):
+        with lock:
+            monitor.update(msg)
+
+    def timer_cb():
+        nonlocal reports
+        with lock:
+            report = monitor.report()
+
+        reports += 1
+        if count and reports >= count:
+            done.set()
+
+        if json_output:
+            click.echo(json.dumps(report))
+            return
+
+        click.secho(
+            f"bad CRC: {report['bad_crc']} ({report['crc_error_rate'] * 100:.2f} %)",
+            fg="red" if report["bad_crc"] else "cyan",
+        )
+        click.secho(
+            "address      rate Hz  loss %  lost  reord  dup  sig err"
+            "  latency ms  max ms",
+            fg="cyan",
+        )
+
+        def fmt_ms(v, width):
+            return f"{v * 1000:{width}.2f}" if v is not None else " " * width
+
+        for src in report["sources"]:
+            str_ids = f"{src['sysid']}.{src['compid']}"
+            click.secho(
+                f"{str_ids:>7s}   {src['rate']:10.1f}  {src['loss'] * 100:6.2f}"
+                f"  {src['lost']:4d}  {src['reordered']:5d}  {src['duplicates']:3d}"
+                f"  {src['bad_signature']:7d}"
+                f"  {fmt_ms(src['latency'], 10)}  {fmt_ms(src['latency_max'], 6)}",
+                fg="red" if src["loss"] > 0.05 else "white",
+            )
+
+    if not json_output:
+        click.secho(f"Router topic: {topic}, window: {window} s", fg="cyan")
+
+    sub = client.create_subscription(Mavlink, topic, mavlink_cb, ROUTER_QOS)
+    timer = client.create_timer(period, timer_cb)
+    try:
+        done.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.destroy_timer(timer)
+        client.destroy_subscription(sub)
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+# vim:set ts=4 sw=4 et:
+#
+# Copyright 2021 Vladimir Ermakov.
+#
+# This file is part of the mavros package and subject to the license terms
+# in the top-level LICENSE file of the mavros repository.
+# https://github.com/mavlink/mavros/tree/master/LICENSE.md
+"""mav log command."""
+
+import threading
+import time
+import typing
+
+import click
+
+from mavros_msgs.msg import Mavlink
+
+from ..tlog import TlogReader, TlogWriter
+from . import CliClient, cli, pass_client
+from .checkid import ROUTER_QOS
+from .utils import common_dialect
+
+
+def default_topic(client: CliClient, topic: typing.Optional[str]) -> str:
+    if topic is not None:
+        return topic
+
+    return f"{client.uas_settings.uas_url}/mavlink_source"
+
+
+@cli.group()
+@pass_client
+def log(client):
+    """Tool to record and replay MAVLink telemetry logs (tlog)."""
+
+
+@log.command()
+@click.option("--topic", type=str, help="Mavlink topic, default: UAS source topic.")
+@click.option("-d", "--duration", type=float, help="Stop after that many seconds.")
+@click.argument("dest", type=click.File("wb"))
+@pass_client
+def record(client, topic, duration, dest):
+    """Record Mavlink topic to tlog file."""
+    topic = default_topic(client, topic)
+    writer = TlogWriter(dest)
+    lock = threading.Lock()
+
+    def mavlink_cb(msg: Mavlink):
+        with lock:
+            writer.write(msg)
+
+    click.secho(f"Recording {topic} to {dest.name}", fg="cyan")
+    sub = client.create_subscription(Mavlink, topic, mavlink_cb, ROUTER_QOS)
+    try:
+        threading.Event().wait(duration)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        client.destroy_subscription(sub)
+        with lock:
+            writer.flush()
+
+    click.echo(f"Recorded {writer.count} messages.")
+
+
+@log.command()
+@click.option("--topic", type=str, help="Mavlink topic, default: UAS source topic.")
+@click.option(
+    "-r",
+    "--rate",
+    type=click.FloatRange(min=0.0, min_open=True),
+    default=1.0,
+    help="Playback speed factor.",
+)
+@click.option("--max-rate", is_flag=True, help="Publish as fast as possible.")
+@click.option(
+    "-s",
+    "--start",
+    type=click.FloatRange(min=0.0),
+    default=0.0,
+    help="Start that many seconds into the log.",
+)
+@click.option("-l", "--loop", is_flag=True, help="Loop playback.")
+@click.argument("src", type=click.Path(exists=True, dir_okay=False))
+@pass_client
+def replay(client, topic, rate, max_rate, start, loop, src):
+    """Publish tlog file to Mavlink topic."""
+    topic = default_topic(client, topic)
+    pub = client.create_publisher(Mavlink, topic, ROUTER_QOS)
+
+    with TlogReader(src, sidecar=True) as reader:
+        click.secho(f"Indexing {src}...", fg="cyan")
+        if not len(reader):
+            click.secho("No messages in the log.", fg="yellow")
+            return
+
+        stamps = reader.stamps
+        first = reader.index_at(stamps[0] + int(start * 1e6))
+        if first >= len(reader):
+            click.secho("Start time is past the end of the log.", fg="yellow")
+            return
+
+        click.secho(f"Replaying {len(reader) - first} messages to {topic}", fg="cyan")
+
+        try:
+            while True:
+                log_start = stamps[first]
+                wall_start = time.monotonic()
+                for idx, msg in enumerate(reader.iter_from(first), first):
+                    if not max_rate:
+                        delay = (stamps[idx] - log_start) / (rate * 1e6)
+                        delay -= time.monotonic() - wall_start
+                        if delay > 0:
+                            time.sleep(delay)
+
+                    pub.publish(msg)
+
+                if not loop:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            client.destroy_publisher(pub)
+
+
+@log.command()
+@click.argument("src", type=click.Path(exists=True, dir_okay=False))
+@pass_client
+def index(client, src):
+    """Build sidecar index of tlog file and show its summary."""
+    with TlogReader(src, sidecar=True) as reader:
+        idx = reader.index
+        if not len(idx):
+            click.secho("No messages in the log.", fg="yellow")
+            return
+
+        duration = (idx.stamps[-1] - idx.stamps[0]) / 1e6
+        click.secho(
+            f"{len(idx)} messages, {duration:.1f} s, index: {reader.index_path}",
+            fg="cyan",
+        )
+        click.secho("address   msgid   count", fg="cyan")
+        for (sysid, compid, msgid), recs in sorted(idx.groups.items()):
+            name = ""
+            if common_dialect is not None:
+                msg = common_dialect.mavlink_map.get(msgid)
+                if msg is not None:
+                    name = msg.msgname if hasattr(msg, "msgname") else msg.name
+
+            click.echo(
+                f"{sysid:>3d}.{compid:<3d}   {msgid:>5d}   {len(recs):>5d} {name}"
+            )
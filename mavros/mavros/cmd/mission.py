@@ -287,13 +287,13 @@ def load(
             return
 
         req = WaypointPush.Request(
-            waypoints=points.waypoints,
+            waypoints=points,
             start_index=start_index,
         )
-        ret = accessor.cli_push(req)
+        ret = accessor.cli_push.call(req)
 
         if not ret.success:
-            fault_echo("Request failed. Check mavros logs")
+            fault_echo(ctx, "Request failed. Check mavros logs")
 
         client.verbose_echo(
             f"{fmt_accessor(accessor)}(s) transfered: {ret.wp_transfered}"
@@ -331,7 +331,7 @@ def load(
     if preserve_home:
         client.waypoint.subscribe_points(fix_wp0)
         if not done_evt.wait(30.0):
-            fault_echo("Something went wrong. Topic timed out.")
+            fault_echo(ctx, "Something went wrong. Topic timed out.")
 
     call_push(
         accessor=client.waypoint,
@@ -347,7 +347,7 @@ def load(
     )
     call_push(
         accessor=client.rallypoint,
-        points=mission_file.geofence,
+        points=mission_file.rally,
         start_index=0,
         no_send=no_rally,
     )
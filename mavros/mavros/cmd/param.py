@@ -10,16 +10,46 @@
 import typing
 
 import click
+from rclpy.parameter import Parameter
 
-from ..param import MavProxyParam, MissionPlannerParam, ParamFile, QGroundControlParam
+from ..param import (
+    BULK_SET_BATCH_SIZE,
+    BULK_SET_IN_FLIGHT,
+    BULK_SET_RETRIES,
+    GLOB_CHARS,
+    PARAM_DIFF_REL_TOL,
+    MavProxyParam,
+    MissionPlannerParam,
+    ParamDiff,
+    ParamFile,
+    ParamSetResult,
+    QGroundControlParam,
+    detect_param_file,
+    diff_parameters,
+)
+from ..param_store import ParamStore
 from . import CliClient, cli, pass_client
 from .utils import apply_options
 
 
 @cli.group()
+@click.option(
+    "--cache/--no-cache",
+    default=False,
+    help="Use on-disk parameter cache, if it's valid for the vehicle. "
+    "Only vehicles reporting _HASH_CHECK (PX4) are cached, "
+    "others (e.g. ArduPilot) always pull parameters.",
+)
+@click.option(
+    "--cache-file",
+    type=click.Path(dir_okay=False),
+    help="Cache file, default: ~/.cache/mavros/params.sqlite",
+)
 @pass_client
-def param(client):
+def param(client, cache, cache_file):
     """Tool to manipulate parameters of the MAVLink device."""
+    if cache:
+        client.param.enable_cache(cache_file)
 
 
 def _add_format_options(f):
@@ -66,7 +96,14 @@ def get_param_file_io(
         pf = MavProxyParam()
 
     else:
-        if file_.name.endswith(".txt"):
+        pf_class = None
+        if file_.readable() and file_.seekable():
+            pf_class = detect_param_file(file_)
+
+        if pf_class is not None:
+            client.verbose_echo(f"Detected format: {pf_class.__name__}")
+            pf = pf_class()
+        elif file_.name.endswith(".txt"):
             client.verbose_echo("Suggestion: QGroundControl format")
             pf = QGroundControlParam()
         else:
@@ -79,18 +116,117 @@ def get_param_file_io(
     return pf
 
 
+def diff_with_vehicle(
+    client: CliClient, param_file: ParamFile, rel_tol: float = PARAM_DIFF_REL_TOL
+) -> ParamDiff:
+    """Compare vehicle parameters with the file."""
+    values = client.param.values
+    # do not decide what to set by cached values
+    client.param.confirm_values(param_file.parameters)
+    return diff_parameters(values, param_file.parameters, rel_tol=rel_tol)
+
+
 @param.command()
 @_add_format_options
+@click.option(
+    "-b",
+    "--batch-size",
+    type=click.IntRange(min=1),
+    default=BULK_SET_BATCH_SIZE,
+    help="Parameters per set request.",
+)
+@click.option(
+    "-j",
+    "--in-flight",
+    type=click.IntRange(min=1),
+    default=BULK_SET_IN_FLIGHT,
+    help="Set requests sent without waiting for response.",
+)
+@click.option(
+    "-r",
+    "--retries",
+    type=click.IntRange(min=0),
+    default=BULK_SET_RETRIES,
+    help="Times to retry failed parameters.",
+)
 @click.argument("file_", type=click.File("r"), metavar="FILE")
 @pass_client
-def load(client, file_format, file_):
+def load(client, file_format, batch_size, in_flight, retries, file_):
     """Load parameters from file."""
     param_file = get_param_file_io(client, file_format, file_)
     param_file.load(file_)
+    delta = diff_with_vehicle(client, param_file).delta
+
+    def progress(result: ParamSetResult):
+        if result.successful:
+            client.verbose_echo(f"{result.name}: {result.parameter.value}")
+        else:
+            client.verbose_secho(
+                f"{result.name}: failed (attempt {result.attempts}): {result.reason}",
+                fg="yellow",
+            )
+
+    ret = client.param.values.update_bulk(
+        delta,
+        batch_size=batch_size,
+        max_in_flight=in_flight,
+        retries=retries,
+        progress=progress,
+    )
+
+    for r in ret.failed:
+        click.secho(f"{r.name}: {r.reason}", fg="red", err=True)
+
+    click.echo(
+        f"Parameters sent: {len(ret.results)}, failed: {len(ret.failed)}, "
+        f"unchanged: {len(param_file.parameters) - len(delta)}, "
+        f"time: {ret.elapsed:.2f} s"
+    )
+
+
+@param.command()
+@_add_format_options
+@click.option(
+    "-t",
+    "--tolerance",
+    type=click.FloatRange(min=0.0),
+    default=PARAM_DIFF_REL_TOL,
+    help="Relative tolerance of float values.",
+)
+@click.option(
+    "-m", "--missing", is_flag=True, help="Also list parameters missing in FILE."
+)
+@click.argument("file_", type=click.File("r"), metavar="FILE")
+@click.argument("other", type=click.File("r"), required=False)
+@pass_client
+def diff(client, file_format, tolerance, missing, file_, other):
+    """
+    Show difference between vehicle and FILE.
+
+    If OTHER is given, show difference between FILE and OTHER.
+    """
+    param_file = get_param_file_io(client, file_format, file_)
+    param_file.load(file_)
 
-    client.param.values.update(param_file.parameters)
+    if other is None:
+        ret = diff_with_vehicle(client, param_file, tolerance)
+    else:
+        other_file = get_param_file_io(client, file_format, other)
+        other_file.load(other)
+        ret = param_file.diff(other_file, rel_tol=tolerance)
 
-    client.verbose_echo(f"Prameters sent: {len(param_file.parameters)}")
+    for name, (old, new) in ret.changed.items():
+        click.secho(f"~ {name} {old.value} -> {new.value}", fg="yellow")
+    for name, p in ret.added.items():
+        click.secho(f"+ {name} {p.value}", fg="green")
+    if missing:
+        for name, p in ret.missing.items():
+            click.secho(f"- {name} {p.value}", fg="red")
+
+    click.echo(
+        f"Changed: {len(ret.changed)}, added: {len(ret.added)}, "
+        f"missing: {len(ret.missing)}, unchanged: {ret.unchanged}"
+    )
 
 
 @param.command()
@@ -102,43 +238,102 @@ def load(client, file_format, file_):
     default=False,
     help="Force pull params form FCU, update cache",
 )
+@click.option(
+    "--store",
+    type=click.Path(dir_okay=False),
+    help="Also append the dump to snapshot store file.",
+)
 @click.argument("file_", type=click.File("w"), metavar="FILE")
 @pass_client
-def dump(client, file_format, force, file_):
+def dump(client, file_format, force, store, file_):
     """Dump parameters to file."""
-    # NOTE(vooon): hidden magic - create ParamDict and get ref
-    values = client.param.values
 
-    if force:
-        client.param.call_pull(force=True)
+    def progress(received: int, expected: typing.Optional[int]):
+        client.verbose_echo(f"\rReceived: {received}/{expected or '?'}", nl=False)
 
-    client.verbose_echo(f"Parameters received: {len(values)}")
+    values = client.param.fetch_values(force_pull=force, progress=progress)
+
+    client.verbose_echo(f"\nParameters received: {len(values)}")
 
     param_file = get_param_file_io(client, file_format, file_)
     param_file.parameters = values
     param_file.save(file_)
 
+    if store is not None:
+        key = client.param.get_vehicle_key()
+        with ParamStore(store) as ps:
+            info = ps.append(param_file, uid=key[0] if key else "")
+        client.verbose_echo(f"Snapshot #{info.index} appended to {store}")
+
+
+@param.command()
+@click.option("--uid", type=str, help="Only that vehicle UID.")
+@click.option("--sysid", type=int, help="Only that target system.")
+@click.argument("store", type=click.Path(exists=True, dir_okay=False))
+@click.argument("param_id", type=str)
+@pass_client
+def history(client, uid, sysid, store, param_id):
+    """Print values of PARAM_ID across all snapshots in STORE."""
+    with ParamStore(store) as ps:
+        ret = ps.history(param_id, uid=uid, tgt_system=sysid)
+
+    if not ret:
+        raise click.ClickException(f"No snapshots with {param_id}")
+
+    for info, value in ret:
+        click.echo(
+            f"{info.stamp.isoformat(sep=' ', timespec='seconds')}"
+            f" {info.uid or '-':>16s} {info.tgt_system:3d}.{info.tgt_component:<3d}"
+            f" {value}"
+        )
+
+
+def _print_matching(values: typing.Dict[str, Parameter], pattern: str):
+    if not values:
+        raise click.ClickException(f"No parameters matching: {pattern}")
+
+    if not any(c in pattern for c in GLOB_CHARS):
+        click.echo(f"{values[pattern].value}")
+        return
+
+    for name, p in sorted(values.items()):
+        click.echo(f"{name} {p.value}")
+
 
 @param.command()
 @click.argument("param_id", type=str)
 @pass_client
 def get(client, param_id):
-    """Print one parameter value."""
-    # XXX(vooon): ineffecient
-    click.echo(f"{client.param.values[param_id].value}")
+    """Print parameter value, PARAM_ID may be a glob pattern."""
+    _print_matching(client.param.get_matching(param_id), param_id)
 
 
 @param.command()
+@click.option(
+    "-f", "--force", is_flag=True, help="Send set even if parameter is unknown."
+)
 @click.argument("param_id", type=str)
 @click.argument("value", type=str)
 @pass_client
-def set(client, param_id, value):
-    """Set one parameter."""
+def set(client, force, param_id, value):
+    """Set parameter, PARAM_ID may be a glob pattern."""
     if "." in value:
         val = float(value)
     else:
         val = int(value)
 
-    # XXX(vooon): ineffecient
-    client.param.values[param_id] = val
-    click.echo(f"{client.param.values[param_id].value}")
+    if any(c in param_id for c in GLOB_CHARS):
+        names = client.param.find_names(param_id)
+    else:
+        names = [param_id]
+
+    ret = {}
+    for name in names:
+        try:
+            ret[name] = client.param.set_parameter(name, val, force=force)
+        except KeyError:
+            pass
+        except ValueError as ex:
+            raise click.ClickException(str(ex))
+
+    _print_matching(ret, param_id)
@@ -7,10 +7,20 @@
 # in the top-level LICENSE file of the mavros repository.
 # https://github.com/mavlink/mavros/tree/master/LICENSE.md
 
+import collections
+import errno
+import io
+import json
 import os
+import pathlib
+import posixpath
+import threading
+import time
 import typing
+from dataclasses import asdict, dataclass
 
 import rclpy
+import rclpy.task
 from std_srvs.srv import Empty
 
 from mavros_msgs.msg import FileEntry
@@ -29,6 +39,7 @@ from mavros_msgs.srv import (
 )
 
 from .base import PluginModule, cached_property
+from .nuttx_crc32 import nuttx_crc32
 
 
 def _check_raise_errno(ret):
@@ -36,19 +47,171 @@ def _check_raise_errno(ret):
         raise IOError(ret.r_errno, os.strerror(ret.r_errno))
 
 
-class FTPFile:
+def _wait_future(future: rclpy.task.Future, timeout_sec: typing.Optional[float] = None):
+    """
+    Block until future is done. Node should be spinned by other thread.
+
+    Returns None if timeout expired.
+    """
+    done_evt = threading.Event()
+    future.add_done_callback(lambda _: done_evt.set())
+    if not done_evt.wait(timeout_sec):
+        return None
+    return future.result()
+
+
+@dataclass
+class TransferJournal:
+    """
+    Checkpoint of a partially downloaded file.
+
+    Transfer is sequential, so completed range is always [0, offset),
+    crc32 is nuttx_crc32 of that range.
+    """
+
+    remote_path: str
+    size: int
+    offset: int = 0
+    crc32: int = 0
+
+    @classmethod
+    def load(cls, path: pathlib.Path) -> typing.Optional["TransferJournal"]:
+        """Read journal, returns None if it is missing or damaged."""
+        try:
+            with path.open("r") as fd:
+                return cls(**json.load(fd))
+        except (OSError, ValueError, TypeError):
+            return None
+
+    def save(self, path: pathlib.Path):
+        """Atomically replace journal file."""
+        tmp_path = path.with_name(path.name + ".tmp")
+        with tmp_path.open("w") as fd:
+            json.dump(asdict(self), fd)
+
+        os.replace(tmp_path, path)
+
+    def matches(self, remote_path: str, size: int) -> bool:
+        return self.remote_path == remote_path and self.size == size
+
+
+class FTPCache:
+    """
+    TTL cache of remote directory listings and checksums.
+
+    Cached checksum is dropped if cached listing of parent directory
+    reports another size for that file.
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        # dir_path -> (stamp, entries)
+        self._listdir = {}
+        # file_path -> (stamp, size or None, crc32)
+        self._checksum = {}
+
+    def _is_alive(self, stamp: float) -> bool:
+        return time.monotonic() - stamp < self.ttl
+
+    def _entry_size(self, path: str) -> typing.Optional[int]:
+        dir_path, name = posixpath.split(path)
+        cached = self._listdir.get(dir_path)
+        if cached is None or not self._is_alive(cached[0]):
+            return None
+
+        for ent in cached[1]:
+            if ent.name == name:
+                return ent.size
+
+        return None
+
+    def get_listdir(self, dir_path: str) -> typing.Optional[typing.List[FileEntry]]:
+        with self._lock:
+            cached = self._listdir.get(posixpath.normpath(dir_path))
+            if cached is None or not self._is_alive(cached[0]):
+                return None
+
+            return cached[1]
+
+    def put_listdir(self, dir_path: str, entries: typing.List[FileEntry]):
+        with self._lock:
+            self._listdir[posixpath.normpath(dir_path)] = (time.monotonic(), entries)
+
+    def get_checksum(self, path: str) -> typing.Optional[int]:
+        path = posixpath.normpath(path)
+        with self._lock:
+            cached = self._checksum.get(path)
+            if cached is None or not self._is_alive(cached[0]):
+                return None
+
+            stamp, size, crc32 = cached
+            entry_size = self._entry_size(path)
+            if size is not None and entry_size is not None and size != entry_size:
+                return None
+
+            return crc32
+
+    def put_checksum(self, path: str, crc32: int):
+        path = posixpath.normpath(path)
+        with self._lock:
+            self._checksum[path] = (time.monotonic(), self._entry_size(path), crc32)
+
+    def invalidate(self, path: typing.Optional[str] = None):
+        """Drop path, its subtree and parent listing, or everything if path is None."""
+        with self._lock:
+            if path is None:
+                self._listdir.clear()
+                self._checksum.clear()
+                return
+
+            path = posixpath.normpath(path)
+            prefix = path.rstrip("/") + "/"
+            self._listdir.pop(posixpath.dirname(path), None)
+            for cache in (self._listdir, self._checksum):
+                for key in [k for k in cache if k == path or k.startswith(prefix)]:
+                    del cache[key]
+
+
+class FTPFile(io.RawIOBase):
     """
     FCU file object.
 
+    Implements io.RawIOBase, so it could be wrapped by io.BufferedReader
+    (preferred for line iteration) or used by shutil.copyfileobj().
+    readinto() copies received data straight into a caller's buffer.
+
     Note that current PX4 firmware only support two connections simultaneously.
+
+    If window > 1, read() keeps up to window FileRead requests in flight
+    at increasing offsets, so sequential reads do not wait for a full
+    service round-trip per chunk.
+    Same way write() keeps up to window FileWrite requests in flight,
+    errors are reported by the following write(), flush() or close().
+
+    Note that mavros FTP plugin runs one operation at a time: its services
+    share the default callback group, and a request arriving while it is busy
+    is dropped ("ftp busy"). So window only overlaps DDS round trips with
+    the current transfer, not MAVLink transfers. A request without response
+    for timeout_sec is considered dropped and sent again, up to retries times.
+
+    CRC32 of data read or written sequentially from offset 0 is kept
+    in crc32 attribute, see verify().
     """
 
     _fm: "FTPPlugin"
+    timeout_sec: float = 10.0
+    retries: int = 3
 
-    def __init__(self, *, fm, name, mode):
+    def __init__(self, *, fm, name, mode, window: int = 1):
         self._fm = fm
         self.name = None
         self.mode = mode
+        self.window = window
+        # deque of (request, future) for read-ahead requests
+        self._read_ahead = collections.deque()
+        # deque of (request, future, file size before) for write-behind requests
+        self._write_behind = collections.deque()
         self.open(name, mode)
 
     def __del__(self):
@@ -77,6 +240,9 @@ class FTPFile:
             mode=m,
         )
 
+        if m != FileOpen.Request.MODE_READ:
+            self._fm.invalidate_cache(path)
+
         ret = self._fm.cli_open.call(req)
         _check_raise_errno(ret)
 
@@ -84,37 +250,178 @@ class FTPFile:
         self.mode = mode
         self.size = ret.size
         self.offset = 0
+        self.crc32 = 0
+        self._crc_offset = 0
+        self._crc_valid = True
 
     def close(self):
         if self.closed:
             return
 
-        req = FileClose.Request(file_path=self.name)
-        ret = self._fm.cli_close(req)
-        self.name = None
-        _check_raise_errno(ret)
+        self._drop_read_ahead()
+        try:
+            self.flush()
+        finally:
+            req = FileClose.Request(file_path=self.name)
+            ret = self._fm.cli_close.call(req)
+            self.name = None
+            _check_raise_errno(ret)
+
+    def read(self, size: int = -1) -> bytearray:
+        if size is not None and size >= 0:
+            return bytearray(self._read_data(size))
+
+        buf = bytearray()
+        while True:
+            data = self._read_data(io.DEFAULT_BUFFER_SIZE)
+            if len(data) == 0:
+                return buf
+
+            buf += data
+
+    def readall(self) -> bytes:
+        return bytes(self.read())
+
+    def readinto(self, buffer) -> int:
+        mv = memoryview(buffer).cast("B")
+        data = self._read_data(len(mv))
+        data_len = len(data)
+        mv[:data_len] = data
+        return data_len
+
+    def _check_closed(self):
+        if self.closed:
+            raise ValueError("I/O operation on closed file")
+
+    def _read_data(self, size: int):
+        self._check_closed()
+        self.flush()
+        if self.window > 1:
+            ret = self._read_pipelined(size)
+        else:
+            req = FileRead.Request(file_path=self.name, offset=self.offset, size=size)
+            ret = self._fm.cli_read.call(req)
 
-    def read(self, size: int = 1) -> bytearray:
-        req = FileRead.Request(file_path=self.name, offset=self.offset, size=size)
-        ret = self._fm.cli_read.call(req)
         _check_raise_errno(ret)
+        if self.offset == self._crc_offset:
+            self._update_crc(ret.data)
+
         self.offset += len(ret.data)
-        return bytearray(ret.data)
+        return ret.data
+
+    def _update_crc(self, data):
+        self.crc32 = nuttx_crc32(data, self.crc32)
+        self._crc_offset += len(data)
+
+    def _read_pipelined(self, size: int) -> FileRead.Response:
+        # seek() or changed chunk size invalidates requests in flight
+        if self._read_ahead:
+            req, _ = self._read_ahead[0]
+            if req.offset != self.offset or req.size != size:
+                self._drop_read_ahead()
+
+        if self._read_ahead:
+            next_offset = self._read_ahead[-1][0].offset + size
+        else:
+            next_offset = self.offset
+
+        while len(self._read_ahead) < self.window:
+            if self._read_ahead and next_offset >= self.size:
+                break  # do not request past EOF
+
+            req = FileRead.Request(file_path=self.name, offset=next_offset, size=size)
+            future = self._fm.cli_read.call_async(req)
+            self._read_ahead.append((req, future))
+            next_offset += size
+
+        req, future = self._read_ahead.popleft()
+        ret = self._wait_response(self._fm.cli_read, req, future)
+        if not ret.success or len(ret.data) < size:
+            # error or EOF, the rest of the window is useless
+            self._drop_read_ahead()
+
+        return ret
+
+    def _wait_response(self, client, req, future: rclpy.task.Future):
+        """Wait for response of the request, send it again if it was dropped."""
+        for attempt in range(self.retries + 1):
+            if attempt:
+                # mavros was busy with another operation
+                future = client.call_async(req)
 
-    def write(self, bin_data: typing.Union[bytes, bytearray]):
+            ret = _wait_future(future, self.timeout_sec)
+            if ret is not None:
+                return ret
+
+            future.cancel()
+
+        raise IOError(errno.ETIMEDOUT, f"FTP request timed out: {req.file_path}")
+
+    def _drop_read_ahead(self):
+        # let outstanding requests finish, so they won't interfere with next ones
+        while self._read_ahead:
+            _, future = self._read_ahead.popleft()
+            if _wait_future(future, self.timeout_sec) is None:
+                future.cancel()
+
+    def write(self, bin_data: typing.Union[bytes, bytearray]) -> int:
+        self._check_closed()
         data_len = len(bin_data)
+        self._fm.invalidate_cache(self.name)
 
         req = FileWrite.Request(file_path=self.name, offset=self.offset, data=bin_data)
-        ret = self._fm.cli_write.call(req)
-        _check_raise_errno(ret)
+        if self.window > 1:
+            while len(self._write_behind) >= self.window:
+                self._complete_write()
+
+            future = self._fm.cli_write.call_async(req)
+            self._write_behind.append((req, future, self.size))
+        else:
+            ret = self._fm.cli_write.call(req)
+            _check_raise_errno(ret)
+
+        self._write_crc(bin_data)
         self.offset += data_len
         if self.offset > self.size:
             self.size = self.offset
 
+        return data_len
+
+    def _complete_write(self):
+        req, future, size = self._write_behind.popleft()
+        try:
+            ret = self._wait_response(self._fm.cli_write, req, future)
+            _check_raise_errno(ret)
+        except IOError:
+            # rewind to the first failed write, later requests are discarded
+            while self._write_behind:
+                _, next_future, _ = self._write_behind.popleft()
+                if _wait_future(next_future, self.timeout_sec) is None:
+                    next_future.cancel()
+
+            self.offset = req.offset
+            self.size = size
+            self._crc_valid = False
+            raise
+
+    def _write_crc(self, data):
+        # any write out of sequence changes data already hashed or leaves a gap
+        if self.offset == self._crc_offset:
+            self._update_crc(data)
+        else:
+            self._crc_valid = False
+
+    def flush(self):
+        """Wait for all writes in flight."""
+        while self._write_behind:
+            self._complete_write()
+
     def tell(self):
         return self.offset
 
     def seek(self, offset, whence=os.SEEK_SET):
+        self._check_closed()
+        self.flush()
         if whence is os.SEEK_SET:
             self.offset = offset
         elif whence is os.SEEK_END:
@@ -124,10 +431,67 @@ class FTPFile:
         else:
             raise ValueError("Unknown whence")
 
-    def truncate(self, size: int = 0):
+        return self.offset
+
+    def truncate(self, size: int = 0) -> int:
+        self._check_closed()
+        self.flush()
+        self._fm.invalidate_cache(self.name)
         req = FileTruncate.Request(file_path=self.name, length=size)
         ret = self._fm.cli_truncate.call(req)
         _check_raise_errno(ret)
+        if size < self._crc_offset:
+            self._crc_valid = False
+
+        self.size = size
+        return size
+
+    def verify(self, source: typing.Optional[typing.BinaryIO] = None) -> bool:
+        """
+        Compare CRC32 of the file with FTPPlugin.checksum().
+
+        Running CRC is used if the whole file was read or written sequentially.
+        Otherwise data is hashed again: from source, if it is given,
+        or by re-reading the remote file (read mode only).
+        """
+        self.flush()
+        remote_crc = self._fm.checksum(self.name)
+
+        if self._crc_valid and self._crc_offset == self.size:
+            return self.crc32 == remote_crc
+
+        if source is None:
+            if not self.readable():
+                raise IOError(errno.EINVAL, "Non-sequential write, source required")
+
+            source = self
+
+        offset = self.offset
+        if source is self:
+            self.seek(0)
+
+        local_crc = 0
+        try:
+            while True:
+                buf = source.read(io.DEFAULT_BUFFER_SIZE)
+                if len(buf) == 0:
+                    break
+
+                local_crc = nuttx_crc32(buf, local_crc)
+        finally:
+            if source is self:
+                self.seek(offset)
+
+        return local_crc == remote_crc
+
+    def readable(self) -> bool:
+        return self.mode in ("r", "rb")
+
+    def writable(self) -> bool:
+        return self.mode in ("w", "wb", "cw")
+
+    def seekable(self) -> bool:
+        return True
 
     @property
     def closed(self):
@@ -141,7 +505,13 @@ class FTPFile:
 
 
 class FTPPlugin(PluginModule):
-    """FTP plugin interface."""
+    """
+    FTP plugin interface.
+
+    Listings and checksums may be cached, see enable_cache().
+    """
+
+    cache: typing.Optional[FTPCache] = None
 
     @cached_property
     def cli_open(self) -> rclpy.node.Client:
@@ -191,43 +561,105 @@ class FTPPlugin(PluginModule):
     def cli_reset(self) -> rclpy.node.Client:
         return self.create_client(Empty, ("ftp", "reset"))
 
-    def open(self, path: str, mode: str = "r") -> FTPFile:
-        return FTPFile(fm=self, name=path, mode=mode)
+    def open(self, path: str, mode: str = "r", window: int = 1) -> FTPFile:
+        """
+        Open FCU file.
+
+        :param window: number of read or write requests kept in flight
+        """
+        return FTPFile(fm=self, name=path, mode=mode, window=window)
+
+    def enable_cache(self, ttl: float = 60.0):
+        """Cache results of listdir() and checksum() for ttl seconds."""
+        self.cache = FTPCache(ttl)
+
+    def invalidate_cache(self, path: typing.Optional[str] = None):
+        """Forget cached data for path, or all data if path is None."""
+        if self.cache is not None:
+            self.cache.invalidate(path)
 
     def listdir(self, dir_path: str) -> typing.List[FileEntry]:
+        if self.cache is not None:
+            entries = self.cache.get_listdir(dir_path)
+            if entries is not None:
+                return entries
+
         req = FileList.Request(dir_path=dir_path)
         ret = self.cli_listdir.call(req)
         _check_raise_errno(ret)
+
+        if self.cache is not None:
+            self.cache.put_listdir(dir_path, ret.list)
+
         return ret.list
 
+    def walk(
+        self, top: str
+    ) -> typing.Iterator[
+        typing.Tuple[str, typing.List[FileEntry], typing.List[FileEntry]]
+    ]:
+        """
+        Walk remote directory tree top-down, like os.walk().
+
+        Yields (dir_path, dir_entries, file_entries) tuples.
+        """
+        dirs, files = [], []
+        for ent in self.listdir(top):
+            if ent.name in (".", ".."):
+                continue
+            elif ent.type == FileEntry.TYPE_DIRECTORY:
+                dirs.append(ent)
+            else:
+                files.append(ent)
+
+        yield top, dirs, files
+
+        for ent in dirs:
+            yield from self.walk(posixpath.join(top, ent.name))
+
     def unlink(self, path: str):
+        self.invalidate_cache(path)
         req = FileRemove.Request(file_path=path)
         ret = self.cli_unlink.call(req)
         _check_raise_errno(ret)
 
     def mkdir(self, path: str):
+        self.invalidate_cache(path)
         req = FileMakeDir.Request(dir_path=path)
         ret = self.cli_mkdir.call(req)
         _check_raise_errno(ret)
 
     def rmdir(self, path: str):
+        self.invalidate_cache(path)
         req = FileRemoveDir.Request(dir_path=path)
         ret = self.cli_rmdir.call(req)
         _check_raise_errno(ret)
 
     def rename(self, old_path: str, new_path: str):
+        self.invalidate_cache(old_path)
+        self.invalidate_cache(new_path)
         req = FileRename.Request(old_path=old_path, new_path=new_path)
         ret = self.cli_rename.call(req)
         _check_raise_errno(ret)
 
     def checksum(self, path: str) -> int:
+        if self.cache is not None:
+            crc32 = self.cache.get_checksum(path)
+            if crc32 is not None:
+                return crc32
+
         req = FileChecksum.Request(file_path=path)
         ret = self.cli_checksum.call(req)
         _check_raise_errno(ret)
+
+        if self.cache is not None:
+            self.cache.put_checksum(path, ret.crc32)
+
         return ret.crc32
 
     def reset_server(
         self,
     ):
+        self.invalidate_cache()
         req = Empty.Request()
         self.cli_reset.call(req)
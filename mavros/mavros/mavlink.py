@@ -7,12 +7,17 @@
 # in the top-level LICENSE file of the mavros repository.
 # https://github.com/mavlink/mavros/tree/master/LICENSE.md
 
+import functools
+import hashlib
+import mmap
 import struct
+import time
 import typing
 
 import rclpy.time
+from builtin_interfaces.msg import Time
 from pymavlink import mavutil
-from pymavlink.generator.mavcrc import x25crc  # noqa F401
+from pymavlink.generator.mavcrc import x25crc
 from std_msgs.msg import Header
 
 from mavros_msgs.msg import Mavlink
@@ -21,75 +26,122 @@ from .utils import system_now
 
 MAVLink_message = typing.TypeVar("MAVLink_message")
 
+V1_HEADER = struct.Struct("<BBBBBB")
+V2_HEADER = struct.Struct("<BBBBBBBBBB")
+CHECKSUM = struct.Struct("<H")
+# tlog record prefix: microseconds since epoch, big-endian
+TLOG_STAMP = struct.Struct(">Q")
 
-def convert_to_bytes(msg: Mavlink) -> bytearray:
-    """
-    Re-builds the MAVLink byte stream from mavros_msgs/Mavlink messages.
+MAVLINK_IFLAG_SIGNED = 0x01
+MAVLINK_SIGNATURE_BLOCK_LEN = 13
+MAVLINK_MAX_PAYLOAD_LEN = 255
 
-    Support both v1.0 and v2.0.
-    """
+# signing timestamp: 10 us units since 1st January 2015 GMT
+SIGNING_EPOCH = 1420070400
+# link_id and 48-bit timestamp, packed as "<BQ"[:7]
+SIGNING_LINK_STAMP = struct.Struct("<BQ")
+
+
+@functools.lru_cache(maxsize=None)
+def payload64_struct(payload_octets: int) -> struct.Struct:
+    """Return precompiled struct for payload64 of that many octets."""
+    return struct.Struct(f"<{payload_octets}Q")
+
+
+@functools.lru_cache(maxsize=None)
+def frame_struct(magic: int, payload_octets: int) -> struct.Struct:
+    """Return precompiled struct for header and payload64 of a frame."""
+    if magic == Mavlink.MAVLINK_V10:
+        return struct.Struct(f"<BBBBBB{payload_octets}Q")
+    else:  # MAVLINK_V20
+        return struct.Struct(f"<BBBBBBBBBB{payload_octets}Q")
+
+
+def _append_frame(msgdata: bytearray, msg: Mavlink):
     payload_octets = len(msg.payload64)
-    if payload_octets < msg.len / 8:
+    if payload_octets * 8 < msg.len:
         raise ValueError("Specified payload length is bigger than actual payload64")
 
+    start = len(msgdata)
+    st = frame_struct(msg.magic, payload_octets)
     if msg.magic == Mavlink.MAVLINK_V10:
         msg_len = 6 + msg.len  # header + payload length
-        msgdata = bytearray(
-            struct.pack(
-                "<BBBBBB%dQ" % payload_octets,
-                msg.magic,
-                msg.len,
-                msg.seq,
-                msg.sysid,
-                msg.compid,
-                msg.msgid,
-                *msg.payload64,
-            )
+        msgdata += st.pack(
+            msg.magic,
+            msg.len,
+            msg.seq,
+            msg.sysid,
+            msg.compid,
+            msg.msgid,
+            *msg.payload64,
         )
     else:  # MAVLINK_V20
         msg_len = 10 + msg.len  # header + payload length
-        msgdata = bytearray(
-            struct.pack(
-                "<BBBBBBBBBB%dQ" % payload_octets,
-                msg.magic,
-                msg.len,
-                msg.incompat_flags,
-                msg.compat_flags,
-                msg.seq,
-                msg.sysid,
-                msg.compid,
-                msg.msgid & 0xFF,
-                (msg.msgid >> 8) & 0xFF,
-                (msg.msgid >> 16) & 0xFF,
-                *msg.payload64,
-            )
+        msgdata += st.pack(
+            msg.magic,
+            msg.len,
+            msg.incompat_flags,
+            msg.compat_flags,
+            msg.seq,
+            msg.sysid,
+            msg.compid,
+            msg.msgid & 0xFF,
+            (msg.msgid >> 8) & 0xFF,
+            (msg.msgid >> 16) & 0xFF,
+            *msg.payload64,
         )
 
-    if payload_octets != msg.len / 8:
-        # message is shorter than payload octets
-        msgdata = msgdata[:msg_len]
+    # message is shorter than payload octets
+    del msgdata[start + msg_len :]
 
     # finalize
-    msgdata += struct.pack("<H", msg.checksum)
+    msgdata += CHECKSUM.pack(msg.checksum)
 
     if msg.magic == Mavlink.MAVLINK_V20:
-        msgdata += bytearray(msg.signature)
+        msgdata += bytes(msg.signature)
+
+
+def convert_to_bytes(msg: Mavlink) -> bytearray:
+    """
+    Re-builds the MAVLink byte stream from mavros_msgs/Mavlink messages.
 
+    Support both v1.0 and v2.0.
+    """
+    msgdata = bytearray()
+    _append_frame(msgdata, msg)
     return msgdata
 
 
+def convert_to_stream(
+    msgs: typing.Iterable[Mavlink], buf: typing.Optional[bytearray] = None
+) -> bytearray:
+    """
+    Build one contiguous MAVLink byte stream from many messages.
+
+    If buf is passed, it's content is replaced, so the same buffer
+    could be reused between batches.
+    """
+    if buf is None:
+        buf = bytearray()
+    else:
+        del buf[:]
+
+    for msg in msgs:
+        _append_frame(buf, msg)
+
+    return buf
+
+
 def convert_to_payload64(
-    payload_bytes: typing.Union[bytes, bytearray]
+    payload_bytes: typing.Union[bytes, bytearray],
 ) -> typing.List[int]:
     """Convert payload bytes to Mavlink.payload64."""
-    payload_bytes = bytearray(payload_bytes)
-    payload_len = len(payload_bytes)
-    payload_octets = payload_len / 8
-    if payload_len % 8 > 0:
+    payload_octets, tail = divmod(len(payload_bytes), 8)
+    if tail > 0:
         payload_octets += 1
-        payload_bytes += b"\0" * (8 - payload_len % 8)
+        payload_bytes = bytes(payload_bytes) + b"\0" * (8 - tail)
 
-    return struct.unpack(f"<{payload_octets}Q", payload_bytes)
+    return payload64_struct(payload_octets).unpack(payload_bytes)
 
 
 def convert_to_rosmsg(
@@ -98,8 +150,7 @@ def convert_to_rosmsg(
     """
     Convert pymavlink message to Mavlink.msg.
 
-    Currently supports both MAVLink v1.0 and v2.0,
-    but without signing.
+    Currently supports both MAVLink v1.0 and v2.0, including signature block.
     """
     if stamp is not None:
         header = Header(stamp=stamp)
@@ -107,11 +158,14 @@ def convert_to_rosmsg(
         header = Header(stamp=system_now())
 
     if mavutil.mavlink20():
-        # XXX Need some api to retreive signature block.
-        if mavmsg.get_signed():
-            raise ValueError("Signed message can't be converted to rosmsg.")
-
         hdr = mavmsg.get_header()
+
+        # signature block is the tail of the frame.
+        # NOTE: get_signed() is only set when pymavlink has the key to check it.
+        signature = b""
+        if hdr.incompat_flags & MAVLINK_IFLAG_SIGNED:
+            signature = bytes(mavmsg.get_msgbuf()[-MAVLINK_SIGNATURE_BLOCK_LEN:])
+
         return Mavlink(
             header=header,
             framing_status=Mavlink.FRAMING_OK,
@@ -119,12 +173,13 @@ def convert_to_rosmsg(
             len=hdr.mlen,
             incompat_flags=hdr.incompat_flags,
             compat_flags=hdr.compat_flags,
+            seq=hdr.seq,
             sysid=hdr.srcSystem,
             compid=hdr.srcComponent,
             msgid=hdr.msgId,
             checksum=mavmsg.get_crc(),
             payload64=convert_to_payload64(mavmsg.get_payload()),
-            signature=None,  # FIXME #569
+            signature=signature,
         )
 
     else:
@@ -140,3 +195,307 @@ def convert_to_rosmsg(
             checksum=mavmsg.get_crc(),
             payload64=convert_to_payload64(mavmsg.get_payload()),
         )
+
+
+def frame_length(buf: typing.Union[bytes, bytearray, memoryview], start: int) -> int:
+    """
+    Return full length of the frame at start, or 0 if there is no STX.
+
+    Only first three bytes of the frame should be available.
+    """
+    magic = buf[start]
+    if magic == Mavlink.MAVLINK_V20:
+        signature_len = 0
+        if buf[start + 2] & MAVLINK_IFLAG_SIGNED:
+            signature_len = MAVLINK_SIGNATURE_BLOCK_LEN
+
+        return V2_HEADER.size + buf[start + 1] + CHECKSUM.size + signature_len
+    elif magic == Mavlink.MAVLINK_V10:
+        return V1_HEADER.size + buf[start + 1] + CHECKSUM.size
+    else:
+        return 0
+
+
+def _frame_checksum(frame: typing.Union[bytes, bytearray], crc_extra: int) -> int:
+    # frame without checksum, STX is not covered by CRC
+    crc = x25crc(frame[1:])
+    crc.accumulate(bytes((crc_extra,)))
+    return crc.crc
+
+
+class MavlinkSigning:
+    """
+    MAVLink v2.0 message signing state of one link.
+
+    SHA-256 context with the secret key is prepared once and copied
+    for every message. Keeps outgoing timestamp and last timestamps
+    of incoming (link_id, sysid, compid) streams to reject replays.
+    """
+
+    def __init__(self, secret_key: bytes, *, link_id: int = 0):
+        if len(secret_key) != 32:
+            raise ValueError("Secret key should be 32 bytes long")
+
+        self.link_id = link_id
+        self.timestamp = self.now()
+        self.stream_timestamps: typing.Dict[typing.Tuple[int, int, int], int] = {}
+        self._key_ctx = hashlib.sha256(secret_key)
+
+    @staticmethod
+    def now() -> int:
+        """Current time as signing timestamp."""
+        return int((time.time() - SIGNING_EPOCH) * 100000)
+
+    def _digest(self, data: typing.Union[bytes, bytearray]) -> bytes:
+        h = self._key_ctx.copy()
+        h.update(data)
+        return h.digest()[:6]
+
+    def sign(self, msg: Mavlink, crc_extra: typing.Optional[int] = None) -> Mavlink:
+        """
+        Add signature block to v2.0 message, in place.
+
+        If message is not flagged as signed yet, crc_extra is required
+        to recalculate checksum of the changed header.
+        """
+        if msg.magic != Mavlink.MAVLINK_V20:
+            raise ValueError("MAVLink v1.0 message can't be signed")
+
+        msg.signature = b""
+        if not msg.incompat_flags & MAVLINK_IFLAG_SIGNED:
+            if crc_extra is None:
+                raise ValueError("crc_extra required to set signed flag")
+
+            msg.incompat_flags |= MAVLINK_IFLAG_SIGNED
+            frame = convert_to_bytes(msg)
+            msg.checksum = _frame_checksum(frame[: -CHECKSUM.size], crc_extra)
+
+        self.timestamp = max(self.timestamp + 1, self.now())
+
+        frame = convert_to_bytes(msg)
+        frame += SIGNING_LINK_STAMP.pack(self.link_id, self.timestamp)[:7]
+        frame += self._digest(frame)
+        msg.signature = bytes(frame[-MAVLINK_SIGNATURE_BLOCK_LEN:])
+        return msg
+
+    def verify(self, msg: Mavlink) -> bool:
+        """Check signature and timestamp of incoming message."""
+        if (
+            msg.magic != Mavlink.MAVLINK_V20
+            or not msg.incompat_flags & MAVLINK_IFLAG_SIGNED
+            or len(msg.signature) != MAVLINK_SIGNATURE_BLOCK_LEN
+        ):
+            return False
+
+        frame = convert_to_bytes(msg)
+        link_id, timestamp = SIGNING_LINK_STAMP.unpack(frame[-13:-6] + bytes(2))
+        stream_key = (link_id, msg.sysid, msg.compid)
+
+        last_timestamp = self.stream_timestamps.get(stream_key)
+        if last_timestamp is not None:
+            if timestamp <= last_timestamp:
+                return False  # replay
+        elif timestamp + 6000 * 1000 < self.timestamp:
+            return False  # new stream, but more than a minute behind
+
+        if self._digest(frame[:-6]) != frame[-6:]:
+            return False
+
+        self.stream_timestamps[stream_key] = timestamp
+        self.timestamp = max(self.timestamp, timestamp)
+        return True
+
+
+class MavlinkStreamParser:
+    """
+    Incremental parser of raw MAVLink v1.0/v2.0 byte stream or tlog.
+
+    Incoming data is accumulated in one buffer, parsed frames are cut
+    from its head, so chunks could be fed in any size.
+
+    CRC is checked only for messages which have entry in crc_extras, e.g.:
+    {msgid: cls.crc_extra for msgid, cls in dialect.mavlink_map.items()}.
+    Frames with wrong CRC are returned with FRAMING_BAD_CRC status,
+    on a raw stream the parser then resyncs on the next STX after
+    the start of that frame, tlog records are always skipped whole.
+    If signing is set, signed frames which fail verification
+    are returned with FRAMING_BAD_SIGNATURE status.
+    """
+
+    def __init__(
+        self,
+        *,
+        tlog: bool = False,
+        crc_extras: typing.Optional[typing.Mapping[int, int]] = None,
+        signing: typing.Optional[MavlinkSigning] = None,
+    ):
+        self.tlog = tlog
+        self.crc_extras = crc_extras
+        self.signing = signing
+        self._buf = bytearray()
+        # scratch buffer to zero-pad payload to octets
+        self._payload = bytearray(MAVLINK_MAX_PAYLOAD_LEN + 8)
+
+    def _find_stx(self, pos: int) -> int:
+        idx = [
+            i
+            for i in (
+                self._buf.find(Mavlink.MAVLINK_V20, pos),
+                self._buf.find(Mavlink.MAVLINK_V10, pos),
+            )
+            if i >= 0
+        ]
+        return min(idx) if idx else len(self._buf)
+
+    def feed(
+        self, data: typing.Union[bytes, bytearray, memoryview]
+    ) -> typing.List[Mavlink]:
+        """Add data to the buffer and return all complete messages."""
+        buf = self._buf
+        buf += data
+
+        msgs = []
+        pos = 0
+        prefix_len = TLOG_STAMP.size if self.tlog else 0
+        # all frames of one chunk received at the same time
+        now = None if self.tlog else system_now().seconds_nanoseconds()
+        while True:
+            start = pos + prefix_len
+            if len(buf) < start + 3:
+                break
+
+            frame_len = frame_length(buf, start)
+            if not frame_len:
+                # lost sync, skip garbage
+                pos = pos + 1 if self.tlog else self._find_stx(pos + 1)
+                continue
+
+            if len(buf) < start + frame_len:
+                break
+
+            msg = self._decode(buf, pos, now)
+            msgs.append(msg)
+            if msg.framing_status == Mavlink.FRAMING_BAD_CRC and not self.tlog:
+                # STX may be a garbage byte, rescan right after it
+                pos = self._find_stx(start + 1)
+            else:
+                pos = start + frame_len
+
+        del buf[:pos]
+        return msgs
+
+    def decode(
+        self, buf: typing.Union[bytes, bytearray, memoryview, mmap.mmap], pos: int
+    ) -> Mavlink:
+        """
+        Decode one complete frame at pos of the buffer.
+
+        With tlog the frame is expected after the stamp, otherwise it's
+        stamped with current time.
+        """
+        now = None if self.tlog else system_now().seconds_nanoseconds()
+        return self._decode(buf, pos, now)
+
+    def _decode(
+        self,
+        buf: typing.Union[bytes, bytearray, memoryview, mmap.mmap],
+        pos: int,
+        now: typing.Optional[typing.Tuple[int, int]],
+    ) -> Mavlink:
+        if self.tlog:
+            (usec,) = TLOG_STAMP.unpack_from(buf, pos)
+            stamp = Time(sec=usec // 1000000, nanosec=(usec % 1000000) * 1000)
+            start = pos + TLOG_STAMP.size
+        else:
+            stamp = Time(sec=now[0], nanosec=now[1])
+            start = pos
+
+        if buf[start] == Mavlink.MAVLINK_V10:
+            header_len = V1_HEADER.size
+            magic, payload_len, seq, sysid, compid, msgid = V1_HEADER.unpack_from(
+                buf, start
+            )
+            incompat_flags = compat_flags = 0
+        else:
+            header_len = V2_HEADER.size
+            (
+                magic,
+                payload_len,
+                incompat_flags,
+                compat_flags,
+                seq,
+                sysid,
+                compid,
+                msgid0,
+                msgid1,
+                msgid2,
+            ) = V2_HEADER.unpack_from(buf, start)
+            msgid = msgid0 | (msgid1 << 8) | (msgid2 << 16)
+
+        payload_start = start + header_len
+        crc_start = payload_start + payload_len
+        (checksum,) = CHECKSUM.unpack_from(buf, crc_start)
+
+        payload_octets = (payload_len + 7) // 8
+        scratch = self._payload
+        scratch[:payload_len] = buf[payload_start:crc_start]
+        scratch[payload_len : payload_octets * 8] = bytes(
+            payload_octets * 8 - payload_len
+        )
+        payload64 = payload64_struct(payload_octets).unpack_from(scratch)
+
+        framing_status = Mavlink.FRAMING_OK
+        crc_extra = self.crc_extras.get(msgid) if self.crc_extras else None
+        if crc_extra is not None:
+            if _frame_checksum(buf[start:crc_start], crc_extra) != checksum:
+                framing_status = Mavlink.FRAMING_BAD_CRC
+
+        sig_start = crc_start + CHECKSUM.size
+        signature_len = 0
+        if incompat_flags & MAVLINK_IFLAG_SIGNED:
+            signature_len = MAVLINK_SIGNATURE_BLOCK_LEN
+
+        msg = Mavlink(
+            header=Header(stamp=stamp),
+            framing_status=framing_status,
+            magic=magic,
+            len=payload_len,
+            incompat_flags=incompat_flags,
+            compat_flags=compat_flags,
+            seq=seq,
+            sysid=sysid,
+            compid=compid,
+            msgid=msgid,
+            checksum=checksum,
+            payload64=payload64,
+            signature=bytes(buf[sig_start : sig_start + signature_len]),
+        )
+
+        if (
+            self.signing is not None
+            and signature_len
+            and framing_status == Mavlink.FRAMING_OK
+            and not self.signing.verify(msg)
+        ):
+            msg.framing_status = Mavlink.FRAMING_BAD_SIGNATURE
+
+        return msg
+
+
+def parse_stream(
+    file_: typing.BinaryIO,
+    *,
+    tlog: bool = False,
+    crc_extras: typing.Optional[typing.Mapping[int, int]] = None,
+    signing: typing.Optional[MavlinkSigning] = None,
+    chunk_size: int = 64 * 1024,
+) -> typing.Iterator[Mavlink]:
+    """Read raw MAVLink stream or tlog file and yield Mavlink messages."""
+    parser = MavlinkStreamParser(tlog=tlog, crc_extras=crc_extras, signing=signing)
+    chunk = bytearray(chunk_size)
+    while True:
+        chunk_len = file_.readinto(chunk)
+        if not chunk_len:
+            break
+
+        yield from parser.feed(memoryview(chunk)[:chunk_len])
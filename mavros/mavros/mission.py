@@ -9,12 +9,25 @@
 
 import csv
 import itertools
+import json
+import math
 import threading
 import typing
+import warnings
 from collections import OrderedDict
 
 import rclpy
 
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
 from mavros_msgs.msg import CommandCode, Waypoint, WaypointList
 from mavros_msgs.srv import (
     WaypointClear,
@@ -85,27 +98,51 @@ class PlanFile:
         raise NotImplementedError
 
 
+if np is not None:
+    # fields_map layout of QGroundControlWPL, floats are kept as in the file
+    WPL_DTYPE = np.dtype(
+        [
+            ("is_current", "?"),
+            ("frame", "u1"),
+            ("command", "u2"),
+            ("param1", "f8"),
+            ("param2", "f8"),
+            ("param3", "f8"),
+            ("param4", "f8"),
+            ("x_lat", "f8"),
+            ("y_long", "f8"),
+            ("z_alt", "f8"),
+            ("autocontinue", "?"),
+        ]
+    )
+
+
 class QGroundControlWPL(PlanFile):
-    """Parse QGC waypoint file."""
+    """
+    Parse QGC waypoint file.
+
+    With NumPy rows are loaded to a structured array of WPL_DTYPE (points),
+    Waypoint messages are created on the first access to mission.
+    """
 
     file_header = "QGC WPL 120"
     known_versions = (110, 120)
 
     FieldTypes = typing.Union[bool, int, float]
-    fields_map: typing.Mapping[
-        str, typing.Callable[[typing.Any], FieldTypes]
-    ] = OrderedDict(
-        is_current=lambda x: bool(int(x)),
-        frame=int,
-        command=int,
-        param1=float,
-        param2=float,
-        param3=float,
-        param4=float,
-        x_lat=float,
-        y_long=float,
-        z_alt=float,
-        autocontinue=lambda x: bool(int(x)),
+    fields_map: typing.Mapping[str, typing.Callable[[typing.Any], FieldTypes]] = (
+        OrderedDict(
+            is_current=lambda x: bool(int(x)),
+            frame=int,
+            command=int,
+            param1=float,
+            param2=float,
+            param3=float,
+            param4=float,
+            x_lat=float,
+            y_long=float,
+            z_alt=float,
+            autocontinue=lambda x: bool(int(x)),
+        )
     )
 
     class CSVDialect(csv.Dialect):
@@ -115,6 +152,55 @@ class QGroundControlWPL(PlanFile):
         lineterminator = "\r\n"
         quoting = csv.QUOTE_NONE
 
+    points: typing.Optional["np.ndarray"] = None
+    _mission: typing.Optional[typing.List[Waypoint]] = None
+
+    @property
+    def mission(self) -> typing.Optional[typing.List[Waypoint]]:
+        if self._mission is None and self.points is not None:
+            names = list(self.fields_map.keys())
+            self._mission = [
+                Waypoint(**dict(zip(names, row))) for row in self.points.tolist()
+            ]
+        return self._mission
+
+    @mission.setter
+    def mission(self, value: typing.Optional[typing.List[Waypoint]]):
+        self._mission = value
+        self.points = None
+
+    def _is_header(self, line: str) -> bool:
+        header = line.rstrip("\r\n").split("\t")[0].split(" ", 3)
+        if len(header) != 3:
+            return False
+
+        qgc, wpl, ver = header
+        return qgc == "QGC" and wpl == "WPL" and int(ver) in self.known_versions
+
+    def _load_wpl_array(self, file_: typing.TextIO) -> "np.ndarray":
+        got_header = False
+        lines = []
+        for line in file_:
+            if line.startswith("#") or not line.strip():
+                continue
+
+            if not got_header:
+                got_header = self._is_header(line)
+            else:
+                lines.append(line)
+
+        ret = np.zeros(len(lines), dtype=WPL_DTYPE)
+        if not lines:
+            return ret
+
+        rows = np.loadtxt(
+            lines, delimiter="\t", usecols=range(len(self.fields_map) + 1), ndmin=2
+        )
+        for i, name in enumerate(self.fields_map.keys(), start=1):
+            ret[name] = rows[:, i]
+
+        return ret
+
     def _parse_wpl_file(self, file_: typing.TextIO):
         got_header = False
         reader = csv.reader(
@@ -139,13 +225,17 @@ class QGroundControlWPL(PlanFile):
                 )
 
     def load(self, file_: typing.TextIO) -> PlanFile:
-        self.mission = list(self._parse_wpl_file(file_))
+        if np is not None:
+            self.mission = None
+            self.points = self._load_wpl_array(file_)
+        else:
+            self.mission = list(self._parse_wpl_file(file_))
         self.fence = None
         self.rally = None
         return self
 
     def save(self, file_: typing.TextIO):
-        assert self.mission is not None, "empty mission"
+        assert self._mission is not None or self.points is not None, "empty mission"
         assert self.fence is None, "WPL do not support geofences"
         assert self.rally is None, "WPL do not support rallypoints"
 
@@ -156,15 +246,312 @@ class QGroundControlWPL(PlanFile):
 
         writer = csv.writer(file_, self.CSVDialect)
         writer.writerow((self.file_header,))
-        for seq, w in enumerate(self.mission):
+
+        if self._mission is None:
+            # not materialized, write right from the array columns
+            columns = [
+                (
+                    self.points[k].astype(int)
+                    if self.points.dtype[k] == bool
+                    else self.points[k]
+                )
+                for k in self.fields_map.keys()
+            ]
+            writer.writerows(
+                zip(range(len(self.points)), *(c.tolist() for c in columns))
+            )
+            return
+
+        for seq, w in enumerate(self._mission):
             row = itertools.chain(
                 (seq,), (flt_bool(getattr(w, k)) for k in self.fields_map.keys())
             )
             writer.writerow(row)
 
 
+# MAV_AUTOPILOT_ARDUPILOTMEGA, its missions have home position at index 0
+MAV_AUTOPILOT_ARDUPILOTMEGA = 3
+
+FENCE_VERTEX_CMDS = (
+    CommandCode.NAV_FENCE_POLYGON_VERTEX_INCLUSION,
+    CommandCode.NAV_FENCE_POLYGON_VERTEX_EXCLUSION,
+)
+FENCE_CIRCLE_CMDS = (
+    CommandCode.NAV_FENCE_CIRCLE_INCLUSION,
+    CommandCode.NAV_FENCE_CIRCLE_EXCLUSION,
+)
+
+
+def _nan_to_none(x: float) -> typing.Optional[float]:
+    return None if math.isnan(x) else x
+
+
+def _none_to_nan(x: typing.Optional[float]) -> float:
+    return math.nan if x is None else float(x)
+
+
 class QGroundControlPlan(PlanFile):
-    pass  # TODO(vooon): implement me!
+    """
+    Parse QGC plan file.
+
+    Complex items (survey, corridor scan, structure scan) are loaded as
+    their generated simple items, and saved as simple items.
+    Complex items stored without them are skipped with a warning.
+    DO_JUMP target is doJumpId in the file and mission index in memory.
+    Uses orjson to parse, if it is available.
+    """
+
+    file_type = "Plan"
+    known_versions = (1,)
+
+    firmware_type: int = 0  # MAV_AUTOPILOT_GENERIC
+    vehicle_type: int = 2  # MAV_TYPE_QUADROTOR
+    cruise_speed: float = 15.0
+    hover_speed: float = 5.0
+    home_position: typing.Optional[typing.Sequence[float]] = None
+    # mission[0] is the planned home, ArduPilot missions start with it
+    mission_has_home: bool = False
+
+    @staticmethod
+    def _parse_simple_item(item: dict) -> Waypoint:
+        p1, p2, p3, p4, x, y, z = item["params"]
+        return Waypoint(
+            frame=item["frame"],
+            command=item["command"],
+            is_current=False,
+            autocontinue=item.get("autoContinue", True),
+            param1=_none_to_nan(p1),
+            param2=_none_to_nan(p2),
+            param3=_none_to_nan(p3),
+            param4=_none_to_nan(p4),
+            x_lat=_none_to_nan(x),
+            y_long=_none_to_nan(y),
+            z_alt=_none_to_nan(z),
+        )
+
+    def _parse_mission_items(
+        self, items: list
+    ) -> typing.Iterator[typing.Tuple[typing.Optional[int], Waypoint]]:
+        """
+        Yield (doJumpId, waypoint) of simple items and expanded complex ones.
+
+        Complex item is expanded from simple items QGC stored with it,
+        one without them is skipped with a warning.
+        """
+        parse = self._parse_simple_item
+        for item in items:
+            type_ = item["type"]
+            if type_ == "SimpleItem":
+                yield item.get("doJumpId"), parse(item)
+                continue
+
+            sub_items = item.get("TransectStyleComplexItem", item).get("Items")
+            if type_ != "ComplexItem" or sub_items is None:
+                warnings.warn(
+                    "skipping mission item without simple items: "
+                    f"{item.get('complexItemType', type_)}"
+                )
+                continue
+
+            for sub_item in sub_items:
+                yield sub_item.get("doJumpId"), parse(sub_item)
+
+    @staticmethod
+    def _parse_fence(geofence: dict) -> typing.Iterator[Waypoint]:
+        for p in geofence.get("polygons", []):
+            cmd = FENCE_VERTEX_CMDS[0 if p["inclusion"] else 1]
+            vertices = p["polygon"]
+            for lat, lon in vertices:
+                yield Waypoint(
+                    frame=Waypoint.FRAME_GLOBAL,
+                    command=cmd,
+                    autocontinue=True,
+                    param1=float(len(vertices)),
+                    x_lat=float(lat),
+                    y_long=float(lon),
+                )
+
+        for c in geofence.get("circles", []):
+            lat, lon = c["circle"]["center"]
+            yield Waypoint(
+                frame=Waypoint.FRAME_GLOBAL,
+                command=FENCE_CIRCLE_CMDS[0 if c["inclusion"] else 1],
+                autocontinue=True,
+                param1=float(c["circle"]["radius"]),
+                x_lat=float(lat),
+                y_long=float(lon),
+            )
+
+        breach_return = geofence.get("breachReturn")
+        if breach_return and not any(
+            math.isnan(_none_to_nan(v)) for v in breach_return
+        ):
+            lat, lon, alt = breach_return
+            yield Waypoint(
+                frame=Waypoint.FRAME_GLOBAL_REL_ALT,
+                command=CommandCode.NAV_FENCE_RETURN_POINT,
+                autocontinue=True,
+                x_lat=float(lat),
+                y_long=float(lon),
+                z_alt=float(alt),
+            )
+
+    @staticmethod
+    def _parse_rally(rally: dict) -> typing.Iterator[Waypoint]:
+        for lat, lon, alt in rally.get("points", []):
+            yield Waypoint(
+                frame=Waypoint.FRAME_GLOBAL_REL_ALT,
+                command=CommandCode.NAV_RALLY_POINT,
+                autocontinue=True,
+                x_lat=float(lat),
+                y_long=float(lon),
+                z_alt=float(alt),
+            )
+
+    def load(self, file_: typing.TextIO) -> PlanFile:
+        data = file_.read()
+        plan = orjson.loads(data) if orjson is not None else json.loads(data)
+
+        if plan.get("fileType") != self.file_type:
+            raise ValueError(f"not a plan file: {plan.get('fileType')}")
+        if plan.get("version") not in self.known_versions:
+            raise ValueError(f"unsupported plan version: {plan.get('version')}")
+
+        mission = plan.get("mission", {})
+        self.firmware_type = mission.get("firmwareType", self.firmware_type)
+        self.vehicle_type = mission.get("vehicleType", self.vehicle_type)
+        self.cruise_speed = mission.get("cruiseSpeed", self.cruise_speed)
+        self.hover_speed = mission.get("hoverSpeed", self.hover_speed)
+        self.home_position = mission.get("plannedHomePosition")
+
+        self.mission_has_home = bool(
+            self.firmware_type == MAV_AUTOPILOT_ARDUPILOTMEGA and self.home_position
+        )
+        # doJumpId -> mission index, planned home takes index 0
+        first_index = int(self.mission_has_home)
+        jump_targets = {}
+        self.mission = []
+        for jump_id, w in self._parse_mission_items(mission.get("items", [])):
+            if jump_id is not None:
+                jump_targets[jump_id] = first_index + len(self.mission)
+            self.mission.append(w)
+
+        for w in self.mission:
+            if w.command == CommandCode.DO_JUMP:
+                target = jump_targets.get(int(w.param1))
+                if target is None:
+                    raise ValueError(f"DO_JUMP target not found: {int(w.param1)}")
+                w.param1 = float(target)
+
+        if self.mission_has_home:
+            lat, lon, alt = self.home_position
+            home = Waypoint(
+                frame=Waypoint.FRAME_GLOBAL,
+                command=CommandCode.NAV_WAYPOINT,
+                autocontinue=True,
+                x_lat=float(lat),
+                y_long=float(lon),
+                z_alt=float(alt),
+            )
+            self.mission.insert(0, home)
+
+        self.fence = list(self._parse_fence(plan.get("geoFence", {})))
+        self.rally = list(self._parse_rally(plan.get("rallyPoints", {})))
+        return self
+
+    @staticmethod
+    def _dump_simple_item(seq: int, w: Waypoint, first_index: int) -> dict:
+        param1 = w.param1
+        if w.command == CommandCode.DO_JUMP:
+            # doJumpId of the target, items are numbered from 1
+            param1 = param1 - first_index + 1
+
+        return {
+            "autoContinue": bool(w.autocontinue),
+            "command": w.command,
+            "doJumpId": seq,
+            "frame": w.frame,
+            "params": [
+                _nan_to_none(param1),
+                _nan_to_none(w.param2),
+                _nan_to_none(w.param3),
+                _nan_to_none(w.param4),
+                _nan_to_none(w.x_lat),
+                _nan_to_none(w.y_long),
+                _nan_to_none(w.z_alt),
+            ],
+            "type": "SimpleItem",
+        }
+
+    @staticmethod
+    def _dump_fence(fence: typing.Sequence[Waypoint]) -> dict:
+        polygons = []
+        circles = []
+        breach_return = None
+
+        it = iter(fence)
+        for w in it:
+            if w.command in FENCE_VERTEX_CMDS:
+                vertices = [w] + list(itertools.islice(it, int(w.param1) - 1))
+                polygons.append(
+                    {
+                        "inclusion": w.command == FENCE_VERTEX_CMDS[0],
+                        "polygon": [[v.x_lat, v.y_long] for v in vertices],
+                        "version": 1,
+                    }
+                )
+            elif w.command in FENCE_CIRCLE_CMDS:
+                circles.append(
+                    {
+                        "circle": {"center": [w.x_lat, w.y_long], "radius": w.param1},
+                        "inclusion": w.command == FENCE_CIRCLE_CMDS[0],
+                        "version": 1,
+                    }
+                )
+            elif w.command == CommandCode.NAV_FENCE_RETURN_POINT:
+                breach_return = [w.x_lat, w.y_long, w.z_alt]
+            else:
+                raise ValueError(f"unsupported fence item: {w.command}")
+
+        ret = {"circles": circles, "polygons": polygons, "version": 2}
+        if breach_return is not None:
+            ret["breachReturn"] = breach_return
+        return ret
+
+    def save(self, file_: typing.TextIO):
+        mission = self.mission or []
+        home_position = self.home_position
+        first_index = 0
+        if self.mission_has_home and mission:
+            home, mission = mission[0], mission[1:]
+            home_position = [home.x_lat, home.y_long, home.z_alt]
+            first_index = 1
+
+        dump = self._dump_simple_item
+        plan = {
+            "fileType": self.file_type,
+            "geoFence": self._dump_fence(self.fence or []),
+            "groundStation": "QGroundControl",
+            "mission": {
+                "cruiseSpeed": self.cruise_speed,
+                "firmwareType": self.firmware_type,
+                "hoverSpeed": self.hover_speed,
+                "items": [
+                    dump(seq, w, first_index) for seq, w in enumerate(mission, start=1)
+                ],
+                "plannedHomePosition": list(home_position or (0.0, 0.0, 0.0)),
+                "vehicleType": self.vehicle_type,
+                "version": 2,
+            },
+            "rallyPoints": {
+                "points": [[w.x_lat, w.y_long, w.z_alt] for w in self.rally or []],
+                "version": 2,
+            },
+            "version": self.known_versions[-1],
+        }
+
+        # same layout as QGC writes
+        json.dump(plan, file_, indent=4)
 
 
 class MissionPluginBase(PluginModule):
@@ -7,6 +7,8 @@
 # in the top-level LICENSE file of the mavros repository.
 # https://github.com/mavlink/mavros/tree/master/LICENSE.md
 
+import zlib
+
 __all__ = ("nuttx_crc32",)
 
 CRC32_TAB = (
@@ -269,9 +271,24 @@ CRC32_TAB = (
 )
 
 
-def nuttx_crc32(b: bytes, crc32val: int = 0) -> int:
-    """CRC32 algo from NuttX."""
+def nuttx_crc32_slow(b: bytes, crc32val: int = 0) -> int:
+    """
+    CRC32 algo from NuttX.
+
+    Reference byte-by-byte implementation, kept for tests and benchmarks.
+    """
     for b in bytearray(b):
         crc32val = CRC32_TAB[(crc32val ^ b) & 0xFF] ^ (crc32val >> 8)
 
     return crc32val
+
+
+def nuttx_crc32(b: bytes, crc32val: int = 0) -> int:
+    """
+    CRC32 algo from NuttX.
+
+    NuttX uses the same polynomial as zlib, but without initial and final
+    inversion of the register, so we undo zlib's conditioning around the call.
+    Accepts any object supporting buffer protocol (bytes, bytearray, memoryview, mmap).
+    """
+    return zlib.crc32(b, crc32val ^ 0xFFFFFFFF) ^ 0xFFFFFFFF
@@ -9,18 +9,39 @@
 
 import csv
 import datetime
+import fnmatch
+import itertools
+import math
+import os
+import pathlib
+import queue
+import sqlite3
+import threading
+import time
 import typing
+from dataclasses import dataclass, field
 
 import rclpy
 from rcl_interfaces.msg import Parameter as ParameterMsg
-from rcl_interfaces.msg import ParameterValue
+from rcl_interfaces.msg import ParameterValue, SetParametersResult
 from rcl_interfaces.srv import GetParameters, ListParameters, SetParameters
 from rclpy.parameter import Parameter
 
-from mavros_msgs.msg import ParamEvent
-from mavros_msgs.srv import ParamPull, ParamSetV2
+try:
+    import numpy as np
+except ImportError:
+    np = None
 
-from .base import PARAMETERS_QOS, PluginModule, SubscriptionCallable, cached_property
+from mavros_msgs.msg import ParamEvent
+from mavros_msgs.srv import ParamPull, ParamSetV2, VehicleInfoGet
+
+from .base import (
+    PARAMETERS_QOS,
+    PluginModule,
+    SubscriptionCallable,
+    cached_property,
+    wait_for_service,
+)
 from .utils import (
     call_get_parameters,
     call_list_parameters,
@@ -28,23 +49,354 @@ from .utils import (
     parameter_from_parameter_value,
 )
 
+BULK_SET_BATCH_SIZE = 20
+BULK_SET_IN_FLIGHT = 4
+BULK_SET_RETRIES = 2
+# seconds to wait for a response of any batch in flight
+BULK_SET_TIMEOUT = 5.0
+
+# PX4 reports hash of all parameter values with that name
+PARAM_HASH_NAME = "_HASH_CHECK"
+
+GLOB_CHARS = "*?["
+
+# FCU stores most of parameters as float32, so text values don't round trip exactly
+PARAM_DIFF_REL_TOL = 1e-6
+PARAM_DIFF_ABS_TOL = 1e-9
+
+# events arriving within that period are reported by one changes callback
+PARAM_CHANGES_PERIOD = 0.05
+
+ChangesCallable = typing.Callable[[typing.Set[str]], None]
+
+# wait that long for the next event, before asking for missing parameters
+PULL_STALL_TIMEOUT = 0.5
+# param_index of parameters which FCU doesn't know index of
+PARAM_INDEX_UNKNOWN = 0xFFFF
+
+# (received, expected)
+PullProgressCallable = typing.Callable[[int, typing.Optional[int]], None]
+
+# (name, value, type)
+ParamTuple = typing.Tuple[str, typing.Union[int, float], Parameter.Type]
+
+# MAV_PARAM_TYPE_REAL32, MAV_PARAM_TYPE_REAL64
+MAV_PARAM_REAL_TYPES = (9, 10)
+
+if np is not None:
+    # MAVLink param_id is up to 16 chars
+    PARAM_DTYPE = np.dtype([("name", "U16"), ("value", "f8"), ("type", "u1")])
+
+# (uid, sysid, compid)
+VehicleKey = typing.Tuple[str, int, int]
+
+
+@dataclass
+class ParamSetResult:
+    """Result of setting one parameter."""
+
+    parameter: Parameter
+    successful: bool
+    reason: str = ""
+    attempts: int = 1
+
+    @property
+    def name(self) -> str:
+        return self.parameter.name
+
+
+@dataclass
+class BulkSetResult:
+    """Results of set_parameters_bulk()."""
+
+    results: typing.Dict[str, ParamSetResult] = field(default_factory=dict)
+    elapsed: float = 0.0
+
+    @property
+    def succeeded(self) -> typing.List[ParamSetResult]:
+        return [r for r in self.results.values() if r.successful]
+
+    @property
+    def failed(self) -> typing.List[ParamSetResult]:
+        return [r for r in self.results.values() if not r.successful]
+
+    def check_and_raise(self):
+        msg = ";".join(f"{r.name}: {r.reason}" for r in self.failed)
+        if msg:
+            raise ValueError(msg)
+
+
+@dataclass
+class ParamDiff:
+    """Difference between two parameter sets, from old to new."""
+
+    changed: typing.Dict[str, typing.Tuple[Parameter, Parameter]] = field(
+        default_factory=dict
+    )
+    added: typing.Dict[str, Parameter] = field(default_factory=dict)
+    missing: typing.Dict[str, Parameter] = field(default_factory=dict)
+    unchanged: int = 0
+
+    def __bool__(self) -> bool:
+        return bool(self.changed or self.added or self.missing)
+
+    @property
+    def delta(self) -> typing.Dict[str, Parameter]:
+        """New values of changed and added parameters, i.e. what to send."""
+        ret = {k: new for k, (_, new) in self.changed.items()}
+        ret.update(self.added)
+        return ret
+
+
+def _param_values_equal(
+    a: typing.Any, b: typing.Any, rel_tol: float, abs_tol: float
+) -> bool:
+    if isinstance(a, float) or isinstance(b, float):
+        try:
+            return math.isclose(a, b, rel_tol=rel_tol, abs_tol=abs_tol)
+        except TypeError:
+            return False
+
+    return a == b
+
+
+def diff_parameters(
+    old: typing.Mapping[str, Parameter],
+    new: typing.Mapping[str, Parameter],
+    *,
+    rel_tol: float = PARAM_DIFF_REL_TOL,
+    abs_tol: float = PARAM_DIFF_ABS_TOL,
+) -> ParamDiff:
+    """
+    Compare two parameter sets.
+
+    Values are compared as numbers, so int 1 equals to float 1.0,
+    floats are equal within tolerance.
+    """
+    old_keys = old.keys()
+    new_keys = new.keys()
+
+    ret = ParamDiff(
+        added={k: new[k] for k in sorted(new_keys - old_keys)},
+        missing={k: old[k] for k in sorted(old_keys - new_keys)},
+    )
+    for k in sorted(old_keys & new_keys):
+        a, b = old[k], new[k]
+        if _param_values_equal(a.value, b.value, rel_tol, abs_tol):
+            ret.unchanged += 1
+        else:
+            ret.changed[k] = (a, b)
+
+    return ret
+
+
+def default_cache_path() -> pathlib.Path:
+    cache_home = os.environ.get("XDG_CACHE_HOME") or pathlib.Path.home() / ".cache"
+    return pathlib.Path(cache_home) / "mavros" / "params.sqlite"
+
+
+class ParamCache:
+    """
+    On-disk cache of vehicle parameters, sqlite backed.
+
+    Entry is keyed by vehicle UID and (sysid, compid), and is valid only
+    while vehicle reports the same parameter count and hash (if it has one).
+    ParamPlugin uses only entries with a hash, see ParamPlugin.enable_cache().
+    """
+
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS vehicles (
+            uid TEXT, sysid INTEGER, compid INTEGER,
+            count INTEGER, hash INTEGER, stamp REAL,
+            PRIMARY KEY (uid, sysid, compid)
+        );
+        CREATE TABLE IF NOT EXISTS params (
+            uid TEXT, sysid INTEGER, compid INTEGER,
+            name TEXT, type INTEGER, value,
+            PRIMARY KEY (uid, sysid, compid, name)
+        ) WITHOUT ROWID;
+    """
+
+    def __init__(self, path: typing.Union[str, os.PathLike, None] = None):
+        if path is None:
+            path = default_cache_path()
+            path.parent.mkdir(parents=True, exist_ok=True)
+
+        self.path = path
+        self._lock = threading.Lock()
+        # updates come from spinner thread
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        with self._lock, self._db:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript(self.SCHEMA)
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+    @staticmethod
+    def _to_row(key: VehicleKey, p: Parameter) -> tuple:
+        return (*key, p.name, p.type_.value, p.value)
+
+    @staticmethod
+    def _from_row(name: str, type_: int, value) -> Parameter:
+        type_ = Parameter.Type(type_)
+        if type_ == Parameter.Type.BOOL:
+            value = bool(value)
+        elif type_ == Parameter.Type.DOUBLE:
+            value = float(value)
+        return Parameter(name, type_, value)
+
+    def load(
+        self,
+        key: VehicleKey,
+        count: typing.Optional[int],
+        param_hash: typing.Optional[int] = None,
+    ) -> typing.Optional[typing.Dict[str, Parameter]]:
+        """
+        Return cached parameters, or None if entry is missing or stale.
+
+        count of None skips comparison with parameter count of the vehicle.
+        """
+        with self._lock:
+            row = self._db.execute(
+                "SELECT count, hash FROM vehicles WHERE uid=? AND sysid=? AND compid=?",
+                key,
+            ).fetchone()
+            if row is None or row[1] != param_hash:
+                return None
+            if count is not None and row[0] != count:
+                return None
+            count = row[0]
+
+            rows = self._db.execute(
+                "SELECT name, type, value FROM params "
+                "WHERE uid=? AND sysid=? AND compid=?",
+                key,
+            ).fetchall()
+
+        if len(rows) != count:
+            return None
+
+        return {name: self._from_row(name, t, v) for name, t, v in rows}
+
+    def save(
+        self,
+        key: VehicleKey,
+        parameters: typing.Iterable[Parameter],
+        count: int,
+        param_hash: typing.Optional[int] = None,
+    ):
+        """Replace cached parameters of the vehicle."""
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM params WHERE uid=? AND sysid=? AND compid=?", key
+            )
+            self._db.executemany(
+                "INSERT INTO params VALUES (?, ?, ?, ?, ?, ?)",
+                (self._to_row(key, p) for p in parameters),
+            )
+            self._db.execute(
+                "INSERT OR REPLACE INTO vehicles VALUES (?, ?, ?, ?, ?, ?)",
+                (*key, count, param_hash, time.time()),
+            )
+
+    def update(self, key: VehicleKey, parameters: typing.Iterable[Parameter]):
+        """Update some cached parameters of the vehicle."""
+        with self._lock, self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO params VALUES (?, ?, ?, ?, ?, ?)",
+                (self._to_row(key, p) for p in parameters),
+            )
+
+    def invalidate(self, key: VehicleKey):
+        with self._lock, self._db:
+            self._db.execute(
+                "DELETE FROM vehicles WHERE uid=? AND sysid=? AND compid=?", key
+            )
+            self._db.execute(
+                "DELETE FROM params WHERE uid=? AND sysid=? AND compid=?", key
+            )
+
+
+def _parse_numeric(x: str) -> typing.Tuple[typing.Union[int, float], Parameter.Type]:
+    if x.lstrip("-").isdigit():
+        return int(x), Parameter.Type.INTEGER
+    return float(x), Parameter.Type.DOUBLE
+
 
 class ParamFile:
-    """Base class for param file parsers."""
+    """
+    Base class for param file parsers.
 
-    parameters: typing.Optional[typing.Dict[str, Parameter]] = None
+    load() keeps parsed (name, value, type) tuples in records,
+    Parameter objects are created on the first access to parameters.
+    """
+
+    records: typing.Optional[typing.List[ParamTuple]] = None
     stamp: typing.Optional[datetime.datetime] = None
     tgt_system: int = 1
     tgt_component: int = 1
 
+    _parameters: typing.Optional[typing.Dict[str, Parameter]] = None
+
+    @property
+    def parameters(self) -> typing.Optional[typing.Dict[str, Parameter]]:
+        if self._parameters is None and self.records is not None:
+            self._parameters = {
+                name: Parameter(name, type_, value)
+                for name, value, type_ in self.records
+            }
+        return self._parameters
+
+    @parameters.setter
+    def parameters(self, value: typing.Optional[typing.Dict[str, Parameter]]):
+        self._parameters = value
+        self.records = None
+
+    @classmethod
+    def parse(cls, lines: typing.Iterable[str]) -> typing.Iterator[ParamTuple]:
+        """Parse lines of the file to (name, value, type) tuples."""
+        raise NotImplementedError
+
+    @classmethod
+    def match(cls, line: str) -> bool:
+        """Check that the first data line looks like that format."""
+        raise NotImplementedError
+
     def load(self, file_: typing.TextIO) -> "ParamFile":
         """Load Parameters from a file."""
-        raise NotImplementedError
+        self.records = list(self.parse(file_))
+        self._parameters = None
+        return self
 
     def save(self, file_: typing.TextIO):
         """Write Parameters to a file."""
         raise NotImplementedError
 
+    def to_array(self) -> "np.ndarray":
+        """Return loaded parameters as NumPy structured array of PARAM_DTYPE."""
+        if np is None:
+            raise RuntimeError("NumPy is not installed")
+
+        if self.records is not None:
+            items = [(n, v, t.value) for n, v, t in self.records]
+        else:
+            items = [(p.name, p.value, p.type_.value) for p in self.parameters.values()]
+
+        return np.array(items, dtype=PARAM_DTYPE)
+
+    def diff(
+        self,
+        other: typing.Union["ParamFile", typing.Mapping[str, Parameter]],
+        **kwargs,
+    ) -> ParamDiff:
+        """Compare with other file or ParamDict, kwargs passed to diff_parameters()."""
+        if isinstance(other, ParamFile):
+            other = other.parameters
+
+        return diff_parameters(self.parameters, other, **kwargs)
+
 
 class MavProxyParam(ParamFile):
     """Parse MavProxy parm file."""
@@ -55,24 +407,28 @@ class MavProxyParam(ParamFile):
         skipinitialspace = True
         lineterminator = "\r\n"
         quoting = csv.QUOTE_NONE
-        escapechar = ""
+        escapechar = None
 
-    def _parse_param_file(self, file_: typing.TextIO):
-        def to_numeric(x):
-            return float(x) if "." in x else int(x)
+    @classmethod
+    def _split(cls, line: str) -> typing.List[str]:
+        return line.split()
 
-        for data in csv.reader(file_, self.CSVDialect):
-            if data[0].startswith("#"):
+    @classmethod
+    def match(cls, line: str) -> bool:
+        return len(cls._split(line)) == 2
+
+    @classmethod
+    def parse(cls, lines: typing.Iterable[str]) -> typing.Iterator[ParamTuple]:
+        for line in lines:
+            if line.startswith("#") or not line.strip():
                 continue  # skip comments
 
+            data = cls._split(line)
             if len(data) != 2:
                 raise ValueError("wrong field count")
 
-            yield Parameter(data[0].strip(), value=to_numeric(data[1]))
-
-    def load(self, file_: typing.TextIO) -> ParamFile:
-        self.parameters = {p.name: p for p in self._parse_param_file(file_)}
-        return self
+            name = data[0].strip()
+            yield (name, *_parse_numeric(data[1].strip()))
 
     def save(self, file_: typing.TextIO):
         if self.stamp is None:
@@ -95,7 +451,11 @@ class MissionPlannerParam(MavProxyParam):
         skipinitialspace = True
         lineterminator = "\r\n"
         quoting = csv.QUOTE_NONE
-        escapechar = ""
+        escapechar = None
+
+    @classmethod
+    def _split(cls, line: str) -> typing.List[str]:
+        return line.rstrip("\r\n").split(",")
 
 
 class QGroundControlParam(ParamFile):
@@ -107,24 +467,30 @@ class QGroundControlParam(ParamFile):
         skipinitialspace = True
         lineterminator = "\n"
         quoting = csv.QUOTE_NONE
-        escapechar = ""
+        escapechar = None
 
-    def _parse_param_file(self, file_: typing.TextIO):
-        def to_numeric(x):
-            return float(x) if "." in x else int(x)
+    @classmethod
+    def match(cls, line: str) -> bool:
+        return line.count("\t") == 4
 
-        for data in csv.reader(file_, self.CSVDialect):
-            if data[0].startswith("#"):
+    @classmethod
+    def parse(cls, lines: typing.Iterable[str]) -> typing.Iterator[ParamTuple]:
+        for line in lines:
+            if line.startswith("#") or not line.strip():
                 continue  # skip comments
 
+            data = line.rstrip("\r\n").split("\t")
             if len(data) != 5:
                 raise ValueError("wrong field count")
 
-            yield Parameter(data[2].strip(), value=to_numeric(data[3]))
-
-    def load(self, file_: typing.TextIO) -> ParamFile:
-        self.parameters = {p.name: p for p in self._parse_param_file(file_)}
-        return self
+            name, value = data[2].strip(), data[3].strip()
+            # type column is more reliable than the look of the value
+            if int(data[4]) in MAV_PARAM_REAL_TYPES:
+                yield name, float(value), Parameter.Type.DOUBLE
+            elif "." in value:
+                yield name, int(float(value)), Parameter.Type.INTEGER
+            else:
+                yield name, int(value), Parameter.Type.INTEGER
 
     def save(self, file_: typing.TextIO):
         def to_type(x):
@@ -159,12 +525,136 @@ class QGroundControlParam(ParamFile):
             )
 
 
+PARAM_FILE_CLASSES: typing.Tuple[typing.Type[ParamFile], ...] = (
+    QGroundControlParam,
+    MissionPlannerParam,
+    MavProxyParam,
+)
+
+
+def detect_param_file(
+    file_: typing.TextIO,
+) -> typing.Optional[typing.Type[ParamFile]]:
+    """
+    Guess format by the first data line.
+
+    File must be seekable, position is restored.
+    """
+    pos = file_.tell()
+    try:
+        for line in iter(file_.readline, ""):
+            if line.startswith("#") or not line.strip():
+                continue
+
+            for cls in PARAM_FILE_CLASSES:
+                if cls.match(line):
+                    return cls
+
+            return None
+    finally:
+        file_.seek(pos)
+
+    return None
+
+
+def _coerce_value(type_: Parameter.Type, value: typing.Any) -> typing.Any:
+    if type_ == Parameter.Type.BOOL:
+        return bool(value)
+    elif type_ == Parameter.Type.INTEGER:
+        return int(value)
+    elif type_ == Parameter.Type.DOUBLE:
+        return float(value)
+    else:
+        return value
+
+
+class ParamPullTracker:
+    """
+    Tracks parameters received by events during a pull.
+
+    Uses param_index/param_count of events, so it knows which indexes
+    are missing, and names, for parameters without index.
+    """
+
+    def __init__(self, progress: typing.Optional[PullProgressCallable] = None):
+        self.progress = progress
+        self.count: typing.Optional[int] = None
+        self.names: typing.Set[str] = set()
+        self._indexes: typing.Set[int] = set()
+        self._cond = threading.Condition()
+
+    def update(self, msg: ParamEvent):
+        with self._cond:
+            if msg.param_count != PARAM_INDEX_UNKNOWN:
+                self.count = msg.param_count
+            if msg.param_index != PARAM_INDEX_UNKNOWN:
+                self._indexes.add(msg.param_index)
+            self.names.add(msg.param_id)
+            received = len(self.names)
+            self._cond.notify_all()
+
+        if self.progress is not None:
+            self.progress(received, self.count)
+
+    @property
+    def received(self) -> int:
+        return len(self.names)
+
+    @property
+    def missing_indexes(self) -> typing.List[int]:
+        if self.count is None:
+            return []
+
+        with self._cond:
+            return sorted(set(range(self.count)) - self._indexes)
+
+    def _is_complete(self, expected: int) -> bool:
+        if self.count is not None and len(self._indexes) >= self.count:
+            return True
+        return len(self.names) >= expected
+
+    def is_complete(self, expected: int) -> bool:
+        """
+        Check that the pull is complete.
+
+        It is, when events of all indexes up to param_count came,
+        or, for events without index, expected count of names.
+        """
+        with self._cond:
+            return self._is_complete(expected)
+
+    def wait(self, expected: int, timeout: float = PULL_STALL_TIMEOUT) -> bool:
+        """
+        Wait until the pull is complete, see is_complete().
+
+        Returns False if there were no new events for timeout.
+        """
+        with self._cond:
+            while not self._is_complete(expected):
+                last = len(self.names)
+                if not self._cond.wait_for(lambda: len(self.names) != last, timeout):
+                    return False
+
+            return True
+
+
 class ParamPlugin(PluginModule):
-    """Parameter plugin interface."""
+    """
+    Parameter plugin interface.
+
+    Parameters may be cached on disk, see enable_cache().
+    Cached values are replaced by ones of mavros node before
+    they are used to decide what to set, see confirm_values().
+    """
 
     timeout_sec: float = 5.0
+    cache: typing.Optional[ParamCache] = None
     _parameters = None
     _event_sub = None
+    _pull_tracker: typing.Optional[ParamPullTracker] = None
+    _cache_key: typing.Optional[VehicleKey] = None
+    # names served from the cache, which did not come from mavros yet
+    _unconfirmed: typing.Optional[typing.Set[str]] = None
 
     @cached_property
     def cli_list_parameters(self) -> rclpy.node.Client:
@@ -191,6 +681,119 @@ class ParamPlugin(PluginModule):
         """Client for ParamSetV2 service."""
         return self.create_client(ParamSetV2, ("param", "set"))
 
+    @cached_property
+    def cli_get_vehicle_info(self) -> rclpy.node.Client:
+        """Client for VehicleInfoGet service."""
+        return self.create_client(VehicleInfoGet, "vehicle_info_get")
+
+    def enable_cache(self, path: typing.Union[str, os.PathLike, None] = None):
+        """
+        Serve values from on-disk cache, if it's valid for the vehicle.
+
+        Validity is checked by _HASH_CHECK parameter, so vehicles without it
+        (e.g. ArduPilot) always pull values from mavros node.
+        """
+        self.cache = ParamCache(path)
+
+    def get_vehicle_key(self) -> typing.Optional[VehicleKey]:
+        """Return (uid, sysid, compid) of the target vehicle."""
+        req = VehicleInfoGet.Request(
+            sysid=VehicleInfoGet.Request.GET_MY_SYSID,
+            compid=VehicleInfoGet.Request.GET_MY_COMPID,
+            get_all=False,
+        )
+        resp = self.cli_get_vehicle_info.call(req)
+        if not resp.success or not resp.vehicles:
+            return None
+
+        vi = resp.vehicles[0]
+        return (f"{vi.uid:016x}", vi.sysid, vi.compid)
+
+    def _load_cached(self, pm: "ParamDict") -> bool:
+        lg = self.get_logger()
+
+        key = self.get_vehicle_key()
+        if key is None:
+            return False
+
+        self._cache_key = key
+        # parameter count says nothing about values, so only vehicles
+        # reporting hash of all values (PX4) could be served from the cache
+        hp = call_get_parameters(
+            node=self._node,
+            client=self.cli_get_parameters,
+            names=[PARAM_HASH_NAME],
+        ).get(PARAM_HASH_NAME)
+        if hp is None or hp.type_ == Parameter.Type.NOT_SET:
+            lg.debug(f"param cache not used: {key} has no {PARAM_HASH_NAME}")
+            return False
+
+        cached = self.cache.load(key, None, hp.value)
+        if cached is None:
+            lg.debug(f"param cache miss: {key}")
+            return False
+
+        lg.debug(f"param cache hit: {key}, {len(cached)} parameters")
+        for k, v in cached.items():
+            pm.setdefault(k, v)
+
+        self._unconfirmed = set(cached)
+        return True
+
+    def confirm_values(self, names: typing.Iterable[str]):
+        """
+        Replace values served from the cache by current ones of mavros node.
+
+        Cache is dropped if any of them differs.
+        """
+        pm = self._parameters
+        unconfirmed = self._unconfirmed
+        if pm is None or not unconfirmed:
+            return
+
+        names = [k for k in names if k in unconfirmed]
+        if not names:
+            return
+
+        fresh = self.get_parameters(names)
+        stale = False
+        for k in names:
+            unconfirmed.discard(k)
+            p = fresh.get(k)
+            if p is None:
+                stale = True
+                dict.pop(pm, k, None)
+            elif pm[k].value != p.value:
+                stale = True
+                pm._ingest(k, p)
+
+        if stale and self._cache_key is not None:
+            self.get_logger().warning(f"param cache is stale: {self._cache_key}")
+            self.cache.invalidate(self._cache_key)
+            self._cache_key = None
+
+    def _save_cached(self, pm: "ParamDict"):
+        if self._cache_key is None:
+            return
+
+        hp = pm.get(PARAM_HASH_NAME)
+        if hp is None:
+            return
+
+        self.cache.save(self._cache_key, list(pm.values()), len(pm), hp.value)
+
+    def _event_cb(self, msg: ParamEvent):
+        self._parameters._event_handler(msg)
+        if self._unconfirmed:
+            self._unconfirmed.discard(msg.param_id)
+
+        tracker = self._pull_tracker
+        if tracker is not None:
+            # whole set is saved to the cache after pull
+            tracker.update(msg)
+        elif self.cache is not None and self._cache_key is not None:
+            self.cache.update(self._cache_key, [self._parameters[msg.param_id]])
+
     def subscribe_events(
         self,
         callback: SubscriptionCallable,
@@ -210,32 +813,259 @@ class ParamPlugin(PluginModule):
         lg.debug(f"pull result: {resp}")
         return resp
 
+    def set_parameters_bulk(
+        self,
+        parameters: typing.Iterable[Parameter],
+        *,
+        batch_size: int = BULK_SET_BATCH_SIZE,
+        max_in_flight: int = BULK_SET_IN_FLIGHT,
+        retries: int = BULK_SET_RETRIES,
+        timeout: float = BULK_SET_TIMEOUT,
+        progress: typing.Optional[typing.Callable[[ParamSetResult], None]] = None,
+    ) -> BulkSetResult:
+        """
+        Set many parameters by batches of SetParameters requests.
+
+        Up to max_in_flight batches are sent without waiting for previous
+        responses. Failed parameters are sent again up to retries times.
+        If no response comes within timeout, all batches in flight fail.
+        Node should be spinned by other thread.
+        """
+        lg = self.get_logger()
+        start = time.monotonic()
+        ret = BulkSetResult()
+        wait_for_service(self.cli_set_parameters, lg)
+
+        def send(batch: typing.List[Parameter]):
+            req = SetParameters.Request(
+                parameters=[p.to_parameter_msg() for p in batch]
+            )
+            future = self.cli_set_parameters.call_async(req)
+            in_flight[future] = batch
+            future.add_done_callback(done_q.put)
+
+        def account(batch: typing.List[Parameter], results: list, reason: str):
+            if len(results) != len(batch):
+                result = SetParametersResult(successful=False, reason=reason)
+                results = [result] * len(batch)
+
+            for p, r in zip(batch, results):
+                pr = ParamSetResult(p, r.successful, r.reason, attempt)
+                ret.results[p.name] = pr
+                if not r.successful:
+                    failed.append(p)
+                if progress is not None:
+                    progress(pr)
+
+        pending = list(parameters)
+        for attempt in range(1, retries + 2):
+            if not pending:
+                break
+
+            batches = (
+                pending[i : i + batch_size] for i in range(0, len(pending), batch_size)
+            )
+            failed = []
+            # late responses of the previous attempt go to its own queue
+            done_q: queue.Queue = queue.Queue()
+            in_flight: typing.Dict[rclpy.task.Future, typing.List[Parameter]] = {}
+            for batch in itertools.islice(batches, max_in_flight):
+                send(batch)
+
+            while in_flight:
+                try:
+                    future = done_q.get(timeout=timeout)
+                except queue.Empty:
+                    lg.debug(f"bulk set: {len(in_flight)} requests timed out")
+                    for future, batch in list(in_flight.items()):
+                        del in_flight[future]
+                        future.cancel()
+                        account(batch, [], "response timed out")
+                else:
+                    batch = in_flight.pop(future, None)
+                    if batch is None:
+                        continue  # cancelled
+
+                    try:
+                        results = future.result().results
+                    except Exception as ex:
+                        account(batch, [], f"request failed: {ex}")
+                    else:
+                        account(batch, results, "no result")
+
+                for batch in itertools.islice(batches, max_in_flight - len(in_flight)):
+                    send(batch)
+
+            if failed:
+                lg.debug(f"bulk set: {len(failed)} failed on attempt {attempt}")
+            pending = failed
+
+        ret.elapsed = time.monotonic() - start
+        return ret
+
+    def get_parameters(
+        self, names: typing.Iterable[str]
+    ) -> typing.Dict[str, Parameter]:
+        """
+        Get some parameters, without loading whole set.
+
+        Unknown names are omitted from the result.
+        """
+        names = list(names)
+        if not names:
+            return {}
+
+        def get():
+            return {
+                k: v
+                for k, v in call_get_parameters(
+                    node=self._node, client=self.cli_get_parameters, names=names
+                ).items()
+                if v.type_ != Parameter.Type.NOT_SET
+            }
+
+        ret = get()
+        if len(ret) < len(names):
+            # mavros may not have parameters yet
+            self.call_pull()
+            ret = get()
+
+        return ret
+
+    def find_names(self, pattern: str) -> typing.List[str]:
+        """
+        Return names matching glob pattern.
+
+        FCU parameters are flat, ListParameters ignores prefixes,
+        so names are matched locally.
+        """
+        names = call_list_parameters(node=self._node, client=self.cli_list_parameters)
+        if not names:
+            self.call_pull()
+            names = call_list_parameters(
+                node=self._node, client=self.cli_list_parameters
+            )
+
+        return sorted(fnmatch.filter(names, pattern))
+
+    def get_matching(self, pattern: str) -> typing.Dict[str, Parameter]:
+        """Get parameters by name or glob pattern."""
+        if any(c in pattern for c in GLOB_CHARS):
+            return self.get_parameters(self.find_names(pattern))
+
+        return self.get_parameters([pattern])
+
+    def set_parameter(
+        self, name: str, value: typing.Any, *, force: bool = False
+    ) -> Parameter:
+        """
+        Set one parameter by ParamSetV2 and return value reported by FCU.
+
+        Value is converted to the current type of the parameter.
+        """
+        current = self.get_parameters([name]).get(name)
+        if current is None:
+            if not force:
+                raise KeyError(name)
+            type_ = Parameter.Type.from_parameter_value(value)
+        else:
+            type_ = current.type_
+
+        value = Parameter(name, type_, _coerce_value(type_, value))
+        req = ParamSetV2.Request(
+            force_set=force, param_id=name, value=value.get_parameter_value()
+        )
+        resp = self.cli_set.call(req)
+        if not resp.success:
+            raise ValueError(f"{name}: set failed")
+
+        ret = parameter_from_parameter_value(name, resp.value)
+        if self._parameters is not None:
+            self._parameters[name] = ParamDict.NoSet(ret)
+        if self._unconfirmed:
+            self._unconfirmed.discard(name)
+        if self.cache is not None and self._cache_key is not None:
+            self.cache.update(self._cache_key, [ret])
+
+        return ret
+
     @property
     def values(self) -> "ParamDict":
         """Provide current state of parameters and allows to change them."""
-        if self._parameters is not None:
-            return self._parameters
+        return self.fetch_values()
 
-        pm = ParamDict()
-        pm._pm = self
+    def fetch_values(
+        self,
+        *,
+        force_pull: bool = False,
+        progress: typing.Optional[PullProgressCallable] = None,
+        timeout: typing.Optional[float] = None,
+    ) -> "ParamDict":
+        """
+        Load parameters, if it isn't yet done, and return ParamDict.
+
+        Parameters come by events during pull, ones missing after the pull
+        are requested by name. If the pull fails, all parameters which
+        did not come are requested. Progress is called on each received event.
+        """
+        pm = self._parameters
+        if pm is not None and not force_pull:
+            return pm
+
+        if pm is None:
+            pm = ParamDict()
+            pm._pm = self
+
+            # 1. subscribe for parameter updates
+            self._parameters = pm
+            self._event_sub = self.subscribe_events(self._event_cb)
+
+            # 2. use cached values, if vehicle still reports the same parameter set
+            if not force_pull and self.cache is not None and self._load_cached(pm):
+                return pm
+
+        # 3. pull parameters, we'll get bunch of events,
+        #    unless mavros already have them
+        tracker = self._pull_tracker = ParamPullTracker(progress)
+        try:
+            resp = self.call_pull(force_pull=force_pull)
+            expected = resp.param_received if resp.success else None
 
-        # 1. subscribe for parameter updates
-        self._event_sub = self.subscribe_events(pm._event_handler)
-        self._parameters = pm
+            # 4. wait for events which are still on the way
+            if expected is not None and tracker.received:
+                tracker.wait(
+                    expected, PULL_STALL_TIMEOUT if timeout is None else timeout
+                )
+        finally:
+            self._pull_tracker = None
 
-        # 2. pull parameters, if it isn't yet done
-        #    we'll get bunch of events
-        self.call_pull()
+        self._unconfirmed = None
 
-        # 3. if too small events come, request whole list
-        if len(pm) < 10:
+        # 5. request only parameters which did not come
+        if expected is None or not tracker.is_complete(expected):
             names = call_list_parameters(
                 node=self._node, client=self.cli_list_parameters
             )
-            for k, v in call_get_parameters(
-                node=self._node, client=self.cli_get_parameters, names=names
-            ).items():
-                pm.setdefault(k, v)
+            missing = [k for k in names if k not in tracker.names]
+            if expected is None:
+                self.get_logger().warning(
+                    f"pull failed, requesting {len(missing)} parameters from mavros"
+                )
+                expected = len(names)
+            else:
+                self.get_logger().debug(
+                    f"pull: {tracker.received}/{expected} received, "
+                    f"missing indexes: {tracker.missing_indexes}, "
+                    f"requesting {len(missing)}"
+                )
+            for k, v in self.get_parameters(missing).items():
+                pm._ingest(k, v)
+
+            if progress is not None:
+                progress(len(pm), expected)
+
+        if self.cache is not None:
+            self._save_cached(pm)
 
         return pm
 
@@ -257,9 +1087,16 @@ class ParamDict(dict):
             self.value = p
 
     _pm: "ParamPlugin" = None
+    _changes_lock: threading.Lock = None
+    _changes_callbacks: typing.List[ChangesCallable] = None
+    _changes_pending: typing.Set[str] = None
+    _changes_timer: rclpy.timer.Timer = None
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
+        self._changes_lock = threading.Lock()
+        self._changes_callbacks = []
+        self._changes_pending = set()
 
     def __getitem__(self, key: str) -> Parameter:
         return super().__getitem__(key)
@@ -279,6 +1116,13 @@ class ParamDict(dict):
             is_no_set = True
             value = value.value
 
+        value = self._to_parameter(key, value)
+        do_call_set = not is_no_set and self._is_changed(key, value)
+        super().__setitem__(key, value)
+        return do_call_set, value
+
+    @staticmethod
+    def _to_parameter(key: str, value) -> Parameter:
         if isinstance(value, Parameter):
             pass
         elif isinstance(value, ParameterValue):
@@ -289,10 +1133,12 @@ class ParamDict(dict):
             value = Parameter(name=key, value=value)
 
         assert key == value.name
+        return value
 
-        do_call_set = not is_no_set and self.get(key, Parameter(name=key)) != value
-        super().__setitem__(key, value)
-        return do_call_set, value
+    def _is_changed(self, key: str, value: Parameter) -> bool:
+        if self._pm is not None:
+            self._pm.confirm_values([key])
+        return self.get(key, Parameter(name=key)) != value
 
     def __getattr__(self, key: str):
         try:
@@ -326,22 +1172,88 @@ class ParamDict(dict):
             object.__delattr__(self, key)
 
     def update(self, *args, **kwargs):
-        keys_to_set = []
-        for k, v in dict(*args, **kwargs).items():
-            do_call_set, _ = self._set_item(k, v)
-            if do_call_set:
-                keys_to_set.append(k)
+        self.update_bulk(dict(*args, **kwargs)).check_and_raise()
 
-        if keys_to_set:
-            call_set_parameters_check_and_raise(
-                node=self._pm._node,
-                client=self._pm.cli_set_parameters,
-                parameters=[self[k] for k in keys_to_set],
-            )
+    def update_bulk(
+        self, values: typing.Mapping[str, typing.Any], **kwargs
+    ) -> BulkSetResult:
+        """
+        Set changed values by ParamPlugin.set_parameters_bulk().
+
+        Only successfully set values are stored,
+        kwargs are passed to set_parameters_bulk().
+        """
+        if self._pm is not None:
+            self._pm.confirm_values(values.keys())
+
+        to_set = []
+        for k, v in values.items():
+            if isinstance(v, ParamDict.NoSet):
+                super().__setitem__(k, self._to_parameter(k, v.value))
+                continue
+
+            p = self._to_parameter(k, v)
+            if self._is_changed(k, p):
+                to_set.append(p)
+
+        if not to_set:
+            return BulkSetResult()
+
+        ret = self._pm.set_parameters_bulk(to_set, **kwargs)
+        for r in ret.succeeded:
+            super().__setitem__(r.name, r.parameter)
+
+        return ret
 
     def setdefault(self, key: str, value=None):
         if key not in self:
             self[key] = ParamDict.NoSet(value)
 
+    def subscribe_changes(
+        self, callback: ChangesCallable, period: float = PARAM_CHANGES_PERIOD
+    ):
+        """
+        Call callback with set of names changed by parameter events.
+
+        Bursts of events (e.g. during pull) are coalesced,
+        so callback is called at most once per period.
+        """
+        with self._changes_lock:
+            self._changes_callbacks.append(callback)
+            if self._changes_timer is None:
+                self._changes_timer = self._pm._node.create_timer(
+                    period, self.flush_changes
+                )
+                self._changes_timer.cancel()
+
+    def unsubscribe_changes(self, callback: ChangesCallable):
+        with self._changes_lock:
+            self._changes_callbacks.remove(callback)
+
+    def flush_changes(self):
+        """Report pending changes now."""
+        with self._changes_lock:
+            changed, self._changes_pending = self._changes_pending, set()
+            callbacks = list(self._changes_callbacks)
+            if self._changes_timer is not None:
+                self._changes_timer.cancel()
+
+        if changed:
+            for cb in callbacks:
+                cb(changed)
+
+    def _ingest(self, key: str, value: Parameter):
+        """Store value reported by FCU, without set request and comparison."""
+        dict.__setitem__(self, key, value)
+
+        if self._changes_callbacks:
+            with self._changes_lock:
+                first = not self._changes_pending
+                self._changes_pending.add(key)
+                if first:
+                    self._changes_timer.reset()
+
     def _event_handler(self, msg: ParamEvent):
-        self[msg.param_id] = parameter_from_parameter_value(msg.param_id, msg.value)
+        self._ingest(
+            msg.param_id, parameter_from_parameter_value(msg.param_id, msg.value)
+        )
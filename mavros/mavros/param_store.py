@@ -0,0 +1,376 @@
+# -*- coding: utf-8 -*-
+# vim:set ts=4 sw=4 et:
+#
+# Copyright 2021 Vladimir Ermakov.
+#
+# This file is part of the mavros package and subject to the license terms
+# in the top-level LICENSE file of the mavros repository.
+# https://github.com/mavlink/mavros/tree/master/LICENSE.md
+"""
+Parameter snapshot store.
+
+Append-only columnar file of parameter dumps of many vehicles.
+Each snapshot keeps sorted name ids, values and types as packed arrays,
+names are interned in the file, so a query of one parameter across
+the fleet is a binary search per snapshot on a memory-mapped file.
+
+PyArrow is optional, it is only needed to export Arrow tables and Parquet.
+"""
+
+import bisect
+import datetime
+import fcntl
+import mmap
+import os
+import struct
+import typing
+from array import array
+
+from rclpy.parameter import Parameter
+
+from .param import ParamFile
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = None
+    pq = None
+
+PathLike = typing.Union[str, os.PathLike]
+
+STORE_MAGIC = b"MAVPSNAP"
+STORE_VERSION = 1
+
+# magic, version
+FILE_HEADER = struct.Struct("<8sI4x")
+# kind, payload size
+RECORD_HEADER = struct.Struct("<4sI")
+# stamp usec, count, tgt_system, tgt_component, uid
+SNAPSHOT_HEADER = struct.Struct("<qIBB16s2x")
+
+RECORD_NAMES = b"NAME"
+RECORD_SNAPSHOT = b"SNAP"
+
+
+class SnapshotInfo(typing.NamedTuple):
+    """Metadata of one stored snapshot."""
+
+    index: int
+    stamp: datetime.datetime
+    tgt_system: int
+    tgt_component: int
+    uid: str
+    count: int
+
+
+def _padding(size: int) -> int:
+    return -size % 8
+
+
+def _stamp_to_usec(stamp: datetime.datetime) -> int:
+    return round(stamp.timestamp() * 1e6)
+
+
+def _usec_to_stamp(usec: int) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(usec / 1e6)
+
+
+def _convert_value(value: float, type_: int) -> typing.Union[int, float, bool]:
+    if type_ == Parameter.Type.INTEGER.value:
+        return int(value)
+    elif type_ == Parameter.Type.BOOL.value:
+        return bool(value)
+    return value
+
+
+class ParamStore:
+    """
+    Append-only store of parameter snapshots.
+
+    Snapshot is keyed by ParamFile.stamp, tgt_system, tgt_component
+    and vehicle UID. A torn record at the end of the file (e.g. after
+    a crash) is ignored and overwritten by the next append.
+    Appends of several processes are serialized by flock().
+    """
+
+    def __init__(self, path: PathLike):
+        self.path = os.fspath(path)
+        self.names: typing.List[str] = []
+        self.snapshots: typing.List[SnapshotInfo] = []
+
+        self._name_ids: typing.Dict[str, int] = {}
+        # offset of the ids column of each snapshot
+        self._columns: typing.List[int] = []
+        self._end = FILE_HEADER.size
+        self._mm: typing.Optional[mmap.mmap] = None
+
+        if not os.path.exists(self.path) or os.path.getsize(self.path) == 0:
+            with open(self.path, "wb") as fd:
+                fd.write(FILE_HEADER.pack(STORE_MAGIC, STORE_VERSION))
+
+        self._remap()
+        magic, version = FILE_HEADER.unpack_from(self._mm)
+        if magic != STORE_MAGIC or version != STORE_VERSION:
+            self.close()
+            raise ValueError(f"{self.path}: not a parameter store")
+
+        self._scan()
+
+    def close(self):
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __enter__(self) -> "ParamStore":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def __len__(self) -> int:
+        return len(self.snapshots)
+
+    def _remap(self):
+        self.close()
+        with open(self.path, "rb") as fd:
+            self._mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def _scan(self):
+        mm = self._mm
+        pos = self._end
+        while pos + RECORD_HEADER.size <= len(mm):
+            kind, size = RECORD_HEADER.unpack_from(mm, pos)
+            payload = pos + RECORD_HEADER.size
+            if payload + size > len(mm):
+                break  # torn tail
+
+            if kind == RECORD_NAMES:
+                for name in mm[payload : payload + size].rstrip(b"\0").split(b"\0"):
+                    name = name.decode()
+                    self._name_ids[name] = len(self.names)
+                    self.names.append(name)
+
+            elif kind == RECORD_SNAPSHOT:
+                usec, count, sysid, compid, uid = SNAPSHOT_HEADER.unpack_from(
+                    mm, payload
+                )
+                self.snapshots.append(
+                    SnapshotInfo(
+                        len(self.snapshots),
+                        _usec_to_stamp(usec),
+                        sysid,
+                        compid,
+                        uid.rstrip(b"\0").decode(),
+                        count,
+                    )
+                )
+                self._columns.append(payload + SNAPSHOT_HEADER.size)
+
+            pos = payload + size
+
+        self._end = pos
+
+    @staticmethod
+    def _record(kind: bytes, payload: bytes) -> bytes:
+        payload += bytes(_padding(len(payload)))
+        return RECORD_HEADER.pack(kind, len(payload)) + payload
+
+    def append(self, param_file: ParamFile, uid: str = "") -> SnapshotInfo:
+        """Append parameters of the dump, return info of the new snapshot."""
+        stamp = param_file.stamp or datetime.datetime.now()
+        if param_file.records is not None:
+            items = param_file.records
+        else:
+            items = [(p.name, p.value, p.type_) for p in param_file.parameters.values()]
+
+        with open(self.path, "r+b") as fd:
+            fcntl.flock(fd, fcntl.LOCK_EX)  # released by close
+
+            # pick up snapshots appended by other processes since the last scan,
+            # so only a really torn tail is dropped and name ids are in sync
+            self._remap()
+            self._scan()
+
+            fd.truncate(self._end)
+            fd.seek(self._end)
+            fd.write(self._snapshot_records(param_file, stamp, items, uid))
+
+        self._remap()
+        self._scan()
+        return self.snapshots[-1]
+
+    def _snapshot_records(
+        self,
+        param_file: ParamFile,
+        stamp: datetime.datetime,
+        items: typing.Iterable[typing.Tuple[str, typing.Any, Parameter.Type]],
+        uid: str,
+    ) -> bytes:
+        new_names = []
+        rows = []
+        for name, value, type_ in items:
+            name_id = self._name_ids.get(name)
+            if name_id is None:
+                name_id = len(self.names) + len(new_names)
+                new_names.append(name)
+            rows.append((name_id, float(value), type_.value))
+        rows.sort()
+
+        ids = array("I", (r[0] for r in rows))
+        values = array("d", (r[1] for r in rows))
+        types = array("B", (r[2] for r in rows))
+
+        data = bytearray()
+        if new_names:
+            data += self._record(
+                RECORD_NAMES, b"\0".join(n.encode() for n in new_names)
+            )
+
+        ids_bytes = ids.tobytes()
+        data += self._record(
+            RECORD_SNAPSHOT,
+            SNAPSHOT_HEADER.pack(
+                _stamp_to_usec(stamp),
+                len(rows),
+                param_file.tgt_system,
+                param_file.tgt_component,
+                uid.encode(),
+            )
+            + ids_bytes
+            + bytes(_padding(len(ids_bytes)))
+            + values.tobytes()
+            + types.tobytes(),
+        )
+        return bytes(data)
+
+    def _columns_of(
+        self, index: int
+    ) -> typing.Tuple[memoryview, memoryview, memoryview]:
+        count = self.snapshots[index].count
+        pos = self._columns[index]
+        ids_size = count * 4
+        values_pos = pos + ids_size + _padding(ids_size)
+        with memoryview(self._mm) as base:
+            return (
+                base[pos : pos + ids_size].cast("I"),
+                base[values_pos : values_pos + count * 8].cast("d"),
+                base[values_pos + count * 8 : values_pos + count * 9],
+            )
+
+    def select(
+        self,
+        *,
+        uid: typing.Optional[str] = None,
+        tgt_system: typing.Optional[int] = None,
+        start: typing.Optional[datetime.datetime] = None,
+        end: typing.Optional[datetime.datetime] = None,
+    ) -> typing.Iterator[SnapshotInfo]:
+        """Iterate snapshots matching all given filters, end is exclusive."""
+        for info in self.snapshots:
+            if (
+                (uid is None or info.uid == uid)
+                and (tgt_system is None or info.tgt_system == tgt_system)
+                and (start is None or info.stamp >= start)
+                and (end is None or info.stamp < end)
+            ):
+                yield info
+
+    def history(
+        self, name: str, **filters
+    ) -> typing.List[typing.Tuple[SnapshotInfo, typing.Union[int, float, bool]]]:
+        """
+        Return value of a parameter in each snapshot, ordered by stamp.
+
+        Snapshots without that parameter are skipped,
+        filters are passed to select().
+        """
+        name_id = self._name_ids.get(name)
+        if name_id is None:
+            return []
+
+        ret = []
+        for info in self.select(**filters):
+            ids, values, types = self._columns_of(info.index)
+            try:
+                i = bisect.bisect_left(ids, name_id)
+                if i < len(ids) and ids[i] == name_id:
+                    ret.append((info, _convert_value(values[i], types[i])))
+            finally:
+                ids.release()
+                values.release()
+                types.release()
+
+        ret.sort(key=lambda it: it[0].stamp)
+        return ret
+
+    def load(self, index: int) -> ParamFile:
+        """Return the snapshot as ParamFile."""
+        info = self.snapshots[index]
+        ids, values, types = self._columns_of(index)
+        try:
+            records = [
+                (
+                    self.names[name_id],
+                    _convert_value(value, type_),
+                    Parameter.Type(type_),
+                )
+                for name_id, value, type_ in zip(ids, values, types)
+            ]
+        finally:
+            ids.release()
+            values.release()
+            types.release()
+
+        pf = ParamFile()
+        pf.records = records
+        pf.stamp = info.stamp
+        pf.tgt_system = info.tgt_system
+        pf.tgt_component = info.tgt_component
+        return pf
+
+    def to_arrow(self, **filters) -> "pa.Table":
+        """
+        Return snapshots as Arrow table in long format.
+
+        One row per (snapshot, parameter), filters are passed to select().
+        """
+        if pa is None:
+            raise RuntimeError("PyArrow is not installed")
+
+        columns: typing.Dict[str, list] = {
+            "stamp": [],
+            "uid": [],
+            "tgt_system": [],
+            "tgt_component": [],
+            "name": [],
+            "value": [],
+            "type": [],
+        }
+        for info in self.select(**filters):
+            ids, values, types = self._columns_of(info.index)
+            try:
+                columns["name"].extend(self.names[i] for i in ids)
+                columns["value"].extend(values)
+                columns["type"].extend(types)
+            finally:
+                ids.release()
+                values.release()
+                types.release()
+
+            for key, value in (
+                ("stamp", info.stamp),
+                ("uid", info.uid),
+                ("tgt_system", info.tgt_system),
+                ("tgt_component", info.tgt_component),
+            ):
+                columns[key].extend([value] * info.count)
+
+        return pa.table(columns)
+
+    def write_parquet(self, path: PathLike, **filters):
+        """Export snapshots to Parquet file, see to_arrow()."""
+        if pq is None:
+            raise RuntimeError("PyArrow is not installed")
+
+        pq.write_table(self.to_arrow(**filters), os.fspath(path))
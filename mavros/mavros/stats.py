@@ -0,0 +1,405 @@
+# -*- coding: utf-8 -*-
+# vim:set ts=4 sw=4 et:
+#
+# Copyright 2021 Vladimir Ermakov.
+#
+# This file is part of the mavros package and subject to the license terms
+# in the top-level LICENSE file of the mavros repository.
+# https://github.com/mavlink/mavros/tree/master/LICENSE.md
+"""
+MAVLink traffic statistics.
+
+Counters live in preallocated arrays, so handling a message
+does not allocate containers.
+"""
+
+import math
+import time
+import typing
+from array import array
+
+from mavros_msgs.msg import Mavlink
+
+from .mavlink import CHECKSUM, V1_HEADER, V2_HEADER
+
+# (sysid, compid, msgid)
+MessageKey = typing.Tuple[int, int, int]
+
+# sequence number gap smaller than that is accounted as lost frames
+SEQ_GAP_MAX = 128
+# step back of sequence number up to that is a reordered frame,
+# any other jump (e.g. after a dropout) resyncs the sequence
+SEQ_REORDER_MAX = 32
+# all possible (sysid, compid) pairs
+SOURCES = 0x10000
+
+
+def frame_size(msg: Mavlink) -> int:
+    """Return size of the frame on the wire."""
+    if msg.magic == Mavlink.MAVLINK_V10:
+        header_len = V1_HEADER.size
+    else:
+        header_len = V2_HEADER.size
+
+    return header_len + msg.len + CHECKSUM.size + len(msg.signature)
+
+
+def stamp_to_sec(msg: Mavlink) -> float:
+    stamp = msg.header.stamp
+    return stamp.sec + stamp.nanosec * 1e-9
+
+
+def _zeros(typecode: str, size: int) -> array:
+    arr = array(typecode)
+    arr.frombytes(bytes(arr.itemsize * size))
+    return arr
+
+
+class MessageStats:
+    """
+    Per-(sysid, compid, msgid) message statistics.
+
+    Tracks rate, inter-arrival jitter (by header stamp) and bytes per second
+    of each message, and sequence gap loss of each (sysid, compid) source.
+    Each report() covers the window since the previous one.
+    """
+
+    def __init__(self, capacity: int = 256):
+        self._slots: typing.Dict[int, int] = {}
+        self._keys: typing.List[MessageKey] = []
+        self._capacity = capacity
+
+        # window counters of each slot
+        self._count = _zeros("Q", capacity)
+        self._bytes = _zeros("Q", capacity)
+        self._intervals = _zeros("Q", capacity)
+        self._dt_sum = _zeros("d", capacity)
+        self._dt_sq_sum = _zeros("d", capacity)
+        # state of each slot
+        self._total = _zeros("Q", capacity)
+        self._last_stamp = _zeros("d", capacity)
+
+        # indexed by (sysid << 8 | compid)
+        self._last_seq = array("h", [-1]) * SOURCES
+        self._src_received = _zeros("Q", SOURCES)
+        self._src_lost = _zeros("Q", SOURCES)
+
+        self.received = 0
+        self._window_start = time.monotonic()
+
+    def _grow(self):
+        for arr in (
+            self._count,
+            self._bytes,
+            self._intervals,
+            self._dt_sum,
+            self._dt_sq_sum,
+            self._total,
+            self._last_stamp,
+        ):
+            arr.extend(_zeros(arr.typecode, self._capacity))
+
+        self._capacity *= 2
+
+    def _add_slot(self, key: int, msg: Mavlink) -> int:
+        slot = len(self._keys)
+        if slot == self._capacity:
+            self._grow()
+
+        self._slots[key] = slot
+        self._keys.append((msg.sysid, msg.compid, msg.msgid))
+        return slot
+
+    def update(self, msg: Mavlink):
+        """Account one message."""
+        key = (msg.sysid << 32) | (msg.compid << 24) | msg.msgid
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._add_slot(key, msg)
+
+        self.received += 1
+        self._total[slot] += 1
+        self._count[slot] += 1
+        self._bytes[slot] += frame_size(msg)
+
+        stamp = stamp_to_sec(msg)
+        last_stamp = self._last_stamp[slot]
+        if last_stamp > 0.0:
+            dt = stamp - last_stamp
+            self._intervals[slot] += 1
+            self._dt_sum[slot] += dt
+            self._dt_sq_sum[slot] += dt * dt
+        self._last_stamp[slot] = stamp
+
+        src = (msg.sysid << 8) | msg.compid
+        self._src_received[src] += 1
+        last_seq = self._last_seq[src]
+        if last_seq < 0:
+            self._last_seq[src] = msg.seq
+        else:
+            gap = (msg.seq - last_seq - 1) & 0xFF
+            if gap < SEQ_GAP_MAX:
+                self._src_lost[src] += gap
+                self._last_seq[src] = msg.seq
+            elif gap < 0xFF - SEQ_REORDER_MAX:
+                self._last_seq[src] = msg.seq
+
+    @property
+    def sources(self) -> typing.Set[typing.Tuple[int, int]]:
+        return {(sysid, compid) for sysid, compid, _ in self._keys}
+
+    def report(self) -> typing.Dict[str, typing.Any]:
+        """Return statistics of the window and start the next one."""
+        now = time.monotonic()
+        elapsed = max(now - self._window_start, 1e-9)
+        self._window_start = now
+
+        sources: typing.Dict[typing.Tuple[int, int], typing.Dict[str, typing.Any]] = {}
+        for slot, (sysid, compid, msgid) in enumerate(self._keys):
+            src_stats = sources.get((sysid, compid))
+            if src_stats is None:
+                src = (sysid << 8) | compid
+                received = self._src_received[src]
+                lost = self._src_lost[src]
+                src_stats = sources[(sysid, compid)] = {
+                    "sysid": sysid,
+                    "compid": compid,
+                    "received": received,
+                    "lost": lost,
+                    "loss": lost / (received + lost) if received + lost else 0.0,
+                    "messages": [],
+                }
+                self._src_received[src] = 0
+                self._src_lost[src] = 0
+
+            count = self._count[slot]
+            intervals = self._intervals[slot]
+            interval = jitter = None
+            if intervals:
+                interval = self._dt_sum[slot] / intervals
+                variance = self._dt_sq_sum[slot] / intervals - interval * interval
+                jitter = math.sqrt(max(variance, 0.0))
+
+            src_stats["messages"].append(
+                {
+                    "msgid": msgid,
+                    "count": count,
+                    "total": self._total[slot],
+                    "rate": count / elapsed,
+                    "bytes_per_sec": self._bytes[slot] / elapsed,
+                    "interval": interval,
+                    "jitter": jitter,
+                }
+            )
+
+        for arr in (
+            self._count,
+            self._bytes,
+            self._intervals,
+            self._dt_sum,
+            self._dt_sq_sum,
+        ):
+            arr[:] = _zeros(arr.typecode, len(arr))
+
+        return {
+            "elapsed": elapsed,
+            "received": sum(s["received"] for s in sources.values()),
+            "sources": list(sources.values()),
+        }
+
+
+class LinkMonitor:
+    """
+    Link quality of each (sysid, compid) source over a sliding window.
+
+    Window is a ring of time buckets per source, so state does not depend
+    on message rate. Tracks sequence loss, reordered and duplicate frames,
+    signature errors, and latency from header stamp to reception.
+    Frames with bad CRC are counted for the whole link, as their header
+    can't be trusted to tell the source.
+    """
+
+    def __init__(self, window: float = 10.0, buckets: int = 10, capacity: int = 16):
+        self.window = window
+        self.buckets = buckets
+        self.bucket_len = window / buckets
+        self._slots: typing.Dict[int, int] = {}
+        self._keys: typing.List[typing.Tuple[int, int]] = []
+        self._capacity = capacity
+
+        size = capacity * buckets
+        self._epoch = array("q", [-1]) * size
+        self._received = _zeros("Q", size)
+        self._lost = _zeros("q", size)
+        self._reordered = _zeros("Q", size)
+        self._duplicates = _zeros("Q", size)
+        self._bad_signature = _zeros("Q", size)
+        self._latency_sum = _zeros("d", size)
+        self._latency_max = _zeros("d", size)
+
+        self._last_seq = array("h", [-1]) * capacity
+        self._first_seen = _zeros("d", capacity)
+
+        self._link_epoch = array("q", [-1]) * buckets
+        self._bad_crc = _zeros("Q", buckets)
+
+    @property
+    def _bucket_arrays(self) -> typing.Tuple[array, ...]:
+        return (
+            self._received,
+            self._lost,
+            self._reordered,
+            self._duplicates,
+            self._bad_signature,
+            self._latency_sum,
+            self._latency_max,
+        )
+
+    def _grow(self):
+        size = self._capacity * self.buckets
+        self._epoch.extend(array("q", [-1]) * size)
+        for arr in self._bucket_arrays:
+            arr.extend(_zeros(arr.typecode, size))
+
+        self._last_seq.extend(array("h", [-1]) * self._capacity)
+        self._first_seen.extend(_zeros("d", self._capacity))
+        self._capacity *= 2
+
+    def _add_slot(self, src: int, msg: Mavlink, now: float) -> int:
+        slot = len(self._keys)
+        if slot == self._capacity:
+            self._grow()
+
+        self._slots[src] = slot
+        self._keys.append((msg.sysid, msg.compid))
+        self._first_seen[slot] = now
+        return slot
+
+    def _bucket(self, slot: int, now: float) -> int:
+        epoch = int(now / self.bucket_len)
+        b = slot * self.buckets + epoch % self.buckets
+        if self._epoch[b] != epoch:
+            self._epoch[b] = epoch
+            for arr in self._bucket_arrays:
+                arr[b] = 0
+
+        return b
+
+    def update(self, msg: Mavlink, now: typing.Optional[float] = None):
+        """Account one message received at now (system time)."""
+        if now is None:
+            now = time.time()
+
+        if msg.framing_status == Mavlink.FRAMING_BAD_CRC:
+            # header of the damaged frame can't be trusted
+            epoch = int(now / self.bucket_len)
+            b = epoch % self.buckets
+            if self._link_epoch[b] != epoch:
+                self._link_epoch[b] = epoch
+                self._bad_crc[b] = 0
+
+            self._bad_crc[b] += 1
+            return
+
+        src = (msg.sysid << 8) | msg.compid
+        slot = self._slots.get(src)
+        if slot is None:
+            slot = self._add_slot(src, msg, now)
+
+        b = self._bucket(slot, now)
+
+        if msg.framing_status == Mavlink.FRAMING_BAD_SIGNATURE:
+            self._bad_signature[b] += 1
+            return
+
+        self._received[b] += 1
+        latency = now - stamp_to_sec(msg)
+        self._latency_sum[b] += latency
+        if latency > self._latency_max[b]:
+            self._latency_max[b] = latency
+
+        last_seq = self._last_seq[slot]
+        if last_seq < 0:
+            self._last_seq[slot] = msg.seq
+            return
+
+        gap = (msg.seq - last_seq - 1) & 0xFF
+        if gap == 0xFF:
+            self._duplicates[b] += 1
+        elif gap < SEQ_GAP_MAX:
+            self._lost[b] += gap
+            self._last_seq[slot] = msg.seq
+        elif gap >= 0xFF - SEQ_REORDER_MAX:
+            # late frame, which was accounted as lost before
+            self._reordered[b] += 1
+            self._lost[b] -= 1
+        else:
+            # too long dropout to tell how many frames were lost
+            self._last_seq[slot] = msg.seq
+
+    def report(
+        self, now: typing.Optional[float] = None
+    ) -> typing.Dict[str, typing.Any]:
+        """Return statistics of the link and its sources over window ending at now."""
+        if now is None:
+            now = time.time()
+
+        last_epoch = int(now / self.bucket_len)
+        first_epoch = last_epoch - self.buckets + 1
+
+        frames = 0
+        sources = []
+        for slot, (sysid, compid) in sorted(
+            enumerate(self._keys), key=lambda it: it[1]
+        ):
+            sums = [0] * len(self._bucket_arrays)
+            latency_max = 0.0
+            for b in range(slot * self.buckets, (slot + 1) * self.buckets):
+                if not first_epoch <= self._epoch[b] <= last_epoch:
+                    continue
+
+                for i, arr in enumerate(self._bucket_arrays):
+                    sums[i] += arr[b]
+                latency_max = max(latency_max, self._latency_max[b])
+
+            (
+                received,
+                lost,
+                reordered,
+                duplicates,
+                bad_signature,
+                lat_sum,
+                _,
+            ) = sums
+            lost = max(lost, 0)
+            frames += received + bad_signature
+            # don't extrapolate the rate from just a few first messages
+            span = max(min(self.window, now - self._first_seen[slot]), self.bucket_len)
+
+            sources.append(
+                {
+                    "sysid": sysid,
+                    "compid": compid,
+                    "received": received,
+                    "rate": received / span,
+                    "lost": lost,
+                    "loss": lost / (received + lost) if received + lost else 0.0,
+                    "reordered": reordered,
+                    "duplicates": duplicates,
+                    "bad_signature": bad_signature,
+                    "latency": lat_sum / received if received else None,
+                    "latency_max": latency_max if received else None,
+                }
+            )
+
+        bad_crc = sum(
+            n
+            for epoch, n in zip(self._link_epoch, self._bad_crc)
+            if first_epoch <= epoch <= last_epoch
+        )
+        frames += bad_crc
+        return {
+            "bad_crc": bad_crc,
+            "crc_error_rate": bad_crc / frames if frames else 0.0,
+            "sources": sources,
+        }
@@ -0,0 +1,386 @@
+# -*- coding: utf-8 -*-
+# vim:set ts=4 sw=4 et:
+#
+# Copyright 2021 Vladimir Ermakov.
+#
+# This file is part of the mavros package and subject to the license terms
+# in the top-level LICENSE file of the mavros repository.
+# https://github.com/mavlink/mavros/tree/master/LICENSE.md
+"""
+Telemetry log (tlog) files.
+
+tlog is a plain sequence of MAVLink frames,
+each prefixed by big-endian microseconds since epoch.
+"""
+
+import bisect
+import heapq
+import mmap
+import os
+import struct
+import typing
+from array import array
+
+from mavros_msgs.msg import Mavlink
+
+from .mavlink import TLOG_STAMP, MavlinkStreamParser, convert_to_bytes, frame_length
+
+PathLike = typing.Union[str, os.PathLike]
+IndexArray = typing.Union[array, memoryview]
+# (sysid, compid, msgid)
+GroupKey = typing.Tuple[int, int, int]
+
+TLOG_INDEX_SUFFIX = ".mavidx"
+TLOG_INDEX_MAGIC = b"MAVTLIDX"
+TLOG_INDEX_VERSION = 1
+
+# magic, version, tlog size, tlog mtime_ns, records, groups
+INDEX_HEADER = struct.Struct("<8sIxxxxQQQQ")
+# msgid, sysid, compid, records in the group
+INDEX_GROUP = struct.Struct("<IBBxxQ")
+
+
+def stamp_to_usec(msg: Mavlink) -> int:
+    """Return header stamp of the message in microseconds."""
+    stamp = msg.header.stamp
+    return stamp.sec * 1000000 + stamp.nanosec // 1000
+
+
+def scan_tlog(
+    buf: typing.Union[bytes, bytearray, memoryview, mmap.mmap],
+) -> typing.Iterator[typing.Tuple[int, int]]:
+    """
+    Yield (offset, usec) of each complete record in the buffer.
+
+    Garbage between records is skipped, truncated tail is ignored.
+    """
+    end = len(buf)
+    pos = 0
+    while pos + TLOG_STAMP.size + 3 <= end:
+        start = pos + TLOG_STAMP.size
+        frame_len = frame_length(buf, start)
+        if not frame_len:
+            pos += 1
+            continue
+
+        if start + frame_len > end:
+            break
+
+        yield pos, TLOG_STAMP.unpack_from(buf, pos)[0]
+        pos = start + frame_len
+
+
+def frame_ids(
+    buf: typing.Union[bytes, bytearray, memoryview, mmap.mmap], start: int
+) -> GroupKey:
+    """Return (sysid, compid, msgid) of the frame at start."""
+    if buf[start] == Mavlink.MAVLINK_V10:
+        return buf[start + 3], buf[start + 4], buf[start + 5]
+    else:
+        return (
+            buf[start + 5],
+            buf[start + 6],
+            buf[start + 7] | (buf[start + 8] << 8) | (buf[start + 9] << 16),
+        )
+
+
+class TlogIndex:
+    """
+    Index of tlog records.
+
+    Keeps offsets and timestamps of all records, and sorted record numbers
+    of each (sysid, compid, msgid) group. Timestamps are expected
+    to be monotonic, as tlog writers produce them.
+
+    Index could be saved as a sidecar file, which is memory-mapped on load.
+    """
+
+    def __init__(
+        self,
+        offsets: IndexArray,
+        stamps: IndexArray,
+        groups: typing.Dict[GroupKey, IndexArray],
+    ):
+        self.offsets = offsets
+        self.stamps = stamps
+        self.groups = groups
+        self._mm: typing.Optional[mmap.mmap] = None
+        self._views: typing.List[memoryview] = []
+
+    @classmethod
+    def build(
+        cls, buf: typing.Union[bytes, bytearray, memoryview, mmap.mmap]
+    ) -> "TlogIndex":
+        """Scan tlog buffer and build the index."""
+        offsets = array("Q")
+        stamps = array("Q")
+        groups: typing.Dict[GroupKey, array] = {}
+        for record, (offset, usec) in enumerate(scan_tlog(buf)):
+            offsets.append(offset)
+            stamps.append(usec)
+
+            key = frame_ids(buf, offset + TLOG_STAMP.size)
+            recs = groups.get(key)
+            if recs is None:
+                recs = groups[key] = array("I")
+            recs.append(record)
+
+        return cls(offsets, stamps, groups)
+
+    @staticmethod
+    def _tlog_stat(tlog_path: PathLike) -> typing.Tuple[int, int]:
+        st = os.stat(tlog_path)
+        return st.st_size, st.st_mtime_ns
+
+    def save(self, path: PathLike, tlog_path: PathLike):
+        """Write sidecar index of the tlog file."""
+        size, mtime_ns = self._tlog_stat(tlog_path)
+        groups = sorted(self.groups.items())
+
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "wb") as fd:
+            fd.write(
+                INDEX_HEADER.pack(
+                    TLOG_INDEX_MAGIC,
+                    TLOG_INDEX_VERSION,
+                    size,
+                    mtime_ns,
+                    len(self.offsets),
+                    len(groups),
+                )
+            )
+            for (sysid, compid, msgid), recs in groups:
+                fd.write(INDEX_GROUP.pack(msgid, sysid, compid, len(recs)))
+
+            fd.write(self.offsets)
+            fd.write(self.stamps)
+            for _, recs in groups:
+                fd.write(recs)
+
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: PathLike, tlog_path: PathLike) -> typing.Optional["TlogIndex"]:
+        """Map sidecar index, return None if it's missing or stale."""
+        try:
+            with open(path, "rb") as fd:
+                mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+        except (OSError, ValueError):
+            return None
+
+        try:
+            magic, version, size, mtime_ns, nrecords, ngroups = (
+                INDEX_HEADER.unpack_from(mm)
+            )
+            if (
+                magic != TLOG_INDEX_MAGIC
+                or version != TLOG_INDEX_VERSION
+                or (size, mtime_ns) != cls._tlog_stat(tlog_path)
+            ):
+                mm.close()
+                return None
+
+            pos = INDEX_HEADER.size
+            keys = []
+            for _ in range(ngroups):
+                msgid, sysid, compid, count = INDEX_GROUP.unpack_from(mm, pos)
+                keys.append(((sysid, compid, msgid), count))
+                pos += INDEX_GROUP.size
+
+            expected = pos + nrecords * 16 + sum(c for _, c in keys) * 4
+            if len(mm) != expected:
+                mm.close()
+                return None
+        except (OSError, struct.error):
+            mm.close()
+            return None
+
+        views = []
+
+        def view(fmt: str, count: int) -> memoryview:
+            nonlocal pos
+            size = struct.calcsize(fmt) * count
+            with memoryview(mm) as base:
+                v = base[pos : pos + size].cast(fmt)
+            views.append(v)
+            pos += size
+            return v
+
+        offsets = view("Q", nrecords)
+        stamps = view("Q", nrecords)
+        groups = {key: view("I", count) for key, count in keys}
+
+        index = cls(offsets, stamps, groups)
+        index._mm = mm
+        index._views = views
+        return index
+
+    def close(self):
+        for v in self._views:
+            v.release()
+        self._views.clear()
+
+        if self._mm is not None:
+            self._mm.close()
+            self._mm = None
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def records(
+        self,
+        *,
+        msgid: typing.Optional[int] = None,
+        sysid: typing.Optional[int] = None,
+        compid: typing.Optional[int] = None,
+        t0: typing.Optional[int] = None,
+        t1: typing.Optional[int] = None,
+    ) -> typing.Iterator[int]:
+        """
+        Yield sorted numbers of records matching the query.
+
+        Time range [t0, t1) is in microseconds.
+        """
+        lo = 0 if t0 is None else bisect.bisect_left(self.stamps, t0)
+        hi = len(self.offsets) if t1 is None else bisect.bisect_left(self.stamps, t1)
+
+        def group_records(recs: IndexArray) -> typing.Iterator[int]:
+            start = bisect.bisect_left(recs, lo)
+            stop = bisect.bisect_left(recs, hi)
+            for idx in range(start, stop):
+                yield recs[idx]
+
+        selected = [
+            group_records(recs)
+            for (g_sysid, g_compid, g_msgid), recs in self.groups.items()
+            if (msgid is None or msgid == g_msgid)
+            and (sysid is None or sysid == g_sysid)
+            and (compid is None or compid == g_compid)
+        ]
+        if len(selected) == 1:
+            return selected[0]
+
+        return heapq.merge(*selected)
+
+
+class TlogWriter:
+    """Write Mavlink messages as tlog records."""
+
+    def __init__(self, file_: typing.BinaryIO):
+        self.file = file_
+        self.count = 0
+
+    def write(self, msg: Mavlink, usec: typing.Optional[int] = None):
+        """Write message stamped by usec, or by its header stamp."""
+        if usec is None:
+            usec = stamp_to_usec(msg)
+
+        self.file.write(TLOG_STAMP.pack(usec) + convert_to_bytes(msg))
+        self.count += 1
+
+    def flush(self):
+        self.file.flush()
+
+
+class TlogReader:
+    """
+    Memory-mapped tlog file.
+
+    Records are indexed on the first access, messages are decoded
+    only when requested. With sidecar the index is loaded from,
+    or saved to, the file next to the log.
+    """
+
+    def __init__(
+        self,
+        path: PathLike,
+        *,
+        crc_extras: typing.Optional[typing.Mapping[int, int]] = None,
+        sidecar: bool = False,
+    ):
+        self.path = path
+        self.sidecar = sidecar
+        self._parser = MavlinkStreamParser(tlog=True, crc_extras=crc_extras)
+        self._index: typing.Optional[TlogIndex] = None
+
+        with open(path, "rb") as fd:
+            if os.fstat(fd.fileno()).st_size:
+                self._mm = mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ)
+            else:
+                self._mm = b""  # empty file can't be mapped
+
+    def close(self):
+        if self._index is not None:
+            self._index.close()
+        if isinstance(self._mm, mmap.mmap):
+            self._mm.close()
+
+    def __enter__(self) -> "TlogReader":
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    @property
+    def buffer(self) -> typing.Union[bytes, mmap.mmap]:
+        return self._mm
+
+    @property
+    def index_path(self) -> str:
+        return f"{self.path}{TLOG_INDEX_SUFFIX}"
+
+    @property
+    def index(self) -> TlogIndex:
+        if self._index is not None:
+            return self._index
+
+        if self.sidecar:
+            self._index = TlogIndex.load(self.index_path, self.path)
+        if self._index is None:
+            self._index = TlogIndex.build(self._mm)
+            if self.sidecar:
+                try:
+                    self._index.save(self.index_path, self.path)
+                except OSError:
+                    pass  # e.g. read-only log directory
+
+        return self._index
+
+    @property
+    def offsets(self) -> IndexArray:
+        """Offsets of records in the file."""
+        return self.index.offsets
+
+    @property
+    def stamps(self) -> IndexArray:
+        """Timestamps of records, microseconds."""
+        return self.index.stamps
+
+    def __len__(self) -> int:
+        return len(self.offsets)
+
+    def __getitem__(self, idx: int) -> Mavlink:
+        return self._parser.decode(self._mm, self.offsets[idx])
+
+    def __iter__(self) -> typing.Iterator[Mavlink]:
+        return self.iter_from(0)
+
+    def iter_from(
+        self, start: int, stop: typing.Optional[int] = None
+    ) -> typing.Iterator[Mavlink]:
+        """Yield messages of records [start:stop)."""
+        offsets = self.offsets
+        decode = self._parser.decode
+        for idx in range(*slice(start, stop).indices(len(offsets))):
+            yield decode(self._mm, offsets[idx])
+
+    def index_at(self, usec: int) -> int:
+        """Return index of the first record stamped at or after usec."""
+        return bisect.bisect_left(self.stamps, usec)
+
+    def query(self, **kwargs) -> typing.Iterator[Mavlink]:
+        """Yield messages matching the query, see TlogIndex.records()."""
+        offsets = self.offsets
+        decode = self._parser.decode
+        for record in self.index.records(**kwargs):
+            yield decode(self._mm, offsets[record])
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark Mavlink message codec.
+
+Run: python3 -m test.mavros_py.bench_mavlink
+"""
+
+import struct
+import timeit
+
+from mavros.mavlink import (
+    MavlinkStreamParser,
+    convert_to_bytes,
+    convert_to_payload64,
+    convert_to_stream,
+)
+from mavros_msgs.msg import Mavlink
+
+N = 20000
+
+
+def legacy_convert_to_bytes(msg: Mavlink) -> bytearray:
+    """convert_to_bytes() before precompiled structs were introduced."""
+    payload_octets = len(msg.payload64)
+    msg_len = 10 + msg.len
+    msgdata = bytearray(
+        struct.pack(
+            "<BBBBBBBBBB%dQ" % payload_octets,
+            msg.magic,
+            msg.len,
+            msg.incompat_flags,
+            msg.compat_flags,
+            msg.seq,
+            msg.sysid,
+            msg.compid,
+            msg.msgid & 0xFF,
+            (msg.msgid >> 8) & 0xFF,
+            (msg.msgid >> 16) & 0xFF,
+            *msg.payload64,
+        )
+    )
+    if payload_octets != msg.len / 8:
+        msgdata = msgdata[:msg_len]
+
+    msgdata += struct.pack("<H", msg.checksum)
+    msgdata += bytearray(msg.signature)
+    return msgdata
+
+
+def main():
+    payload = bytes(range(37))  # ATTITUDE-like payload size
+    msg = Mavlink(
+        magic=Mavlink.MAVLINK_V20,
+        len=len(payload),
+        sysid=1,
+        compid=1,
+        msgid=30,
+        payload64=convert_to_payload64(payload),
+    )
+
+    assert legacy_convert_to_bytes(msg) == convert_to_bytes(msg)
+
+    for name, fn in (
+        ("legacy convert_to_bytes", lambda: legacy_convert_to_bytes(msg)),
+        ("convert_to_bytes", lambda: convert_to_bytes(msg)),
+        ("convert_to_payload64", lambda: convert_to_payload64(payload)),
+    ):
+        t = min(timeit.repeat(fn, number=N, repeat=3))
+        print(f"{name:>24s}: {N / t:12.0f} msg/s")
+
+    batch = [msg] * 1000
+    stream = bytes(convert_to_stream(batch))
+    buf = bytearray()
+    for name, fn in (
+        ("convert_to_stream", lambda: convert_to_stream(batch, buf)),
+        ("MavlinkStreamParser", lambda: MavlinkStreamParser().feed(stream)),
+    ):
+        t = min(timeit.repeat(fn, number=N // 1000, repeat=3))
+        print(f"{name:>24s}: {N / t:12.0f} msg/s")
+
+
+if __name__ == "__main__":
+    main()
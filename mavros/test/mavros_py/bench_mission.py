@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark QGC plan and WPL load and save of a big survey mission.
+
+Run: python3 -m test.mavros_py.bench_mission
+"""
+
+import io
+import json
+import time
+
+import mavros.mission
+from mavros.mission import QGroundControlPlan, QGroundControlWPL
+
+N = 12000
+
+
+def make_survey_plan() -> str:
+    items = [
+        {
+            "autoContinue": True,
+            "command": 16,
+            "doJumpId": i + 2,
+            "frame": 3,
+            "params": [0, 0, 0, None, -35.36 + i * 1e-5, 149.16 + (i % 2) * 1e-3, 50],
+            "type": "SimpleItem",
+        }
+        for i in range(N)
+    ]
+    plan = {
+        "fileType": "Plan",
+        "geoFence": {"circles": [], "polygons": [], "version": 2},
+        "groundStation": "QGroundControl",
+        "mission": {
+            "cruiseSpeed": 15,
+            "firmwareType": 12,
+            "hoverSpeed": 5,
+            "items": [
+                {
+                    "autoContinue": True,
+                    "command": 22,
+                    "doJumpId": 1,
+                    "frame": 3,
+                    "params": [15, 0, 0, None, 0, 0, 50],
+                    "type": "SimpleItem",
+                },
+                {
+                    "type": "ComplexItem",
+                    "complexItemType": "survey",
+                    "version": 5,
+                    "TransectStyleComplexItem": {"Items": items},
+                },
+            ],
+            "plannedHomePosition": [-35.3632621, 149.1652374, 585],
+            "vehicleType": 2,
+            "version": 2,
+        },
+        "rallyPoints": {"points": [], "version": 2},
+        "version": 1,
+    }
+    return json.dumps(plan, indent=4)
+
+
+def make_survey_wpl() -> str:
+    lines = ["QGC WPL 110"]
+    for i in range(N):
+        lines.append(
+            f"{i}\t0\t3\t16\t0.000000\t0.000000\t0.000000\t0.000000"
+            f"\t{-35.36 + i * 1e-5:.8f}\t{149.16 + (i % 2) * 1e-3:.8f}\t50.000000\t1"
+        )
+    return "\r\n".join(lines) + "\r\n"
+
+
+def timed(name: str, fn):
+    start = time.perf_counter()
+    ret = fn()
+    print(f"{name:>24s}: {time.perf_counter() - start:8.3f} s")
+    return ret
+
+
+def main():
+    data = make_survey_plan()
+    print(f"survey: {N + 1} items, {len(data)} B")
+
+    orjson = mavros.mission.orjson
+    for name, mod in (("orjson", orjson), ("json", None)):
+        if name == "orjson" and orjson is None:
+            continue
+
+        mavros.mission.orjson = mod
+        try:
+            pf = timed(
+                f"{name} load", lambda: QGroundControlPlan().load(io.StringIO(data))
+            )
+        finally:
+            mavros.mission.orjson = orjson
+
+    timed("json save", lambda: pf.save(io.StringIO()))
+
+    data = make_survey_wpl()
+    print(f"WPL: {N} items, {len(data)} B")
+
+    np = mavros.mission.np
+    mavros.mission.np = None
+    try:
+        pf = timed("csv load", lambda: QGroundControlWPL().load(io.StringIO(data)))
+        timed("csv save", lambda: pf.save(io.StringIO()))
+    finally:
+        mavros.mission.np = np
+
+    if np is not None:
+        pf = timed("array load", lambda: QGroundControlWPL().load(io.StringIO(data)))
+        timed("array save", lambda: pf.save(io.StringIO()))
+        timed("materialize", lambda: pf.mission)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,30 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark nuttx_crc32 implementations.
+
+Run: python3 -m test.mavros_py.bench_nuttx_crc32 [size_in_bytes]
+"""
+
+import os
+import sys
+import timeit
+
+from mavros.nuttx_crc32 import nuttx_crc32, nuttx_crc32_slow
+
+
+def main():
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 1024 * 1024
+    data = os.urandom(size)
+
+    assert nuttx_crc32(data) == nuttx_crc32_slow(data)
+
+    for name, fn, number in (
+        ("nuttx_crc32_slow", nuttx_crc32_slow, 1),
+        ("nuttx_crc32", nuttx_crc32, 100),
+    ):
+        t = min(timeit.repeat(lambda: fn(data), number=number, repeat=3)) / number
+        print(f"{name:>20s}: {t * 1e3:10.3f} ms, {size / t / 1e6:10.1f} MB/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,84 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark param file parsers.
+
+Run: python3 -m test.mavros_py.bench_param
+"""
+
+import csv
+import io
+import time
+
+from mavros.param import (
+    MavProxyParam,
+    MissionPlannerParam,
+    Parameter,
+    QGroundControlParam,
+    detect_param_file,
+    np,
+)
+
+N = 20000
+
+
+def make_params():
+    params = {}
+    for i in range(N):
+        name = f"PARAM_{i:05d}"
+        if i % 3:
+            params[name] = Parameter(name, value=i * 0.125)
+        else:
+            params[name] = Parameter(name, value=i)
+
+    return params
+
+
+def csv_parse(file_class, file_: io.StringIO):
+    """Parser as it was: csv.reader and Parameter per line."""
+
+    def to_numeric(x):
+        return float(x) if "." in x else int(x)
+
+    name_col, value_col = (2, 3) if file_class is QGroundControlParam else (0, 1)
+    return {
+        data[name_col].strip(): Parameter(
+            data[name_col].strip(), value=to_numeric(data[value_col])
+        )
+        for data in csv.reader(file_, file_class.CSVDialect)
+        if not data[0].startswith("#")
+    }
+
+
+def timed(name: str, fn):
+    start = time.perf_counter()
+    ret = fn()
+    print(f"{name:>24s}: {time.perf_counter() - start:8.3f} s")
+    return ret
+
+
+def main():
+    params = make_params()
+
+    for file_class in (MavProxyParam, MissionPlannerParam, QGroundControlParam):
+        out = io.StringIO()
+        pf = file_class()
+        pf.parameters = params
+        pf.save(out)
+        data = out.getvalue()
+        print(f"{file_class.__name__}: {N} params, {len(data)} B")
+
+        def fresh():
+            return io.StringIO(data)
+
+        timed("csv + Parameter", lambda: csv_parse(file_class, fresh()))
+        timed("parse tuples", lambda: list(file_class.parse(fresh())))
+        pf = timed("load (lazy)", lambda: file_class().load(fresh()))
+        timed("parameters", lambda: pf.parameters)
+        if np is not None:
+            pf = file_class().load(fresh())
+            timed("to_array", pf.to_array)
+        timed("detect", lambda: detect_param_file(fresh()))
+
+
+if __name__ == "__main__":
+    main()
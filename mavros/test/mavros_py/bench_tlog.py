@@ -0,0 +1,77 @@
+# -*- coding: utf-8 -*-
+"""
+Benchmark tlog index and queries.
+
+Run: python3 -m test.mavros_py.bench_tlog
+"""
+
+import os
+import tempfile
+import time
+
+from mavros.mavlink import convert_to_payload64
+from mavros.tlog import TLOG_INDEX_SUFFIX, TlogReader, TlogWriter, stamp_to_usec
+from mavros_msgs.msg import Mavlink
+
+N = 200000
+MSGIDS = (0, 1, 24, 30, 32, 33, 74, 141)
+
+
+def write_log(path: str):
+    payload = bytes(range(28))
+    with open(path, "wb") as fd:
+        writer = TlogWriter(fd)
+        for i in range(N):
+            msg = Mavlink(
+                magic=Mavlink.MAVLINK_V20,
+                len=len(payload),
+                sysid=1 + i % 2,
+                compid=1,
+                msgid=MSGIDS[i % len(MSGIDS)],
+                payload64=convert_to_payload64(payload),
+            )
+            writer.write(msg, usec=1600000000000000 + i * 1000)
+
+
+def timed(name: str, fn):
+    start = time.perf_counter()
+    ret = fn()
+    print(f"{name:>24s}: {time.perf_counter() - start:8.3f} s")
+    return ret
+
+
+def main():
+    with tempfile.TemporaryDirectory() as tmpdir:
+        path = os.path.join(tmpdir, "bench.tlog")
+        write_log(path)
+        t0 = 1600000000000000 + N // 2 * 1000
+        t1 = t0 + 10 * 1000000
+        query = dict(msgid=30, sysid=2, t0=t0, t1=t1)
+
+        with TlogReader(path) as reader:
+
+            def linear_scan():
+                return sum(
+                    1
+                    for m in reader
+                    if m.msgid == 30 and m.sysid == 2 and t0 <= stamp_to_usec(m) < t1
+                )
+
+            timed("build index", lambda: reader.index)
+            timed("linear scan", linear_scan)
+            count = timed("indexed query", lambda: len(list(reader.query(**query))))
+            print(f"{'matched':>24s}: {count}")
+
+        with TlogReader(path, sidecar=True) as reader:
+            timed("build and save sidecar", lambda: reader.index)
+        print(
+            f"{'sidecar size':>24s}: {os.path.getsize(path + TLOG_INDEX_SUFFIX)} B"
+            f" for {os.path.getsize(path)} B log"
+        )
+        with TlogReader(path, sidecar=True) as reader:
+            timed("load sidecar", lambda: reader.index)
+            timed("indexed query", lambda: len(list(reader.query(**query))))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import io
+import os
+import shutil
+from unittest.mock import MagicMock
+
+import pytest
+from rclpy.task import Future
+
+from mavros.ftp import FTPFile, FTPPlugin, TransferJournal
+from mavros.nuttx_crc32 import nuttx_crc32
+from mavros_msgs.msg import FileEntry
+from mavros_msgs.srv import (
+    FileChecksum,
+    FileClose,
+    FileList,
+    FileOpen,
+    FileRead,
+    FileRemove,
+    FileWrite,
+)
+
+TEST_DATA = os.urandom(10 * 100 + 42)
+
+
+def make_fm(data: bytes = TEST_DATA) -> MagicMock:
+    def read(req):
+        off, size = req.offset, req.size
+        return FileRead.Response(data=data[off : off + size], success=True, r_errno=0)
+
+    def read_async(req):
+        fut = Future()
+        fut.set_result(read(req))
+        return fut
+
+    fm = MagicMock()
+    fm.cli_open.call = MagicMock(
+        return_value=FileOpen.Response(size=len(data), success=True, r_errno=0)
+    )
+    fm.cli_read.call = MagicMock(side_effect=read)
+    fm.cli_read.call_async = MagicMock(side_effect=read_async)
+    return fm
+
+
+def make_write_fm(fail_offset: int = -1):
+    written = {}
+
+    def write_async(req):
+        fut = Future()
+        if req.offset == fail_offset:
+            fut.set_result(FileWrite.Response(success=False, r_errno=errno.EIO))
+        else:
+            written[req.offset] = bytes(req.data)
+            fut.set_result(FileWrite.Response(success=True, r_errno=0))
+        return fut
+
+    fm = MagicMock()
+    fm.cli_open.call = MagicMock(
+        return_value=FileOpen.Response(size=0, success=True, r_errno=0)
+    )
+    fm.cli_write.call_async = MagicMock(side_effect=write_async)
+    return fm, written
+
+
+@pytest.mark.parametrize("window", [1, 2, 8])
+def test_FTPFile_read(window):
+    fm = make_fm()
+    fd = FTPFile(fm=fm, name="/test", mode="r", window=window)
+
+    buf = bytearray()
+    while True:
+        chunk = fd.read(100)
+        if len(chunk) == 0:
+            break
+        buf += chunk
+
+    assert TEST_DATA == buf
+    assert len(TEST_DATA) == fd.tell()
+    if window > 1:
+        fm.cli_read.call.assert_not_called()
+
+
+def test_FTPFile_read_busy():
+    fm = make_fm()
+    read_async = fm.cli_read.call_async.side_effect
+    dropped = []
+
+    def busy_read_async(req):
+        # mavros drops a request which came while it was busy
+        if req.offset == 300 and len(dropped) < 2:
+            dropped.append(req)
+            return Future()
+        return read_async(req)
+
+    fm.cli_read.call_async.side_effect = busy_read_async
+    fd = FTPFile(fm=fm, name="/test", mode="r", window=4)
+    fd.timeout_sec = 0.01
+
+    buf = bytearray()
+    while True:
+        chunk = fd.read(100)
+        if len(chunk) == 0:
+            break
+        buf += chunk
+
+    assert TEST_DATA == buf
+    assert 2 == len(dropped)
+
+    # gives up after retries
+    dropped.clear()
+    fd.retries = 1
+    fd.seek(0)
+    with pytest.raises(IOError) as excinfo:
+        while fd.read(100):
+            pass
+    assert errno.ETIMEDOUT == excinfo.value.errno
+
+
+def test_FTPFile_read_seek():
+    fm = make_fm()
+    fd = FTPFile(fm=fm, name="/test", mode="r", window=4)
+
+    assert TEST_DATA[:100] == fd.read(100)
+    fd.seek(500)
+    assert TEST_DATA[500:600] == fd.read(100)
+    assert TEST_DATA[600:650] == fd.read(50)
+
+
+def test_FTPFile_write_pipelined():
+    fm, written = make_write_fm()
+    fd = FTPFile(fm=fm, name="/test", mode="w", window=4)
+
+    for off in range(0, len(TEST_DATA), 100):
+        fd.write(TEST_DATA[off : off + 100])
+
+    fd.flush()
+    assert len(TEST_DATA) == fd.tell()
+    assert len(TEST_DATA) == fd.size
+    assert TEST_DATA == b"".join(written[k] for k in sorted(written))
+
+
+def test_FTPFile_write_pipelined_error():
+    fm, written = make_write_fm(fail_offset=300)
+    fd = FTPFile(fm=fm, name="/test", mode="w", window=4)
+
+    with pytest.raises(IOError):
+        for off in range(0, len(TEST_DATA), 100):
+            fd.write(TEST_DATA[off : off + 100])
+            assert fd.tell() == fd.size
+        fd.flush()
+
+    # size is rewound too, writes after the failed one do not count
+    assert 300 == fd.tell()
+    assert 300 == fd.size
+
+    # failed overwrite keeps size of the file
+    fm, written = make_write_fm(fail_offset=0)
+    fd = FTPFile(fm=fm, name="/test", mode="w", window=4)
+    fd.size = 1000
+    with pytest.raises(IOError):
+        fd.write(TEST_DATA[:100])
+        fd.write(TEST_DATA[100:1200])
+        fd.flush()
+
+    assert 0 == fd.tell()
+    assert 1000 == fd.size
+
+
+def test_FTPFile_close():
+    fm, written = make_write_fm()
+    fm.cli_close.call = MagicMock(
+        return_value=FileClose.Response(success=True, r_errno=0)
+    )
+
+    with FTPFile(fm=fm, name="/test", mode="w", window=4) as fd:
+        fd.write(TEST_DATA[:100])
+
+    assert fd.closed
+    assert TEST_DATA[:100] == written[0]
+    fm.cli_close.call.assert_called_once()
+    assert "/test" == fm.cli_close.call.call_args[0][0].file_path
+
+    # second close is a no-op
+    fd.close()
+    fm.cli_close.call.assert_called_once()
+
+    fm.cli_close.call.return_value = FileClose.Response(
+        success=False, r_errno=errno.EBADF
+    )
+    fd = FTPFile(fm=fm, name="/test", mode="w")
+    with pytest.raises(IOError):
+        fd.close()
+    assert fd.closed
+
+
+def test_TransferJournal(tmp_path):
+    path = tmp_path / "file.bin.mavftp-journal"
+    assert TransferJournal.load(path) is None
+
+    journal = TransferJournal(remote_path="/test", size=1000)
+    journal.offset = 100
+    journal.crc32 = 0xDEADBEEF
+    journal.save(path)
+
+    loaded = TransferJournal.load(path)
+    assert journal == loaded
+    assert loaded.matches("/test", 1000)
+    assert not loaded.matches("/test", 1001)
+
+    path.write_text("{garbage")
+    assert TransferJournal.load(path) is None
+
+
+def test_FTPPlugin_walk():
+    tree = {
+        "/log": [
+            FileEntry(name=".", type=FileEntry.TYPE_DIRECTORY),
+            FileEntry(name="sess001", type=FileEntry.TYPE_DIRECTORY),
+            FileEntry(name="a.ulg", type=FileEntry.TYPE_FILE, size=10),
+        ],
+        "/log/sess001": [
+            FileEntry(name="b.ulg", type=FileEntry.TYPE_FILE, size=20),
+        ],
+    }
+
+    fm = FTPPlugin(MagicMock())
+    fm.listdir = MagicMock(side_effect=lambda path: tree[path])
+
+    result = [
+        (path, [d.name for d in dirs], [f.name for f in files])
+        for path, dirs, files in fm.walk("/log")
+    ]
+    assert [
+        ("/log", ["sess001"], ["a.ulg"]),
+        ("/log/sess001", [], ["b.ulg"]),
+    ] == result
+
+
+def test_FTPPlugin_cache():
+    entries = [FileEntry(name="a.bin", type=FileEntry.TYPE_FILE, size=10)]
+
+    fm = FTPPlugin(MagicMock())
+    fm.cli_listdir = MagicMock()
+    fm.cli_listdir.call = MagicMock(
+        return_value=FileList.Response(list=entries, success=True, r_errno=0)
+    )
+    fm.cli_checksum = MagicMock()
+    fm.cli_checksum.call = MagicMock(
+        return_value=FileChecksum.Response(crc32=0x1234, success=True, r_errno=0)
+    )
+    fm.cli_unlink = MagicMock()
+    fm.cli_unlink.call = MagicMock(
+        return_value=FileRemove.Response(success=True, r_errno=0)
+    )
+    fm.enable_cache(ttl=60.0)
+
+    for _ in range(3):
+        assert entries == fm.listdir("/fs")
+        assert 0x1234 == fm.checksum("/fs/a.bin")
+
+    fm.cli_listdir.call.assert_called_once()
+    fm.cli_checksum.call.assert_called_once()
+
+    fm.unlink("/fs/a.bin")
+    fm.listdir("/fs")
+    fm.checksum("/fs/a.bin")
+
+    assert 2 == fm.cli_listdir.call.call_count
+    assert 2 == fm.cli_checksum.call.call_count
+
+
+def test_FTPFile_rawio():
+    fm = make_fm()
+    fd = FTPFile(fm=fm, name="/test", mode="r", window=2)
+
+    assert fd.readable()
+    assert not fd.writable()
+
+    buf = bytearray(100)
+    assert 100 == fd.readinto(buf)
+    assert TEST_DATA[:100] == buf
+
+    # reader closes fd when it's collected
+    reader = io.BufferedReader(fd)
+    out = io.BytesIO()
+    shutil.copyfileobj(reader, out)
+    assert TEST_DATA[100:] == out.getvalue()
+
+    reader.seek(0)
+    assert TEST_DATA == reader.read()
+
+    reader.close()
+    assert fd.closed
+    calls = fm.cli_read.call_async.call_count
+    for op in (
+        fd.read,
+        lambda: fd.readinto(bytearray(10)),
+        lambda: fd.seek(0),
+        lambda: fd.write(b"data"),
+    ):
+        with pytest.raises(ValueError, match="closed file"):
+            op()
+    assert calls == fm.cli_read.call_async.call_count
+
+
+def test_FTPFile_verify():
+    fm = make_fm()
+    fm.checksum = MagicMock(return_value=nuttx_crc32(TEST_DATA))
+
+    fd = FTPFile(fm=fm, name="/test", mode="r", window=4)
+    while len(fd.read(100)) > 0:
+        pass
+
+    calls = fm.cli_read.call_async.call_count
+    assert nuttx_crc32(TEST_DATA) == fd.crc32
+    assert fd.verify()
+    assert calls == fm.cli_read.call_async.call_count
+
+    # seek breaks sequence, so verify() have to read file again
+    fd = FTPFile(fm=fm, name="/test", mode="r")
+    fd.seek(500)
+    fd.read(100)
+    assert fd.verify()
+    assert 600 == fd.tell()
+
+
+def test_FTPFile_verify_write():
+    fm, written = make_write_fm()
+    fm.checksum = MagicMock(return_value=nuttx_crc32(TEST_DATA))
+
+    fd = FTPFile(fm=fm, name="/test", mode="w", window=2)
+    for off in range(0, len(TEST_DATA), 100):
+        fd.write(TEST_DATA[off : off + 100])
+
+    assert fd.verify()
+
+    fd.seek(0)
+    fd.write(TEST_DATA[:100])
+    with pytest.raises(IOError):
+        fd.verify()
+
+    assert fd.verify(io.BytesIO(TEST_DATA))
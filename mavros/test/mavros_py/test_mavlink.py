@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+
+import io
+import struct
+
+import pytest
+from pymavlink import mavutil
+from pymavlink.dialects.v10 import common as common_v10
+from pymavlink.dialects.v20 import common as common_v20
+
+from mavros.mavlink import (
+    MavlinkSigning,
+    MavlinkStreamParser,
+    convert_to_bytes,
+    convert_to_payload64,
+    convert_to_rosmsg,
+    convert_to_stream,
+    parse_stream,
+)
+from mavros_msgs.msg import Mavlink
+
+
+def make_heartbeat(dialect, seq: int = 7):
+    mav = dialect.MAVLink(None, srcSystem=1, srcComponent=1)
+    mav.seq = seq
+    msg = dialect.MAVLink_heartbeat_message(
+        type=2,
+        autopilot=3,
+        base_mode=81,
+        custom_mode=65536,
+        system_status=4,
+        mavlink_version=3,
+    )
+    return msg, bytes(msg.pack(mav))
+
+
+@pytest.mark.parametrize(
+    "dialect,magic,header_len",
+    [
+        (common_v10, Mavlink.MAVLINK_V10, 6),
+        (common_v20, Mavlink.MAVLINK_V20, 10),
+    ],
+)
+def test_convert_to_bytes(dialect, magic, header_len):
+    msg, buf = make_heartbeat(dialect)
+    payload = buf[header_len:-2]
+
+    rosmsg = Mavlink(
+        magic=magic,
+        len=len(payload),
+        seq=7,
+        sysid=1,
+        compid=1,
+        msgid=msg.get_msgId(),
+        checksum=msg.get_crc(),
+        payload64=convert_to_payload64(payload),
+    )
+
+    assert buf == convert_to_bytes(rosmsg)
+
+
+@pytest.mark.parametrize("payload_len", [0, 1, 8, 9, 255])
+def test_convert_to_payload64(payload_len):
+    payload = bytes(range(payload_len))
+    payload64 = convert_to_payload64(payload)
+
+    assert (payload_len + 7) // 8 == len(payload64)
+    assert payload == b"".join(v.to_bytes(8, "little") for v in payload64)[:payload_len]
+
+
+def test_convert_to_bytes_short_payload():
+    rosmsg = Mavlink(magic=Mavlink.MAVLINK_V20, len=9, payload64=[0])
+
+    with pytest.raises(ValueError):
+        convert_to_bytes(rosmsg)
+
+
+def make_stream(dialect, count: int = 10) -> bytes:
+    return b"".join(make_heartbeat(dialect, seq)[1] for seq in range(count))
+
+
+CRC_EXTRAS = {k: v.crc_extra for k, v in common_v20.mavlink_map.items()}
+
+
+@pytest.mark.parametrize("dialect", [common_v10, common_v20])
+def test_MavlinkStreamParser(dialect):
+    stream = make_stream(dialect)
+
+    parser = MavlinkStreamParser(crc_extras=CRC_EXTRAS)
+    msgs = []
+    # garbage before first frame and odd chunk sizes should not matter
+    data = b"\x00\x11garbage" + stream
+    for off in range(0, len(data), 7):
+        msgs += parser.feed(data[off : off + 7])
+
+    assert 10 == len(msgs)
+    assert list(range(10)) == [m.seq for m in msgs]
+    assert all(m.framing_status == Mavlink.FRAMING_OK for m in msgs)
+    assert stream == convert_to_stream(msgs)
+
+
+def test_MavlinkStreamParser_bad_crc():
+    _, buf = make_heartbeat(common_v20)
+    buf = bytearray(buf)
+    # mask must not turn payload byte into STX, parser rescans damaged frame
+    buf[12] ^= 0x0F
+
+    (msg,) = MavlinkStreamParser(crc_extras=CRC_EXTRAS).feed(buf)
+    assert Mavlink.FRAMING_BAD_CRC == msg.framing_status
+
+
+def test_MavlinkStreamParser_false_stx():
+    # stray STX of a "HEARTBEAT", its frame swallows the head of the next one
+    data = b"\xfd\x05\x00\x00\x00\x01\x01\x00\x00\x00" + make_stream(common_v20, 3)
+
+    msgs = MavlinkStreamParser(crc_extras=CRC_EXTRAS).feed(data)
+    assert Mavlink.FRAMING_BAD_CRC == msgs[0].framing_status
+    assert [0, 1, 2] == [m.seq for m in msgs[1:]]
+    assert all(m.framing_status == Mavlink.FRAMING_OK for m in msgs[1:])
+
+
+def test_parse_stream_tlog():
+    frames = [make_heartbeat(common_v20, seq)[1] for seq in range(5)]
+    tlog = b"".join(
+        struct.pack(">Q", 1600000000000000 + i * 1500) + f for i, f in enumerate(frames)
+    )
+
+    msgs = list(parse_stream(io.BytesIO(tlog), tlog=True, chunk_size=16))
+
+    assert 5 == len(msgs)
+    assert 1600000000 == msgs[0].header.stamp.sec
+    assert 1500000 == msgs[1].header.stamp.nanosec
+    assert b"".join(frames) == convert_to_stream(msgs)
+
+
+SECRET_KEY = bytes(range(32))
+
+
+def make_signed_heartbeat(seq: int = 7, timestamp: int = 1000, link_id: int = 2):
+    mav = common_v20.MAVLink(None, srcSystem=1, srcComponent=1)
+    mav.seq = seq
+    mav.signing.secret_key = SECRET_KEY
+    mav.signing.link_id = link_id
+    mav.signing.timestamp = timestamp
+    mav.signing.sign_outgoing = True
+    msg = common_v20.MAVLink_heartbeat_message(2, 3, 81, 65536, 4, 3)
+    return msg, bytes(msg.pack(mav))
+
+
+def test_convert_to_rosmsg_signed(monkeypatch):
+    monkeypatch.setattr(mavutil, "mavlink20", lambda: True)
+    msg, buf = make_signed_heartbeat()
+
+    rosmsg = convert_to_rosmsg(msg)
+    assert buf[-13:] == bytes(rosmsg.signature)
+    assert buf == convert_to_bytes(rosmsg)
+
+
+def test_MavlinkSigning_verify():
+    stream = b"".join(
+        make_signed_heartbeat(seq, timestamp=1000 + seq)[1] for seq in range(3)
+    )
+    signing = MavlinkSigning(SECRET_KEY)
+    signing.timestamp = 0
+
+    msgs = MavlinkStreamParser(crc_extras=CRC_EXTRAS, signing=signing).feed(stream)
+    assert 3 == len(msgs)
+    assert all(m.framing_status == Mavlink.FRAMING_OK for m in msgs)
+    assert {(2, 1, 1): 1002} == signing.stream_timestamps
+
+    # replayed frame
+    assert not signing.verify(msgs[0])
+
+    # tampered payload with recalculated crc
+    hb, buf = make_signed_heartbeat(timestamp=2000)
+    buf = bytearray(buf)
+    buf[12] ^= 0x0F
+    crc = common_v20.x25crc(buf[1:-15])
+    crc.accumulate(struct.pack("B", hb.crc_extra))
+    struct.pack_into("<H", buf, len(buf) - 15, crc.crc)
+    (msg,) = MavlinkStreamParser(crc_extras=CRC_EXTRAS, signing=signing).feed(buf)
+    assert Mavlink.FRAMING_BAD_SIGNATURE == msg.framing_status
+
+    # wrong key
+    assert not MavlinkSigning(bytes(32)).verify(msgs[1])
+
+
+def test_MavlinkSigning_sign():
+    _, signed = make_signed_heartbeat(timestamp=1000, link_id=2)
+    _, unsigned = make_heartbeat(common_v20)
+    (msg,) = MavlinkStreamParser().feed(unsigned)
+
+    signing = MavlinkSigning(SECRET_KEY, link_id=2)
+    signing.now = lambda: 0
+    signing.timestamp = 999
+    signing.sign(msg, CRC_EXTRAS[msg.msgid])
+
+    assert signed == convert_to_bytes(msg)
+
+    verifier = MavlinkSigning(SECRET_KEY)
+    assert not verifier.verify(msg)  # new stream is too old
+    verifier.timestamp = 0
+    assert verifier.verify(msg)
@@ -1,12 +1,15 @@
 # -*- coding: utf-8 -*-
 
+import io
+import json
+import math
 import pathlib
 
 import pytest
 
-from mavros.mission import QGroundControlWPL
-
-# from mavros.mission import QGroundControlPlan
+import mavros.mission
+from mavros.mission import QGroundControlPlan, QGroundControlWPL
+from mavros_msgs.msg import CommandCode
 
 
 @pytest.mark.parametrize(
@@ -19,13 +22,13 @@ from mavros.mission import QGroundControlWPL
             0,
             0,
         ),
-        # ( # XXX TODO(vooon): implement me!
-        #     QGroundControlPlan,
-        #     "simple.plan",
-        #     0,
-        #     0,
-        #     0,
-        # ),
+        (
+            QGroundControlPlan,
+            "simple.plan",
+            11,
+            6,
+            3,
+        ),
     ],
 )
 def test_PlanFile_load(
@@ -39,3 +42,178 @@ def test_PlanFile_load(
     assert expected_mission_len == len(pf.mission or [])
     assert expected_fence_len == len(pf.fence or [])
     assert expected_rally_len == len(pf.rally or [])
+
+
+@pytest.mark.skipif(mavros.mission.np is None, reason="NumPy is not installed")
+def test_QGroundControlWPL_array(monkeypatch):
+    file_path = pathlib.Path(__file__).parent / "testdata" / "CMAC-circuit.txt"
+
+    with file_path.open() as file_:
+        pf = QGroundControlWPL().load(file_)
+
+    assert 8 == len(pf.points)
+    assert list(pf.fields_map.keys()) == list(pf.points.dtype.names)
+    assert pf._mission is None
+
+    # save right from the array
+    out_array = io.StringIO()
+    pf.save(out_array)
+    assert pf._mission is None
+
+    # materialized on access
+    assert CommandCode.NAV_TAKEOFF == pf.mission[1].command
+    assert pf.points[3]["x_lat"] == pf.mission[3].x_lat
+    assert pf.mission[0].autocontinue is True
+    pf.mission[1].z_alt = 123.0
+    out_mission = io.StringIO()
+    pf.save(out_mission)
+    assert "\t123.0\t" in out_mission.getvalue()
+
+    # same output as without NumPy
+    monkeypatch.setattr(mavros.mission, "np", None)
+    with file_path.open() as file_:
+        pf = QGroundControlWPL().load(file_)
+    assert pf.points is None
+    out_list = io.StringIO()
+    pf.save(out_list)
+    assert out_list.getvalue() == out_array.getvalue()
+
+
+def load_plan(text: str) -> QGroundControlPlan:
+    return QGroundControlPlan().load(io.StringIO(text))
+
+
+@pytest.mark.parametrize("use_orjson", [True, False])
+def test_QGroundControlPlan_roundtrip(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(mavros.mission, "orjson", None)
+
+    file_path = pathlib.Path(__file__).parent / "testdata" / "simple.plan"
+    pf = load_plan(file_path.read_text())
+
+    # ArduPilot: planned home is the item 0
+    assert pf.mission_has_home
+    assert -35.3632621 == pf.mission[0].x_lat
+    assert CommandCode.NAV_TAKEOFF == pf.mission[1].command
+    assert math.isnan(pf.mission[1].param4)
+    assert [CommandCode.NAV_FENCE_POLYGON_VERTEX_INCLUSION] * 4 + [
+        CommandCode.NAV_FENCE_CIRCLE_INCLUSION,
+        CommandCode.NAV_FENCE_RETURN_POINT,
+    ] == [w.command for w in pf.fence]
+    assert 463.7075269143206 == pytest.approx(pf.fence[4].param1)
+    assert {CommandCode.NAV_RALLY_POINT} == {w.command for w in pf.rally}
+
+    out = io.StringIO()
+    pf.save(out)
+    assert out.getvalue().startswith('{\n    "')
+    plan = json.loads(out.getvalue())
+    assert [-35.3632621, 149.1652374, 585] == plan["mission"]["plannedHomePosition"]
+    assert 10 == len(plan["mission"]["items"])
+    assert None is plan["mission"]["items"][0]["params"][3]
+    assert 4 == len(plan["geoFence"]["polygons"][0]["polygon"])
+
+    pf2 = load_plan(out.getvalue())
+    for a, b in zip(
+        pf.mission + pf.fence + pf.rally, pf2.mission + pf2.fence + pf2.rally
+    ):
+        assert (a.command, a.frame, a.x_lat, a.y_long, a.z_alt) == (
+            b.command,
+            b.frame,
+            b.x_lat,
+            b.y_long,
+            b.z_alt,
+        )
+
+
+def test_QGroundControlPlan_complex():
+    item = {
+        "autoContinue": True,
+        "command": 16,
+        "frame": 3,
+        "params": [0, 0, 0, None, 1.0, 2.0, 50],
+        "type": "SimpleItem",
+    }
+    plan = {
+        "fileType": "Plan",
+        "mission": {
+            "firmwareType": 12,
+            "items": [
+                item,
+                {
+                    "type": "ComplexItem",
+                    "complexItemType": "survey",
+                    "TransectStyleComplexItem": {"Items": [item] * 5},
+                },
+            ],
+        },
+        "version": 1,
+    }
+
+    pf = load_plan(json.dumps(plan))
+    assert 6 == len(pf.mission)
+    assert [] == pf.fence
+    assert [] == pf.rally
+
+    # ArduPilot plan without planned home: nothing to split off on save
+    plan["mission"]["firmwareType"] = 3
+    pf = load_plan(json.dumps(plan))
+    assert not pf.mission_has_home
+    out = io.StringIO()
+    pf.save(out)
+    assert 6 == len(json.loads(out.getvalue())["mission"]["items"])
+
+    # other complex items: expanded from their stored items, or skipped
+    plan["mission"]["items"] += [
+        {"type": "ComplexItem", "complexItemType": "StructureScan", "Items": [item]},
+        {"type": "ComplexItem", "complexItemType": "vtolLandingPattern"},
+    ]
+    with pytest.warns(UserWarning, match="vtolLandingPattern"):
+        pf = load_plan(json.dumps(plan))
+    assert 7 == len(pf.mission)
+
+
+@pytest.mark.parametrize("firmware_type,jump_index", [(12, 4), (3, 5)])
+def test_QGroundControlPlan_do_jump(firmware_type, jump_index):
+    def item(jump_id, command=16, param1=0):
+        return {
+            "command": command,
+            "doJumpId": jump_id,
+            "frame": 3,
+            "params": [param1, 0, 0, None, jump_id, 2.0, 50],
+            "type": "SimpleItem",
+        }
+
+    plan = {
+        "fileType": "Plan",
+        "mission": {
+            "firmwareType": firmware_type,
+            "items": [
+                item(1, command=22),
+                {
+                    "type": "ComplexItem",
+                    "complexItemType": "survey",
+                    "TransectStyleComplexItem": {"Items": [item(i) for i in (2, 3, 4)]},
+                },
+                item(5),
+                item(6, command=CommandCode.DO_JUMP, param1=5),
+            ],
+            "plannedHomePosition": [1.0, 2.0, 0],
+        },
+        "version": 1,
+    }
+
+    # PX4 gets DO_JUMP target as index of the mission, ArduPilot counts home too
+    pf = load_plan(json.dumps(plan))
+    assert CommandCode.DO_JUMP == pf.mission[-1].command
+    assert jump_index == pf.mission[-1].param1
+    assert 5.0 == pf.mission[jump_index].x_lat
+
+    out = io.StringIO()
+    pf.save(out)
+    items = json.loads(out.getvalue())["mission"]["items"]
+    assert [1, 2, 3, 4, 5, 6] == [it["doJumpId"] for it in items]
+    assert 5 == items[-1]["params"][0]
+
+    plan["mission"]["items"][-1]["params"][0] = 7
+    with pytest.raises(ValueError, match="DO_JUMP"):
+        load_plan(json.dumps(plan))
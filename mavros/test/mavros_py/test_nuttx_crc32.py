@@ -0,0 +1,32 @@
+# -*- coding: utf-8 -*-
+
+import os
+
+import pytest
+
+from mavros.nuttx_crc32 import nuttx_crc32, nuttx_crc32_slow
+
+
+@pytest.mark.parametrize(
+    "data",
+    [
+        b"",
+        b"\x00",
+        b"123456789",
+        bytes(range(256)),
+        os.urandom(4301),
+    ],
+)
+@pytest.mark.parametrize("crc32val", [0, 1, 0x12345678, 0xFFFFFFFF])
+def test_nuttx_crc32(data, crc32val):
+    assert nuttx_crc32_slow(data, crc32val) == nuttx_crc32(data, crc32val)
+
+
+def test_nuttx_crc32_chaining():
+    data = os.urandom(3 * 4301 + 17)
+
+    crc = 0
+    for off in range(0, len(data), 4301):
+        crc = nuttx_crc32(memoryview(data)[off : off + 4301], crc)
+
+    assert nuttx_crc32_slow(data) == crc
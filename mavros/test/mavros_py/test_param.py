@@ -3,17 +3,30 @@
 import datetime
 import io
 import pathlib
+import threading
 from unittest.mock import MagicMock, patch
 
 import pytest
+from rcl_interfaces.msg import SetParametersResult
+from rcl_interfaces.srv import SetParameters
+from rclpy.task import Future
 
 from mavros.param import (
+    BulkSetResult,
     MavProxyParam,
     MissionPlannerParam,
+    ParamCache,
     ParamDict,
     Parameter,
+    ParamPlugin,
+    ParamPullTracker,
     QGroundControlParam,
+    detect_param_file,
+    diff_parameters,
+    np,
 )
+from mavros_msgs.msg import ParamEvent
+from mavros_msgs.srv import ParamPull, ParamSetV2
 
 
 def test_ParamDict_get():
@@ -78,6 +91,45 @@ def test_ParamDict_set():
         assert pm.TEST_D.value == 5
 
 
+def test_ParamDict_events():
+    pm = ParamDict()
+    pm._pm = MagicMock()
+    changes = []
+    pm.subscribe_changes(changes.append)
+    timer = pm._pm._node.create_timer.return_value
+    timer.cancel.assert_called_once()
+
+    with patch("mavros.utils.call_set_parameters", MagicMock()) as csp:
+        for i in range(100):
+            pm._event_handler(
+                ParamEvent(
+                    param_id=f"TEST_{i % 50}",
+                    value=Parameter("TEST", value=i).get_parameter_value(),
+                )
+            )
+
+        csp.assert_not_called()
+
+    # one burst, one callback
+    timer.reset.assert_called_once()
+    assert [] == changes
+    pm.flush_changes()
+    assert [{f"TEST_{i}" for i in range(50)}] == changes
+    assert 99 == pm.TEST_49.value
+
+    pm.flush_changes()
+    assert 1 == len(changes)
+
+    pm.unsubscribe_changes(changes.append)
+    pm._event_handler(
+        ParamEvent(
+            param_id="TEST_0", value=Parameter("TEST", value=1).get_parameter_value()
+        )
+    )
+    pm.flush_changes()
+    assert 1 == len(changes)
+
+
 def test_ParamDict_del():
     pm = ParamDict()
     pm._pm = MagicMock()
@@ -95,6 +147,454 @@ def test_ParamDict_del():
         del pm.NO_ATTR
 
 
+def make_set_pp(fail_once=(), fail=(), lost_once=()):
+    """ParamPlugin with SetParameters service answering from other thread."""
+    lost_once = set(lost_once)
+    requests = []
+    pending = []
+    max_in_flight = 0
+    failed_once = set()
+    cond = threading.Condition()
+
+    def set_async(req):
+        nonlocal max_in_flight
+        fut = Future()
+        with cond:
+            requests.append([p.name for p in req.parameters])
+            pending.append((req, fut))
+            max_in_flight = max(max_in_flight, len(pending))
+            cond.notify()
+        return fut
+
+    def result(name):
+        if name in fail or (name in fail_once and name not in failed_once):
+            failed_once.add(name)
+            return SetParametersResult(successful=False, reason="timeout")
+        return SetParametersResult(successful=True)
+
+    def server():
+        while True:
+            with cond:
+                # let the client fill its window
+                cond.wait_for(lambda: pending, timeout=0.01)
+                if not pending:
+                    continue
+                req, fut = pending.pop(0)
+            names = {p.name for p in req.parameters}
+            if names & lost_once:
+                lost_once.difference_update(names)
+                continue  # response never comes
+            fut.set_result(
+                SetParameters.Response(results=[result(p.name) for p in req.parameters])
+            )
+
+    threading.Thread(target=server, daemon=True).start()
+
+    pp = ParamPlugin(MagicMock())
+    pp.cli_set_parameters = MagicMock()
+    pp.cli_set_parameters.call_async = MagicMock(side_effect=set_async)
+    return pp, requests, lambda: max_in_flight
+
+
+def test_ParamPlugin_set_parameters_bulk():
+    pp, requests, max_in_flight = make_set_pp(fail_once={"P_3", "P_42"}, fail={"P_7"})
+    params = [Parameter(f"P_{i}", value=i) for i in range(50)]
+    progress = []
+
+    ret = pp.set_parameters_bulk(
+        params, batch_size=10, max_in_flight=3, retries=2, progress=progress.append
+    )
+
+    assert 50 == len(ret.results)
+    assert ["P_7"] == [r.name for r in ret.failed]
+    assert 3 == ret.results["P_7"].attempts
+    assert 2 == ret.results["P_42"].attempts
+    assert 1 == ret.results["P_0"].attempts
+    assert 50 + 3 + 1 == len(progress)
+    # whole set in batches, then only failed names
+    assert 5 + 1 + 1 == len(requests)
+    assert ["P_3", "P_7", "P_42"] == requests[5]
+    assert ["P_7"] == requests[6]
+    assert 1 < max_in_flight() <= 3
+
+    with pytest.raises(ValueError, match="P_7: timeout"):
+        ret.check_and_raise()
+
+
+def test_ParamPlugin_set_parameters_bulk_timeout():
+    pp, requests, _ = make_set_pp(lost_once={"P_12"})
+    params = [Parameter(f"P_{i}", value=i) for i in range(30)]
+
+    ret = pp.set_parameters_bulk(params, batch_size=10, retries=1, timeout=0.1)
+
+    pp.cli_set_parameters.wait_for_service.assert_called()
+    assert [] == ret.failed
+    assert 2 == ret.results["P_12"].attempts
+    assert 1 == ret.results["P_0"].attempts
+    assert [f"P_{i}" for i in range(10, 20)] == requests[-1]
+
+    pp, requests, _ = make_set_pp(lost_once={"P_12"})
+    ret = pp.set_parameters_bulk(params, batch_size=10, retries=0, timeout=0.1)
+
+    assert 10 == len(ret.failed)
+    assert "response timed out" == ret.results["P_12"].reason
+
+
+def test_ParamDict_update_bulk():
+    pp, requests, _ = make_set_pp(fail={"TEST_F"})
+    pm = ParamDict()
+    pm._pm = pp
+    pm.setdefault("TEST_I", 1)
+
+    values = {"TEST_I": 2, "TEST_F": 3.0, "TEST_S": ParamDict.NoSet(4)}
+    ret = pm.update_bulk(values, retries=0)
+
+    assert [["TEST_I", "TEST_F"]] == requests
+    assert ["TEST_F"] == [r.name for r in ret.failed]
+    assert 2 == pm.TEST_I.value
+    assert 4 == pm.TEST_S.value
+    assert "TEST_F" not in pm
+
+    with pytest.raises(ValueError, match="TEST_F"):
+        pm.update(TEST_F=3.0)
+
+
+CACHE_KEY = ("0011223344556677", 1, 1)
+CACHE_PARAMS = {
+    "TEST_B": Parameter("TEST_B", value=True),
+    "TEST_I": Parameter("TEST_I", value=100),
+    "TEST_F": Parameter("TEST_F", value=1.0),
+}
+
+
+HASHED_PARAMS = {
+    **CACHE_PARAMS,
+    "_HASH_CHECK": Parameter("_HASH_CHECK", value=42),
+}
+
+
+def test_ParamCache(tmp_path):
+    cache = ParamCache(tmp_path / "params.sqlite")
+    assert cache.load(CACHE_KEY, 3) is None
+
+    cache.save(CACHE_KEY, CACHE_PARAMS.values(), 3, 42)
+    cache.update(CACHE_KEY, [Parameter("TEST_I", value=200)])
+
+    params = cache.load(CACHE_KEY, 3, 42)
+    assert {"TEST_B": True, "TEST_I": 200, "TEST_F": 1.0} == {
+        k: v.value for k, v in params.items()
+    }
+    assert isinstance(params["TEST_B"].value, bool)
+    assert isinstance(params["TEST_F"].value, float)
+    assert params.keys() == cache.load(CACHE_KEY, None, 42).keys()
+
+    # stale: count or hash differs, other vehicle
+    assert cache.load(CACHE_KEY, 4, 42) is None
+    assert cache.load(CACHE_KEY, 3, 43) is None
+    assert cache.load(CACHE_KEY, None, 43) is None
+    assert cache.load(CACHE_KEY, 3) is None
+    assert cache.load(("0", 1, 1), 3, 42) is None
+
+    cache.invalidate(CACHE_KEY)
+    assert cache.load(CACHE_KEY, 3, 42) is None
+    cache.close()
+
+
+def make_cached_pp(tmp_path):
+    pp = ParamPlugin(MagicMock())
+    pp.get_vehicle_key = MagicMock(return_value=CACHE_KEY)
+    pp.subscribe_events = MagicMock()
+    pp.call_pull = MagicMock(
+        return_value=ParamPull.Response(success=True, param_received=4)
+    )
+    pp.enable_cache(tmp_path / "params.sqlite")
+    return pp
+
+
+def test_ParamPlugin_values_cache(tmp_path):
+    names = list(HASHED_PARAMS)
+    hash_only = {"_HASH_CHECK": HASHED_PARAMS["_HASH_CHECK"]}
+
+    with patch("mavros.param.call_list_parameters", MagicMock(return_value=names)):
+        # 1. miss: pull and fill the cache
+        pp = make_cached_pp(tmp_path)
+        with patch(
+            "mavros.param.call_get_parameters", MagicMock(return_value=HASHED_PARAMS)
+        ) as cgp:
+            pm = pp.values
+            assert ["_HASH_CHECK"] == cgp.call_args_list[0].kwargs["names"]
+            assert 2 == cgp.call_count
+        pp.call_pull.assert_called_once()
+        assert 4 == len(pm)
+
+        # events refresh the cache
+        pp._event_cb(
+            ParamEvent(
+                param_id="TEST_I",
+                value=Parameter("TEST_I", value=300).get_parameter_value(),
+            )
+        )
+
+        # 2. hit: no pull, only the hash is fetched
+        pp = make_cached_pp(tmp_path)
+        with patch(
+            "mavros.param.call_get_parameters", MagicMock(return_value=hash_only)
+        ) as cgp:
+            pm = pp.values
+            cgp.assert_called_once()
+            assert ["_HASH_CHECK"] == cgp.call_args.kwargs["names"]
+        pp.call_pull.assert_not_called()
+        assert 300 == pm.TEST_I.value
+        assert 1.0 == pm.TEST_F.value
+
+        # 3. values to set are checked against mavros, TEST_I changed meanwhile
+        pp.set_parameters_bulk = MagicMock(return_value=BulkSetResult())
+        with patch(
+            "mavros.param.call_get_parameters", MagicMock(return_value=HASHED_PARAMS)
+        ) as cgp:
+            pm.update_bulk({"TEST_F": 2.0})
+            assert ["TEST_F"] == cgp.call_args.kwargs["names"]
+            assert pp.cache.load(CACHE_KEY, 4, 42) is not None
+
+            pp.confirm_values(["TEST_F", "TEST_I"])
+            assert ["TEST_I"] == cgp.call_args.kwargs["names"]
+            assert 2 == cgp.call_count
+
+        assert 100 == pm.TEST_I.value
+        assert pp.cache.load(CACHE_KEY, 4, 42) is None
+
+
+def test_ParamPlugin_values_cache_no_hash(tmp_path):
+    pp = make_cached_pp(tmp_path)
+    pp.cache.save(CACHE_KEY, CACHE_PARAMS.values(), 3)
+
+    names = list(CACHE_PARAMS)
+    values = {
+        **CACHE_PARAMS,
+        "_HASH_CHECK": Parameter("_HASH_CHECK", Parameter.Type.NOT_SET),
+    }
+    with patch(
+        "mavros.param.call_list_parameters", MagicMock(return_value=names)
+    ), patch("mavros.param.call_get_parameters", MagicMock(return_value=values)):
+        pm = pp.values
+
+    # entry without a hash is never used, nor refreshed
+    pp.call_pull.assert_called_once()
+    assert 3 == len(pm)
+    assert pp.cache.load(CACHE_KEY, 3) is not None
+    assert pp._unconfirmed is None
+
+
+def test_ParamPlugin_get_matching():
+    pp = ParamPlugin(MagicMock())
+    pp.call_pull = MagicMock()
+    values = {
+        **CACHE_PARAMS,
+        "OTHER": Parameter("OTHER", Parameter.Type.NOT_SET),
+    }
+
+    def get_parameters(*, node, client, names):
+        return {k: values[k] for k in names}
+
+    with patch(
+        "mavros.param.call_list_parameters", MagicMock(return_value=list(values))
+    ), patch(
+        "mavros.param.call_get_parameters", MagicMock(side_effect=get_parameters)
+    ) as cgp:
+        assert ["TEST_F", "TEST_I"] == pp.find_names("TEST_[FI]")
+
+        ret = pp.get_matching("TEST_I")
+        assert {"TEST_I"} == ret.keys()
+        cgp.assert_called_once()
+        pp.call_pull.assert_not_called()
+
+        assert {"TEST_B", "TEST_F", "TEST_I"} == pp.get_matching("TEST_*").keys()
+
+        # unknown: pull once more, then give up
+        assert {} == pp.get_matching("OTHER")
+        pp.call_pull.assert_called_once()
+
+
+def test_ParamPlugin_set_parameter():
+    pp = ParamPlugin(MagicMock())
+    pp.call_pull = MagicMock()
+    pp.cli_set = MagicMock()
+    pp.cli_set.call = MagicMock(
+        side_effect=lambda req: ParamSetV2.Response(success=True, value=req.value)
+    )
+
+    def get_parameters(*, node, client, names):
+        return {
+            k: CACHE_PARAMS.get(k, Parameter(k, Parameter.Type.NOT_SET)) for k in names
+        }
+
+    with patch(
+        "mavros.param.call_get_parameters", MagicMock(side_effect=get_parameters)
+    ):
+        ret = pp.set_parameter("TEST_F", 2)
+        assert Parameter.Type.DOUBLE == ret.type_
+        assert 2.0 == ret.value
+        req = pp.cli_set.call.call_args[0][0]
+        assert "TEST_F" == req.param_id
+        assert not req.force_set
+
+        ret = pp.set_parameter("TEST_I", 20.0)
+        assert Parameter.Type.INTEGER == ret.type_
+        assert 20 == ret.value
+
+        with pytest.raises(KeyError):
+            pp.set_parameter("MISSING", 1)
+
+        ret = pp.set_parameter("MISSING", 1, force=True)
+        assert 1 == ret.value
+
+        pp.cli_set.call.side_effect = lambda req: ParamSetV2.Response(success=False)
+        with pytest.raises(ValueError):
+            pp.set_parameter("TEST_I", 1)
+
+
+def test_diff_parameters():
+    old = {
+        "SAME_I": Parameter("SAME_I", value=1),
+        "SAME_F": Parameter("SAME_F", value=0.1),
+        "INT_F": Parameter("INT_F", value=2.0),
+        "CHANGED": Parameter("CHANGED", value=0.5),
+        "MISSING": Parameter("MISSING", value=3),
+    }
+    new = {
+        "SAME_I": Parameter("SAME_I", value=1),
+        # float32 round trip
+        "SAME_F": Parameter("SAME_F", value=0.10000000149011612),
+        "INT_F": Parameter("INT_F", value=2),
+        "CHANGED": Parameter("CHANGED", value=0.6),
+        "ADDED": Parameter("ADDED", value=4),
+    }
+
+    ret = diff_parameters(old, new)
+    assert ret
+    assert {"CHANGED"} == ret.changed.keys()
+    assert (0.5, 0.6) == tuple(p.value for p in ret.changed["CHANGED"])
+    assert {"ADDED"} == ret.added.keys()
+    assert {"MISSING"} == ret.missing.keys()
+    assert 3 == ret.unchanged
+    assert {"CHANGED": new["CHANGED"], "ADDED": new["ADDED"]} == ret.delta
+
+    assert not diff_parameters(old, old)
+    assert {} == diff_parameters(old, new, rel_tol=0.5).changed
+
+
+def test_ParamFile_diff():
+    mp = MissionPlannerParam().load(
+        io.StringIO("TEST_I,100\r\nTEST_F,1.0\r\nTEST_X,1\r\n")
+    )
+    qgc = QGroundControlParam().load(
+        io.StringIO("1\t1\tTEST_I\t101\t6\n1\t1\tTEST_F\t1\t9\n")
+    )
+
+    ret = mp.diff(qgc)
+    assert {"TEST_I"} == ret.changed.keys()
+    assert {"TEST_X"} == ret.missing.keys()
+    assert 1 == ret.unchanged
+
+    # ParamDict works as well
+    ret = qgc.diff(ParamDict(CACHE_PARAMS))
+    assert {"TEST_I"} == ret.changed.keys()
+    assert {"TEST_B"} == ret.added.keys()
+
+
+def make_event(name: str, value, index: int = 0, count: int = 0) -> ParamEvent:
+    return ParamEvent(
+        param_id=name,
+        value=Parameter(name, value=value).get_parameter_value(),
+        param_index=index,
+        param_count=count,
+    )
+
+
+def test_ParamPullTracker():
+    progress = []
+    tracker = ParamPullTracker(lambda *args: progress.append(args))
+    assert [] == tracker.missing_indexes
+
+    for i in (0, 1, 3):
+        tracker.update(make_event(f"P_{i}", i, i, 5))
+    tracker.update(make_event("_HASH_CHECK", 0, 0xFFFF, 0xFFFF))
+
+    assert 4 == tracker.received
+    assert 5 == tracker.count
+    assert [2, 4] == tracker.missing_indexes
+    assert (4, 5) == progress[-1]
+    assert not tracker.is_complete(5)
+    assert tracker.is_complete(4)
+
+    assert tracker.wait(4)
+    assert not tracker.wait(6, timeout=0.01)
+
+    threading.Timer(0.01, tracker.update, [make_event("P_2", 2, 2, 5)]).start()
+    assert tracker.wait(5, timeout=1.0)
+    assert [4] == tracker.missing_indexes
+
+    # all indexes came, names count does not matter
+    tracker.update(make_event("P_4", 4, 4, 5))
+    assert [] == tracker.missing_indexes
+    assert tracker.is_complete(10)
+
+
+def make_pull_pp(names, delivered, success=True):
+    """ParamPlugin, which pull delivers events only of some parameters."""
+    pp = ParamPlugin(MagicMock())
+    pp.subscribe_events = MagicMock()
+
+    def pull(*, force_pull=False):
+        for i, name in enumerate(names):
+            if name in delivered:
+                pp._event_cb(make_event(name, i, i, len(names)))
+        return ParamPull.Response(
+            success=success, param_received=len(names) if success else 0
+        )
+
+    pp.call_pull = MagicMock(side_effect=pull)
+    return pp
+
+
+@pytest.mark.parametrize(
+    "delivered,success,requested",
+    [
+        ({"P_0", "P_1", "P_2", "P_3"}, True, None),
+        ({"P_0", "P_2"}, True, ["P_1", "P_3"]),
+        # already pulled by mavros, no events
+        (set(), True, ["P_0", "P_1", "P_2", "P_3"]),
+        # failed pull: count is not confirmed, rest is requested from mavros
+        ({"P_0", "P_1"}, False, ["P_2", "P_3"]),
+    ],
+)
+def test_ParamPlugin_fetch_values(delivered, success, requested):
+    names = ["P_0", "P_1", "P_2", "P_3"]
+    pp = make_pull_pp(names, delivered, success)
+    progress = []
+
+    def get_parameters(*, node, client, names):
+        return {k: Parameter(k, value=int(k[2:])) for k in names}
+
+    with patch(
+        "mavros.param.call_list_parameters", MagicMock(return_value=names)
+    ), patch(
+        "mavros.param.call_get_parameters", MagicMock(side_effect=get_parameters)
+    ) as cgp:
+        pm = pp.fetch_values(progress=lambda *args: progress.append(args), timeout=0.01)
+
+        if requested is None:
+            cgp.assert_not_called()
+        else:
+            assert requested == cgp.call_args[1]["names"]
+
+    pp.call_pull.assert_called_once_with(force_pull=False)
+    assert {k: int(k[2:]) for k in names} == {k: p.value for k, p in pm.items()}
+    assert (4, 4) == progress[-1]
+    assert pm is pp.values
+    assert pp._pull_tracker is None
+
+
 @pytest.mark.parametrize(
     "file_class,file_name,expected_len",
     [
@@ -124,6 +624,81 @@ def test_ParamFile_load(file_class, file_name, expected_len):
     assert expected_len == len(pf.parameters)
 
 
+@pytest.mark.parametrize(
+    "file_class,file_name",
+    [
+        (MavProxyParam, "mavproxy.parm"),
+        (MissionPlannerParam, "missionplanner.parm"),
+        (QGroundControlParam, "qgroundcontrol.params"),
+    ],
+)
+def test_detect_param_file(file_class, file_name):
+    file_path = pathlib.Path(__file__).parent / "testdata" / file_name
+
+    with file_path.open() as file_:
+        file_.readline()
+        pos = file_.tell()
+        assert file_class is detect_param_file(file_)
+        assert pos == file_.tell()
+
+    assert detect_param_file(io.StringIO("# empty\n")) is None
+
+
+def test_ParamFile_parse():
+    qgc = list(
+        QGroundControlParam.parse(
+            [
+                "# comment\n",
+                "1\t1\tTEST_F\t1\t9\n",
+                "1\t1\tTEST_I\t-2\t6\n",
+                "1\t1\tTEST_X\t3.000\t2\n",
+            ]
+        )
+    )
+    assert [
+        ("TEST_F", 1.0, Parameter.Type.DOUBLE),
+        ("TEST_I", -2, Parameter.Type.INTEGER),
+        ("TEST_X", 3, Parameter.Type.INTEGER),
+    ] == qgc
+    assert float is type(qgc[0][1])
+
+    assert [
+        ("TEST_I", -2, Parameter.Type.INTEGER),
+        ("TEST_F", 1e-05, Parameter.Type.DOUBLE),
+    ] == list(MavProxyParam.parse(["TEST_I   -2\n", "TEST_F 1e-05\n"]))
+
+    with pytest.raises(ValueError):
+        list(MissionPlannerParam.parse(["TEST_I,1,2\r\n"]))
+
+
+def test_ParamFile_lazy():
+    pf = MissionPlannerParam().load(io.StringIO("TEST_I,100\r\nTEST_F,1.5\r\n"))
+    assert pf._parameters is None
+    assert 2 == len(pf.records)
+
+    p = pf.parameters["TEST_F"]
+    assert (Parameter.Type.DOUBLE, 1.5) == (p.type_, p.value)
+    assert pf.parameters is pf.parameters
+
+    pf.parameters = {}
+    assert pf.records is None
+
+
+@pytest.mark.skipif(np is None, reason="NumPy is not installed")
+def test_ParamFile_to_array():
+    pf = MissionPlannerParam().load(io.StringIO("TEST_I,100\r\nTEST_F,1.5\r\n"))
+
+    arr = pf.to_array()
+    assert ["TEST_I", "TEST_F"] == list(arr["name"])
+    assert [100.0, 1.5] == list(arr["value"])
+    assert [Parameter.Type.INTEGER.value, Parameter.Type.DOUBLE.value] == list(
+        arr["type"]
+    )
+
+    pf.parameters = SAVE_PARAMS
+    assert 1000.0 == pf.to_array()["value"][1]
+
+
 SAVE_PARAMS = {
     "TEST_I": Parameter("TEST_I", value=100),
     "TEST_F": Parameter("TEST_F", value=1e3),
@@ -167,6 +742,7 @@ def test_ParamFile_save(file_class, expected_output):
 
     pf = file_class()
     pf.parameters = SAVE_PARAMS
+    pf.stamp = SAVE_STAMP
     pf.tgt_system = 2
 
     out = io.StringIO()
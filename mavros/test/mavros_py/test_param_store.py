@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+
+import datetime
+import io
+
+import pytest
+
+from mavros.param import MissionPlannerParam, Parameter
+from mavros.param_store import ParamStore
+
+T0 = datetime.datetime(2021, 6, 1, 12, 0, 0)
+
+
+def make_dump(tgt_system: int, day: int, text: str) -> MissionPlannerParam:
+    pf = MissionPlannerParam().load(io.StringIO(text))
+    pf.tgt_system = tgt_system
+    pf.stamp = T0 + datetime.timedelta(days=day)
+    return pf
+
+
+def fill_store(path):
+    with ParamStore(path) as ps:
+        # appended out of time order
+        ps.append(make_dump(1, 1, "ATC_RAT_RLL_P,0.15\r\nFRAME,1\r\n"), uid="a")
+        ps.append(make_dump(2, 0, "ATC_RAT_RLL_P,0.13\r\nFRAME,2\r\n"), uid="b")
+        ps.append(make_dump(1, 0, "ATC_RAT_RLL_P,0.135\r\n"), uid="a")
+        ps.append(make_dump(2, 2, "FRAME,2\r\nNEW_P,3\r\n"), uid="b")
+
+
+def test_ParamStore(tmp_path):
+    path = tmp_path / "fleet.pstore"
+    fill_store(path)
+
+    # reopen: everything comes from the file
+    with ParamStore(path) as ps:
+        assert 4 == len(ps)
+        assert ["ATC_RAT_RLL_P", "FRAME", "NEW_P"] == ps.names
+        assert ("b", 2, 1, 2) == (
+            ps.snapshots[3].uid,
+            ps.snapshots[3].tgt_system,
+            ps.snapshots[3].tgt_component,
+            ps.snapshots[3].count,
+        )
+
+        hist = ps.history("ATC_RAT_RLL_P")
+        assert [0.13, 0.135, 0.15] == [v for _, v in hist]
+        assert [T0, T0, T0 + datetime.timedelta(days=1)] == [i.stamp for i, _ in hist]
+
+        assert [0.135, 0.15] == [v for _, v in ps.history("ATC_RAT_RLL_P", uid="a")]
+        assert [2, 2] == [v for _, v in ps.history("FRAME", tgt_system=2)]
+        assert int is type(ps.history("FRAME")[0][1])
+        assert [(1, 1)] == [
+            (i.tgt_system, v)
+            for i, v in ps.history("FRAME", start=T0 + datetime.timedelta(days=1))
+            if i.uid == "a"
+        ]
+        assert [] == ps.history("MISSING")
+
+        pf = ps.load(3)
+        assert 2 == pf.tgt_system
+        assert {"FRAME", "NEW_P"} == pf.parameters.keys()
+        assert Parameter.Type.INTEGER == pf.parameters["NEW_P"].type_
+
+        ret = ps.load(1).diff(ps.load(3))
+        assert {"NEW_P"} == ret.added.keys()
+        assert {"ATC_RAT_RLL_P"} == ret.missing.keys()
+
+
+def test_ParamStore_torn_tail(tmp_path):
+    path = tmp_path / "fleet.pstore"
+    fill_store(path)
+    size = path.stat().st_size
+
+    with open(path, "ab") as fd:
+        fd.write(b"SNAP\xff\x00\x00\x00garbage")
+
+    with ParamStore(path) as ps:
+        assert 4 == len(ps)
+        ps.append(make_dump(3, 3, "FRAME,3\r\n"), uid="c")
+        assert [3] == [v for _, v in ps.history("FRAME", uid="c")]
+
+    with ParamStore(path) as ps:
+        assert 5 == len(ps)
+    assert size < path.stat().st_size
+
+
+def test_ParamStore_bad_file(tmp_path):
+    path = tmp_path / "bad.pstore"
+    path.write_bytes(b"not a store file")
+
+    with pytest.raises(ValueError):
+        ParamStore(path)
+
+
+def test_ParamStore_concurrent_append(tmp_path):
+    path = tmp_path / "fleet.pstore"
+    with ParamStore(path) as ps1, ParamStore(path) as ps2:
+        ps1.append(make_dump(1, 0, "FRAME,1\r\nA_P,1\r\n"), uid="a")
+        # ps2 did not see that append, it must not overwrite it
+        ps2.append(make_dump(2, 1, "FRAME,2\r\nB_P,2\r\n"), uid="b")
+        assert 2 == len(ps2)
+
+    with ParamStore(path) as ps:
+        assert ["a", "b"] == [i.uid for i in ps.snapshots]
+        assert ["FRAME", "A_P", "B_P"] == ps.names
+        assert [1, 2] == [v for _, v in ps.history("FRAME")]
+        assert [2] == [v for _, v in ps.history("B_P")]
@@ -0,0 +1,153 @@
+# -*- coding: utf-8 -*-
+
+import pytest
+from builtin_interfaces.msg import Time
+from std_msgs.msg import Header
+
+from mavros.stats import LinkMonitor, MessageStats, frame_size
+from mavros_msgs.msg import Mavlink
+
+
+def make_msg(seq: int, t: float, msgid: int = 0, sysid: int = 1, compid: int = 1):
+    return Mavlink(
+        header=Header(stamp=Time(sec=int(t), nanosec=round(t % 1 * 1e9))),
+        magic=Mavlink.MAVLINK_V20,
+        len=9,
+        seq=seq,
+        sysid=sysid,
+        compid=compid,
+        msgid=msgid,
+        signature=b"",
+    )
+
+
+def test_frame_size():
+    msg = make_msg(0, 1.0)
+    assert 21 == frame_size(msg)
+    msg.signature = bytes(13)
+    assert 34 == frame_size(msg)
+    msg.magic = Mavlink.MAVLINK_V10
+    msg.signature = b""
+    assert 17 == frame_size(msg)
+
+
+def test_MessageStats():
+    stats = MessageStats(capacity=1)
+
+    # 1.1: heartbeat at 10 Hz, seq 0..9 with 250..254 wrap and two gaps
+    seqs = [250, 251, 253, 254, 255, 0, 1, 4, 5, 6]
+    for i, seq in enumerate(seqs):
+        stats.update(make_msg(seq, 100.0 + i * 0.1))
+    # 1.1: other message in between does not break sequence
+    stats.update(make_msg(7, 101.0, msgid=30))
+    # 2.1
+    stats.update(make_msg(42, 100.5, sysid=2))
+    # duplicate is not a loss
+    stats.update(make_msg(42, 100.6, sysid=2))
+
+    assert {(1, 1), (2, 1)} == stats.sources
+    assert 13 == stats.received
+
+    report = stats.report()
+    assert 13 == report["received"]
+    src1, src2 = report["sources"]
+
+    assert (1, 1) == (src1["sysid"], src1["compid"])
+    assert 11 == src1["received"]
+    assert 3 == src1["lost"]
+    assert 3 / 14 == pytest.approx(src1["loss"])
+
+    hb, att = src1["messages"]
+    assert 0 == hb["msgid"]
+    assert 10 == hb["count"]
+    assert 0.1 == pytest.approx(hb["interval"])
+    assert 0.0 == pytest.approx(hb["jitter"], abs=1e-6)
+    assert 10 * 21 == pytest.approx(hb["bytes_per_sec"] * report["elapsed"])
+    assert att["interval"] is None
+
+    assert 0 == src2["lost"]
+
+    # next window is empty, but keeps totals
+    report = stats.report()
+    assert 0 == report["received"]
+    hb = report["sources"][0]["messages"][0]
+    assert 0 == hb["count"]
+    assert 10 == hb["total"]
+    assert 0.0 == hb["rate"]
+
+
+def test_MessageStats_dropout():
+    stats = MessageStats()
+
+    # sequence resyncs after the long dropout, late frame is ignored
+    for i, seq in enumerate([0, 1, 2, 200, 201, 203, 202, 204]):
+        stats.update(make_msg(seq, 100.0 + i * 0.1))
+
+    (src,) = stats.report()["sources"]
+    assert 8 == src["received"]
+    assert 1 == src["lost"]
+
+
+def test_LinkMonitor():
+    mon = LinkMonitor(window=10.0, buckets=10, capacity=1)
+
+    # 1.1 at 10 Hz for 20 s, received 5 ms after stamp, one gap each second
+    for i in range(200):
+        if i % 10 == 5:
+            continue
+        t = 1000.0 + i * 0.1
+        mon.update(make_msg(i & 0xFF, t), now=t + 0.005)
+
+    # 2.1: reordered, duplicate and damaged frames
+    for seq in (0, 2, 1, 3, 3, 4):
+        mon.update(make_msg(seq, 1019.0, sysid=2), now=1019.5)
+    bad = make_msg(5, 1019.0, sysid=2)
+    bad.framing_status = Mavlink.FRAMING_BAD_SIGNATURE
+    mon.update(bad, now=1019.5)
+
+    # bad CRC: counted for the link, damaged header makes no new source
+    bad = make_msg(5, 1019.0, sysid=3)
+    bad.framing_status = Mavlink.FRAMING_BAD_CRC
+    mon.update(bad, now=1019.5)
+
+    report = mon.report(now=1019.95)
+    assert 1 == report["bad_crc"]
+    assert 1 / 98 == pytest.approx(report["crc_error_rate"])
+    src1, src2 = report["sources"]
+
+    # only last 10 s of traffic in the window
+    assert (1, 1) == (src1["sysid"], src1["compid"])
+    assert 90 == src1["received"]
+    assert 9.0 == pytest.approx(src1["rate"])
+    assert 10 == src1["lost"]
+    assert 0.1 == pytest.approx(src1["loss"])
+    assert 0.005 == pytest.approx(src1["latency"])
+    assert 0.005 == pytest.approx(src1["latency_max"])
+
+    assert 6 == src2["received"]
+    assert 0 == src2["lost"]
+    assert 1 == src2["reordered"]
+    assert 1 == src2["duplicates"]
+    assert 1 == src2["bad_signature"]
+    assert 0.5 == pytest.approx(src2["latency"])
+
+    # everything slides out of the window
+    report = mon.report(now=1040.0)
+    assert 0 == report["bad_crc"]
+    src1, src2 = report["sources"]
+    assert 0 == src1["received"]
+    assert src1["latency"] is None
+
+
+def test_LinkMonitor_dropout():
+    mon = LinkMonitor(window=10.0, buckets=10)
+
+    # 150 frames lost in a row, then the link recovers
+    for seq in list(range(10)) + list(range(160, 170)) + [171, 170]:
+        mon.update(make_msg(seq, 1000.0), now=1000.0)
+
+    (src,) = mon.report(now=1000.0)["sources"]
+    assert 22 == src["received"]
+    assert 0 == src["lost"]
+    assert 1 == src["reordered"]
+    assert 0 == src["duplicates"]
@@ -0,0 +1,134 @@
+# -*- coding: utf-8 -*-
+
+import io
+
+import pytest
+from builtin_interfaces.msg import Time
+from pymavlink.dialects.v10 import common as common_v10
+from pymavlink.dialects.v20 import common as common_v20
+from std_msgs.msg import Header
+
+from mavros.mavlink import MavlinkStreamParser, convert_to_bytes
+from mavros.tlog import TlogIndex, TlogReader, TlogWriter, scan_tlog
+
+from .test_mavlink import make_heartbeat
+
+
+def make_msgs(count: int = 10):
+    msgs = []
+    for seq in range(count):
+        dialect = common_v20 if seq % 2 else common_v10
+        (msg,) = MavlinkStreamParser().feed(make_heartbeat(dialect, seq)[1])
+        msg.header = Header(stamp=Time(sec=1600000000 + seq, nanosec=500000))
+        msgs.append(msg)
+
+    return msgs
+
+
+def write_tlog(path, msgs):
+    with open(path, "wb") as fd:
+        writer = TlogWriter(fd)
+        for msg in msgs:
+            writer.write(msg)
+
+    assert len(msgs) == writer.count
+
+
+def test_TlogReader(tmp_path):
+    msgs = make_msgs()
+    path = tmp_path / "test.tlog"
+    write_tlog(path, msgs)
+
+    with TlogReader(path) as reader:
+        assert 10 == len(reader)
+        assert 1600000003000500 == reader.stamps[3]
+        assert [convert_to_bytes(m) for m in msgs] == [
+            convert_to_bytes(m) for m in reader
+        ]
+        assert 7 == reader[7].seq
+        assert 1600000007 == reader[7].header.stamp.sec
+        assert [5, 6] == [m.seq for m in reader.iter_from(5, 7)]
+
+        assert 0 == reader.index_at(0)
+        assert 4 == reader.index_at(1600000003000501)
+        assert 10 == reader.index_at(1700000000000000)
+
+
+def test_TlogReader_empty(tmp_path):
+    path = tmp_path / "empty.tlog"
+    path.touch()
+
+    with TlogReader(path) as reader:
+        assert 0 == len(reader)
+        assert [] == list(reader)
+
+
+def test_scan_tlog_garbage():
+    buf = io.BytesIO()
+    writer = TlogWriter(buf)
+    msgs = make_msgs(3)
+    writer.write(msgs[0])
+    buf.write(b"\x00garbage")
+    writer.write(msgs[1])
+    writer.write(msgs[2])
+
+    data = buf.getvalue()[:-3]  # truncated tail
+    assert [(0, 1600000000000500), (33, 1600000001000500)] == list(scan_tlog(data))
+
+
+def make_index_tlog(path):
+    msgs = make_msgs(12)
+    for i, msg in enumerate(msgs):
+        msg.msgid = (0, 30)[i % 2]
+        msg.sysid = 1 if i < 6 else 2
+
+    write_tlog(path, msgs)
+    return msgs
+
+
+@pytest.mark.parametrize("sidecar", [False, True])
+def test_TlogReader_query(tmp_path, sidecar):
+    path = tmp_path / "test.tlog"
+    make_index_tlog(path)
+
+    with TlogReader(path, sidecar=sidecar) as reader:
+        assert {(1, 1, 0), (1, 1, 30), (2, 1, 0), (2, 1, 30)} == set(
+            reader.index.groups
+        )
+        assert [1, 3, 5, 7, 9, 11] == list(reader.index.records(msgid=30))
+        assert [6, 7, 8, 9, 10, 11] == list(reader.index.records(sysid=2))
+        assert [6, 8, 10] == list(reader.index.records(msgid=0, sysid=2))
+        assert [3, 5, 7] == list(
+            reader.index.records(msgid=30, t0=1600000003000000, t1=1600000008000000)
+        )
+        assert [] == list(reader.index.records(msgid=42))
+        assert [8, 10] == [
+            m.seq for m in reader.query(msgid=0, sysid=2, t0=1600000008000000)
+        ]
+
+    assert sidecar == (tmp_path / "test.tlog.mavidx").exists()
+
+
+def test_TlogIndex_sidecar(tmp_path):
+    path = tmp_path / "test.tlog"
+    make_index_tlog(path)
+    index_path = tmp_path / "test.tlog.mavidx"
+
+    with TlogReader(path) as reader:
+        built = reader.index
+        built.save(index_path, path)
+
+    loaded = TlogIndex.load(index_path, path)
+    assert loaded is not None
+    assert list(built.offsets) == list(loaded.offsets)
+    assert list(built.stamps) == list(loaded.stamps)
+    assert {k: list(v) for k, v in built.groups.items()} == {
+        k: list(v) for k, v in loaded.groups.items()
+    }
+    loaded.close()
+
+    # stale after the log changed
+    with open(path, "ab") as fd:
+        fd.write(b"\0")
+    assert TlogIndex.load(index_path, path) is None
+    assert TlogIndex.load(tmp_path / "missing.mavidx", path) is None